@@ -1,8 +1,19 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import hashlib
 import os
 
+from app.core.config import settings
+from app.core.tmdb import TMDBClient, get_tmdb
+from app.core.fastjson import FastJSONResponse
+from app.core.http_cache import VARY_ENCODING, accepts_gzip, gzip_body, make_etag, not_modified, set_cache_headers
+from app.db.database import get_db
+from app.services import favorites as fav_store
+from app.api import movies
+
 router = APIRouter()
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # backend/app
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
@@ -26,4 +37,62 @@ def favorites_page(request: Request):
         {"title": "Interstellar", "poster": "https://via.placeholder.com/150", "rating": 8.6},
     ]
     return templates.TemplateResponse("favorites.html", {"request": request, "favorites": favorites})
-"""
\ No newline at end of file
+"""
+
+# --- PAKIET STRONY GŁÓWNEJ ---
+# Wszystkie półki + ID ulubionych jednym requestem (home.js) zamiast osobnego fetch na półkę i na ulubione
+_background: set = set()  # półki, które nie zdążyły - dokańczają się w tle do cache TMDB
+
+
+def _finish_in_background(task: asyncio.Task):
+    def _done(t: asyncio.Task):
+        _background.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            print(f"Błąd półki strony głównej: {t.exception()}")
+
+    _background.add(task)
+    task.add_done_callback(_done)
+
+
+@router.get("/home/bundle")
+async def home_bundle(request: Request, client: TMDBClient = Depends(get_tmdb), db: AsyncSession = Depends(get_db)):
+    """
+    Półki (popular, trending, top_rated, revenue) równolegle + ID ulubionych.
+    Półka, która nie zdąży w HOME_BUNDLE_TIMEOUT albo się wywróci, to null i nazwa w `partial`.
+    Pełny pakiet ma ETag (304 przy niezmienionej treści), niepełnego przeglądarka nie zapamiętuje.
+    """
+    deadline = asyncio.get_running_loop().time() + settings.HOME_BUNDLE_TIMEOUT
+    tasks = {name: asyncio.ensure_future(movies.fetch_shelf(client, name)) for name in movies.SHELVES}
+
+    # Baza w czasie, gdy półki czekają na TMDB
+    favorites = {"version": 0, "keys": []}
+    session_id = request.session.get("session_id")
+    if session_id:
+        favorites["version"] = await fav_store.get_version(db, session_id)
+        favorites["keys"] = await fav_store.get_keys(db, session_id)
+
+    done, _ = await asyncio.wait(tasks.values(), timeout=max(0.0, deadline - asyncio.get_running_loop().time()))
+    shelves, partial = {}, []
+    for name, task in tasks.items():
+        if task in done and task.exception() is None:
+            shelves[name] = task.result()
+            continue
+        shelves[name] = None
+        partial.append(name)
+        if task in done:
+            print(f"Błąd półki strony głównej ({name}): {task.exception()}")
+        else:
+            _finish_in_background(task)
+
+    response = FastJSONResponse({"shelves": shelves, "favorites": favorites, "partial": partial})
+    if partial:
+        response.headers["Cache-Control"] = "no-store"
+    else:
+        # Inny ETag dla wersji gzip i nieskompresowanej - to różne reprezentacje tej samej treści
+        encoding = "gzip" if accepts_gzip(request, response.body, settings.HOME_BUNDLE_GZIP_MIN) else "identity"
+        etag = make_etag("home-bundle", hashlib.sha1(response.body).hexdigest(), encoding)
+        cached = not_modified(request, etag, vary=VARY_ENCODING)
+        if cached:
+            return cached
+        set_cache_headers(response, etag, vary=VARY_ENCODING)
+    return gzip_body(request, response, settings.HOME_BUNDLE_GZIP_MIN)
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+import secrets
+
+from app.core.config import settings
+from app.core import profiler, tracing
+from app.services import rec_cache, typeahead, warmer
+
+
+
+def require_token(request: Request):
+    """Z ustawionym METRICS_TOKEN wpuszczamy tylko scraper z "Authorization: Bearer <token>"."""
+    if not settings.METRICS_TOKEN:
+        return
+    auth = request.headers.get("authorization", "")
+    scheme, _, token = auth.partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.strip(), settings.METRICS_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+
+
+# Rejestrowany tylko z METRICS_ROUTES_ENABLED=1 (app/main.py)
+router = APIRouter(tags=["metrics"], dependencies=[Depends(require_token)])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    """Format tekstowy Prometheusa: histogramy requestów/etapów/TMDB + bieżące liczniki serwisów."""
+    gauges = {}
+    gauges.update(tracing.flatten_stats("tmdb_client", request.app.state.tmdb.metrics()))
+    gauges.update(tracing.flatten_stats("rec_cache", rec_cache.stats()))
+    gauges.update(tracing.flatten_stats("typeahead", typeahead.stats()))
+    gauges.update(tracing.flatten_stats("warmer", warmer.stats()))
+    return PlainTextResponse(tracing.render_metrics(gauges), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/metrics/warmer")
+async def warmer_status():
+    """Stan rozgrzewania cache: rola workera, ostatni przebieg, czasy i błędy zadań."""
+    return warmer.stats()
+
+
+@router.get("/metrics/profile", response_class=PlainTextResponse)
+async def sample_profile(seconds: float = 10.0, interval: float = None):
+    """Stosy pętli zdarzeń z `seconds` sekund (format folded, np. do speedscope). Tylko z PROFILER_ENABLED=1."""
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler disabled")
+    seconds = max(0.1, min(seconds, settings.PROFILER_MAX_SECONDS))
+    return await profiler.profile(seconds, interval or settings.PROFILER_INTERVAL)
@@ -1,168 +1,180 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-import httpx
-import os
 import random
 from app.core.config import settings
+from app.core.tmdb import TMDBClient, get_tmdb
+from app.core.paging import fetch_pages
+from app.core.fastjson import FastJSONResponse
+from app.core.records import Candidate, slim
+from app.db.database import get_db
+from app.services import titles, typeahead
 
 router = APIRouter(prefix="/movies", tags=["movies"])
 
-API_KEY = os.getenv("TMDB_API_KEY") or settings.TMDB_API_KEY
-BASE_URL = settings.TMDB_BASE_URL
+# --- HELPERY ---
+# Odczyty idą przez client.get_json - cache z TTL per endpoint (app/core/cache.py)
+async def fetch_fixed_amount(client: TMDBClient, url, params, limit=24, media_type="movie"):
+    # Strony 1 i 2 równolegle; druga jest zbędna, jeśli pierwsza dała już `limit` plakatów
+    has_enough = lambda res: sum(1 for m in res if m.poster_path) >= limit
+    fetched = await fetch_pages(client, url, params, pages=(1, 2), enough=has_enough,
+                                convert=Candidate.converter(media_type))
 
-# Nagłówki, żeby TMDB nie blokowało (ważne na Renderze)
-HEADERS = settings.TMDB_HEADERS 
-
-# --- HELPERY (bez zmian) ---
-async def fetch_fixed_amount(client, url, params, limit=24):
-    results = []
-    params["page"] = 1
-    resp1 = await client.get(url, params=params)
-    if resp1.status_code == 200:
-        results.extend(resp1.json().get("results", []))
-    
-    params["page"] = 2
-    resp2 = await client.get(url, params=params)
-    if resp2.status_code == 200:
-        results.extend(resp2.json().get("results", []))
-    
-    valid_results = [m for m in results if m.get("poster_path")]
+    valid_results = [m.to_dict() for m in fetched.results if m.poster_path]
     return valid_results[:limit]
 
+# Półki strony głównej: nazwa -> (endpoint TMDB, parametry); osobne endpointy i /home/bundle
+SHELVES = {
+    "popular": ("/movie/popular", {"language": "pl-PL"}),
+    "trending": ("/trending/movie/week", {"language": "pl-PL"}),
+    "top_rated": ("/movie/top_rated", {"language": "pl-PL", "vote_count.gte": 300}),
+    "revenue": ("/discover/movie", {
+        "language": "pl-PL",
+        "sort_by": "revenue.desc",
+        "vote_count.gte": 100,
+        "include_adult": "false"
+    }),
+}
+
+async def fetch_shelf(client: TMDBClient, name: str, limit=24):
+    url, params = SHELVES[name]
+    return await fetch_fixed_amount(client, url, dict(params), limit=limit)
+
 # --- NOWY ENDPOINT: DOSTAWCY STREAMINGU ---
 @router.get("/providers")
-async def get_watch_providers():
+async def get_watch_providers(client: TMDBClient = Depends(get_tmdb)):
     """Zwraca listę popularnych dostawców w Polsce z aktualnymi logami prosto z API."""
     # ID serwisów, które chcesz wyświetlać:
     # 8: Netflix, 337: Disney+, 1899: Max, 119: Prime, 350: Apple TV, 1773: SkyShowtime, 238: Canal+
-    TARGET_IDS = [8, 337, 1899, 119, 350, 1773, 238]
+    TARGET_IDS = settings.WATCH_PROVIDER_IDS
     
-    async with httpx.AsyncClient(headers=HEADERS) as client:
-        url = f"{BASE_URL}/watch/providers/movie"
-        params = {"api_key": API_KEY, "language": "pl-PL", "watch_region": "PL"}
-        try:
-            resp = await client.get(url, params=params)
-            if resp.status_code == 200:
-                data = resp.json()
-                results = data.get("results", [])
-                
-                # Filtrujemy tylko te z naszej listy TARGET_IDS
-                filtered = [p for p in results if p["provider_id"] in TARGET_IDS]
-                
-                # Sortujemy tak, żeby były w kolejności jak w TARGET_IDS
-                filtered.sort(key=lambda x: TARGET_IDS.index(x["provider_id"]))
-                
-                return {"providers": filtered}
-        except Exception as e:
-            print(f"Błąd pobierania providerów: {e}")
-            return {"providers": []}
+    url = "/watch/providers/movie"
+    params = {"language": "pl-PL", "watch_region": "PL"}
+    try:
+        data = await client.get_json(url, params=params)
+        if data:
+            results = data.get("results", [])
+            
+            # Filtrujemy tylko te z naszej listy TARGET_IDS
+            filtered = [p for p in results if p["provider_id"] in TARGET_IDS]
+            
+            # Sortujemy tak, żeby były w kolejności jak w TARGET_IDS
+            filtered.sort(key=lambda x: TARGET_IDS.index(x["provider_id"]))
+            
+            return {"providers": filtered}
+    except Exception as e:
+        print(f"Błąd pobierania providerów: {e}")
+        return {"providers": []}
     return {"providers": []}
 
 # --- RESZTA ENDPOINTÓW (SEARCH, POPULAR, ETC.) ---
-# ... (pozostaw resztę pliku bez zmian, upewnij się tylko, że używasz `headers=HEADERS` w clientach)
+# Wszystkie korzystają ze wspólnego klienta TMDB (get_tmdb) - nagłówki i api_key dokleja klient
 
 @router.get("/search")
-async def search_movies(q: str, page: int = 1, limit: int = 24):
+async def search_movies(q: str, page: int = 1, limit: int = 24, client: TMDBClient = Depends(get_tmdb)):
     if not q: return {"results": []}
-    async with httpx.AsyncClient(headers=HEADERS) as client:
-        url = f"{BASE_URL}/search/multi"
-        params = {"api_key": API_KEY, "query": q, "page": page, "language": "pl-PL", "include_adult": "false"}
-        response = await client.get(url, params=params)
-        if response.status_code != 200: return {"results": []}
-        data = response.json()
-        results = [item for item in data.get("results", []) if item.get("media_type") in ["movie", "tv"]]
-        return {"results": results[:limit]}
+    url = "/search/multi"
+    params = {"query": q, "page": page, "language": "pl-PL", "include_adult": "false"}
+    data = await client.get_json(url, params=params)
+    if data is None: return {"results": []}
+    results = [item for item in data.get("results", []) if item.get("media_type") in ["movie", "tv"]]
+    typeahead.remember(results)  # znalezione tytuły podpowiadamy potem lokalnie
+    return FastJSONResponse({"results": results[:limit]})
+
+@router.get("/typeahead")
+async def typeahead_search(q: str = "", limit: int = 6, client: TMDBClient = Depends(get_tmdb)):
+    # Podpowiedzi przy pisaniu: najpierw lokalny indeks, TMDB tylko gdy lokalnie jest za mało
+    norm_q = typeahead.normalize(q)
+    if not norm_q: return {"results": []}
+    limit = max(1, min(limit, 20))
+
+    results = typeahead.get_index().search(norm_q, limit)
+    if len(results) >= limit or len(norm_q) < settings.TYPEAHEAD_MIN_UPSTREAM_CHARS:
+        typeahead.record("local")
+        return {"results": results, "source": "local"}
+
+    upstream = typeahead.cached_upstream(norm_q, limit)
+    if upstream is not None:
+        typeahead.record("prefix_cache")
+    else:
+        typeahead.record("upstream")
+        params = {"query": q.strip(), "language": "pl-PL", "include_adult": "false"}
+        data = await client.get_json("/search/multi", params=params) or {}
+        upstream = [item for item in data.get("results", []) if item.get("media_type") in ["movie", "tv"]]
+        # Jedna strona = komplet wyników - wystarczy też dla każdego dłuższego zapytania
+        typeahead.store_upstream(norm_q, upstream, complete=(data.get("total_pages") or 1) <= 1)
+        upstream = upstream[:limit]
+
+    seen = {(r["id"], r.get("media_type")) for r in results}
+    results += [r for r in upstream if (r.get("id"), r.get("media_type")) not in seen]
+    return {"results": results[:limit], "source": "tmdb"}
 
 @router.get("/popular")
-async def get_popular():
-    async with httpx.AsyncClient(headers=HEADERS) as client:
-        url = f"{BASE_URL}/movie/popular"
-        params = {"api_key": API_KEY, "language": "pl-PL"}
-        results = await fetch_fixed_amount(client, url, params, limit=24)
-        return {"results": results}
+async def get_popular(client: TMDBClient = Depends(get_tmdb)):
+    return FastJSONResponse({"results": await fetch_shelf(client, "popular")})
 
 @router.get("/trending")
-async def get_trending():
-    async with httpx.AsyncClient(headers=HEADERS) as client:
-        url = f"{BASE_URL}/trending/movie/week"
-        params = {"api_key": API_KEY, "language": "pl-PL"}
-        results = await fetch_fixed_amount(client, url, params, limit=24)
-        return {"results": results}
+async def get_trending(client: TMDBClient = Depends(get_tmdb)):
+    return FastJSONResponse({"results": await fetch_shelf(client, "trending")})
 
 @router.get("/top_rated")
-async def get_top_rated():
-    async with httpx.AsyncClient(headers=HEADERS) as client:
-        url = f"{BASE_URL}/movie/top_rated"
-        params = {"api_key": API_KEY, "language": "pl-PL"}
-        params["vote_count.gte"] = 300 
-        results = await fetch_fixed_amount(client, url, params, limit=24)
-        return {"results": results}
+async def get_top_rated(client: TMDBClient = Depends(get_tmdb)):
+    return FastJSONResponse({"results": await fetch_shelf(client, "top_rated")})
 
 @router.get("/revenue")
-async def get_revenue():
-    async with httpx.AsyncClient(headers=HEADERS) as client:
-        url = f"{BASE_URL}/discover/movie"
-        params = {
-            "api_key": API_KEY, 
-            "language": "pl-PL",
-            "sort_by": "revenue.desc",
-            "vote_count.gte": 100,
-            "include_adult": "false"
-        }
-        results = await fetch_fixed_amount(client, url, params, limit=24)
-        return {"results": results}
+async def get_revenue(client: TMDBClient = Depends(get_tmdb)):
+    return FastJSONResponse({"results": await fetch_shelf(client, "revenue")})
 
 @router.get("/lucky")
-async def get_lucky():
-    async with httpx.AsyncClient(headers=HEADERS) as client:
-        random_page = random.randint(1, 20)
-        url = f"{BASE_URL}/trending/movie/week"
-        params = {"api_key": API_KEY, "language": "pl-PL", "page": random_page}
-        try:
-            resp = await client.get(url, params=params)
-            if resp.status_code == 200:
-                results = resp.json().get("results", [])
-                if results:
-                    winner = random.choice(results)
-                    return {"id": winner["id"], "type": "movie"}
-        except: pass
+async def get_lucky(client: TMDBClient = Depends(get_tmdb)):
+    random_page = random.randint(1, 20)
+    url = "/trending/movie/week"
+    params = {"language": "pl-PL", "page": random_page}
+    try:
+        data = await client.get_json(url, params=params)
+        if data:
+            results = data.get("results", [])
+            if results:
+                winner = random.choice(results)
+                return {"id": winner["id"], "type": "movie"}
+    except: pass
     return {"id": 238, "type": "movie"}
 
 @router.get("/details/{media_type}/{tmdb_id}")
-async def get_details(media_type: str, tmdb_id: int):
+async def get_details(media_type: str, tmdb_id: int, client: TMDBClient = Depends(get_tmdb), db: AsyncSession = Depends(get_db)):
     if media_type not in ["movie", "tv"]: media_type = "movie"
-    async with httpx.AsyncClient(headers=HEADERS) as client:
-        url = f"{BASE_URL}/{media_type}/{tmdb_id}"
-        params = {"api_key": API_KEY, "language": "pl-PL", "append_to_response": "credits,watch/providers,keywords"}
-        response = await client.get(url, params=params)
-        if response.status_code != 200: raise HTTPException(status_code=404, detail="Not found")
-        data = response.json()
-        
-        directors = []
-        if media_type == "movie":
-            directors = [m for m in data.get("credits", {}).get("crew", []) if m.get("job") == "Director"]
-        else:
-            directors = data.get("created_by", [])
-
-        providers = []
-        try: providers = data.get("watch/providers", {}).get("results", {}).get("PL", {}).get("flatrate", [])
-        except: pass
-
-        return {
-            "id": data.get("id"),
-            "title": data.get("title") or data.get("name"),
-            "overview": data.get("overview"),
-            "poster_path": data.get("poster_path"),
-            "backdrop_path": data.get("backdrop_path"),
-            "release_date": data.get("release_date") or data.get("first_air_date"),
-            "vote_average": data.get("vote_average"),
-            "vote_count": data.get("vote_count"),
-            "genres": data.get("genres", []),
-            "runtime": data.get("runtime"),
-            "episode_run_time": data.get("episode_run_time", []),
-            "production_countries": data.get("production_countries", []),
-            "media_type": media_type,
-            "cast": data.get("credits", {}).get("cast", [])[:12],
-            "directors": directors,
-            "watch_providers": providers
-        }
\ No newline at end of file
+    data = await titles.fetch_details(client, tmdb_id, media_type)
+    if data is None: raise HTTPException(status_code=404, detail="Not found")
+    # Write-through do lokalnych metadanych (runtime, gatunki, ekipa...) dla rekomendacji i ulubionych -
+    # tylko nowy tytuł; znany i świeży nie generuje zapisu, przeterminowany odświeża się w tle
+    await titles.remember(db, client, data, media_type)
+    
+    # Tylko pola, które pokazuje details.js (obsada TMDB ma też gender, credit_id, order...)
+    credits = data.get("credits", {})
+    if media_type == "movie":
+        directors = slim((m for m in credits.get("crew", []) if m.get("job") == "Director"), ("id", "name"))
+    else:
+        directors = slim(data.get("created_by", []), ("id", "name"))
+
+    providers = []
+    try: providers = data.get("watch/providers", {}).get("results", {}).get("PL", {}).get("flatrate", [])
+    except: pass
+
+    return FastJSONResponse({
+        "id": data.get("id"),
+        "title": data.get("title") or data.get("name"),
+        "overview": data.get("overview"),
+        "poster_path": data.get("poster_path"),
+        "backdrop_path": data.get("backdrop_path"),
+        "release_date": data.get("release_date") or data.get("first_air_date"),
+        "vote_average": data.get("vote_average"),
+        "vote_count": data.get("vote_count"),
+        "genres": data.get("genres", []),
+        "runtime": data.get("runtime"),
+        "episode_run_time": data.get("episode_run_time", []),
+        "production_countries": data.get("production_countries", []),
+        "media_type": media_type,
+        "cast": slim(credits.get("cast", [])[:12], ("id", "name", "character", "profile_path")),
+        "directors": directors,
+        "watch_providers": slim(providers, ("provider_id", "provider_name", "logo_path"))
+    })
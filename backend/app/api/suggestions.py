@@ -1,21 +1,32 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from pydantic import BaseModel
-from typing import List, Optional
-import httpx
+from contextlib import aclosing
+from typing import AsyncIterator, List, Optional
 import asyncio
-import json
-import random
-import os
-from collections import Counter
+import time
 
-from app.db.database import get_db
+from app.db.database import AsyncSessionLocal, get_db
 from app.db.models import FavoriteMovie
 from app.core.config import settings
+from app.core.tmdb import TMDBClient, get_tmdb
+from app.core.paging import fetch_pages
+from app.core.fastjson import FastJSONResponse, dumps
+from app.core.records import Candidate
+from app.core.resilience import TMDBUnavailable
+from app.core.tracing import span
+from app.services import titles
+from app.services import favorites as fav_store
+from app.services import profile as profiles
+from app.services import scoring
+from app.services import corpus as candidate_corpus
+from app.services import similarity
+from app.services import collab
+from app.services import rec_cache
 
 router = APIRouter(prefix="/recommendations", tags=["recommendations"])
-API_KEY = os.getenv("TMDB_API_KEY") or settings.TMDB_API_KEY
 
 class RecFilters(BaseModel):
     genres: List[int] = []
@@ -36,6 +47,9 @@ class RecRequest(BaseModel):
     target_type: str 
     use_favorites: bool = True
     filters: Optional[RecFilters] = None
+    limit: int = 30
+    seed: Optional[int] = None  # ziarno losowego jittera punktacji (powtarzalne wyniki)
+    offset: int = 0  # pozycja w rankingu (next_offset z poprzedniej odpowiedzi)
 
 # --- MAPA NASTROJÓW ---
 MOOD_MAP = {
@@ -46,134 +60,70 @@ MOOD_MAP = {
     "think": [99, 36, 878]
 }
 
-async def fetch_discover(client, endpoint: str, params: dict) -> List[dict]:
-    results = []
-    base_url = f"{settings.TMDB_BASE_URL}{endpoint}"
-    # Zwiększamy liczbę stron do przeszukania, aby po ostrym filtrowaniu coś zostało
-    for page in range(1, 6): 
-        p = params.copy()
-        p["page"] = page
-        try:
-            resp = await client.get(base_url, params=p)
-            if resp.status_code == 200:
-                results.extend(resp.json().get("results", []))
-        except: pass
-    return results
-
-async def fetch_details_and_update(client, item):
-    media_type = item.get("media_type", "movie")
-    item_id = item.get("id")
-    try:
-        url = f"{settings.TMDB_BASE_URL}/{media_type}/{item_id}"
-        params = {"api_key": API_KEY, "language": "pl-PL"}
-        resp = await client.get(url, params=params)
-        
-        if resp.status_code == 200:
-            data = resp.json()
-            # Ujednolicenie pola runtime
-            if "runtime" in data:
-                item["runtime"] = data["runtime"]
-            elif "episode_run_time" in data and data["episode_run_time"]:
-                item["runtime"] = data["episode_run_time"][0]
-            else:
-                item["runtime"] = 0
-        else:
-            item["runtime"] = 0
-    except:
-        item["runtime"] = 0
-    return item
-
-def get_year_from_item(item):
-    d = item.get("release_date") or item.get("first_air_date")
-    if d and len(d) >= 4:
-        try: return int(d[:4])
-        except: return 0
-    return 0
-
-def calculate_score(item, user_profile, filters: RecFilters, mode: str):
-    score = 0.0
-    
-    pop = item.get("popularity", 0)
-    vote = item.get("vote_average", 0)
-    
-    if filters.preference == "niche":
-        score += (vote * 10)
-        score -= (pop / 2)
-    else:
-        score += (vote * 3) + (min(pop, 200) / 10.0)
-
-    if user_profile:
-        # A. Gatunki
-        if user_profile.get("top_genres"):
-            item_genres = set(item.get("genre_ids", []))
-            common = item_genres.intersection(user_profile["top_genres"])
-            if common:
-                score += 5.0 + (len(common) * 8.0)
-
-        # B. Zgodność Ocen
-        avg_user_vote = user_profile.get("avg_vote")
-        if avg_user_vote and avg_user_vote > 0:
-            diff = abs(vote - avg_user_vote)
-            affinity_bonus = max(0, 10.0 - (diff * 2))
-            score += affinity_bonus
-
-    if mode == "advanced" and filters and filters.genres:
-        item_genres = set(item.get("genre_ids", []))
-        common_manual = item_genres.intersection(set(filters.genres))
-        score += len(common_manual) * 3
-
-    score += random.uniform(0, 3.0)
-    return score
-
-@router.post("/generate")
-async def generate_recommendations(
-    req: RecRequest, 
-    request: Request,
-    db: AsyncSession = Depends(get_db)
-):
-    session_id = request.session.get("session_id")
-    
+async def fetch_discover(client: TMDBClient, endpoint: str, params: dict, pages=range(1, 6), enough=None,
+                         media_type: Optional[str] = None) -> List[Candidate]:
+    # Domyślnie 5 stron, żeby po ostrym filtrowaniu coś zostało.
+    # Strony lecą równolegle (fetch_pages), więc 5 stron kosztuje ~1 round trip.
+    # Każda strona od razu do odchudzonych rekordów - pełne słowniki TMDB nie żyją do końca requestu
+    fetched = await fetch_pages(client, endpoint, params, pages=pages, enough=enough,
+                                convert=Candidate.converter(media_type))
+    return fetched.results
+
+class RecPlan:
+    """Wynik kroków 1-3: profil użytkownika, filtry i źródła kandydatów (bez zapytań do TMDB)."""
+
+    def __init__(self, user_profile, fav_ids, preference, mood_genres, filters, queries, fetch_candidates):
+        self.user_profile = user_profile
+        self.fav_ids = fav_ids
+        self.preference = preference
+        self.mood_genres = mood_genres
+        self.filters = filters
+        self.queries = queries
+        self.fetch_candidates = fetch_candidates
+
+
+async def plan_recommendations(req: RecRequest, session_id: Optional[str], db: AsyncSession, client: TMDBClient) -> RecPlan:
     user_profile = {
         "top_genres": set(),
         "top_directors": set(),
-        "avg_vote": 0.0
+        "avg_vote": 0.0,
+        "similar": {},
+        "collab": {}
     }
     fav_ids = set()
+    extra_candidates = []  # podobne (treść) + "polubili też" (CF) - dodatkowe źródła kandydatów
 
-    # KROK 1: Analiza Ulubionych
+    # KROK 1: Analiza Ulubionych - gotowy profil (user_profiles) + same ID ulubionych
     if session_id and req.use_favorites:
-        stmt = select(FavoriteMovie).where(FavoriteMovie.user_session_id == session_id)
-        result = await db.execute(stmt)
-        favorites = result.scalars().all()
-        
-        all_genres = []
-        all_directors = []
-        total_vote = 0
-        vote_count = 0
-
-        for f in favorites:
-            fav_ids.add(f.tmdb_id)
-            try:
-                g = json.loads(f.genres_json)
-                all_genres.extend(g)
-            except: pass
-            
-            try:
-                if hasattr(f, 'directors_json') and f.directors_json:
-                    d = json.loads(f.directors_json)
-                    all_directors.extend(d)
-            except: pass
-
-            if f.vote_average:
-                total_vote += f.vote_average
-                vote_count += 1
-
-        if all_genres:
-            user_profile["top_genres"] = {x[0] for x in Counter(all_genres).most_common(5)}
-        if all_directors:
-            user_profile["top_directors"] = {x[0] for x in Counter(all_directors).most_common(3)}
-        if vote_count > 0:
-            user_profile["avg_vote"] = total_vote / vote_count
+        with span("profile"):
+            profile = await profiles.get_profile(db, session_id)
+            user_profile["top_genres"] = profiles.top_genres(profile, 5)
+            user_profile["top_directors"] = profiles.top_directors(profile, 3)
+            user_profile["avg_vote"] = profiles.avg_vote(profile)
+
+        with span("favorites"):
+            result = await db.execute(
+                select(FavoriteMovie.tmdb_id, FavoriteMovie.media_type).where(FavoriteMovie.user_session_id == session_id)
+            )
+            fav_keys = [(tmdb_id, m_type or "movie") for tmdb_id, m_type in result.all()]
+        fav_ids = {tmdb_id for tmdb_id, _ in fav_keys}
+
+        media_types = {"movie", "tv"} if req.target_type == "both" else {req.target_type}
+
+        # "Więcej takich jak moje ulubione" - top-K z indeksu podobieństwa treści
+        if fav_keys and settings.SIM_ENABLED:
+            with span("similar"):
+                similar = similarity.get_index().query(fav_keys, settings.SIM_TOP_K, media_types)
+            user_profile["similar"] = {(item["id"], item["media_type"]): sim for sim, item in similar}
+            extra_candidates.extend(Candidate.from_tmdb(item) for _, item in similar)
+
+        # "Kto polubił X, polubił też Y" - model CF trenowany na ulubionych wszystkich użytkowników
+        cf_model = collab.get_model()
+        if fav_keys and settings.COLLAB_ENABLED and cf_model is not None:
+            with span("collab"):
+                liked = cf_model.recommend(fav_keys, settings.COLLAB_TOP_K, media_types)
+                user_profile["collab"] = {key: s for s, key in liked}
+                extra_candidates.extend(await titles.stored_candidates(db, [key for _, key in liked]))
 
     # KROK 2: Parametry API
     preference = "popular"
@@ -187,7 +137,7 @@ async def generate_recommendations(
             mood_genres = MOOD_MAP[req.filters.mood]
 
     api_params = {
-        "api_key": API_KEY, "language": "pl-PL", 
+        "language": "pl-PL", 
         "include_adult": "false"
     }
 
@@ -229,106 +179,190 @@ async def generate_recommendations(
         separator = "," if (req.filters and req.filters.genre_mode == "and" and not mood_genres) else "|"
         api_params["with_genres"] = separator.join(map(str, unique_genres))
 
-    # KROK 3: Pobieranie Kandydatów
-    candidates = []
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        tasks = []
-        if req.target_type in ["movie", "both"]:
-            tasks.append(fetch_discover(client, "/discover/movie", api_params))
-        if req.target_type in ["tv", "both"]:
-            tasks.append(fetch_discover(client, "/discover/tv", api_params))
-            
-        if user_profile["top_directors"]:
-            directors_str = "|".join(map(str, user_profile["top_directors"]))
-            dir_params = api_params.copy()
-            dir_params.pop("with_genres", None) 
-            dir_params["with_crew"] = directors_str
-            if req.target_type in ["movie", "both"]:
-                tasks.append(fetch_discover(client, "/discover/movie", dir_params))
-        
-        res_list = await asyncio.gather(*tasks)
+    # KROK 3: Źródła Kandydatów (endpoint, parametry, typ)
+    queries = []
+    if req.target_type in ["movie", "both"]:
+        queries.append(("/discover/movie", api_params, "movie"))
+    if req.target_type in ["tv", "both"]:
+        queries.append(("/discover/tv", api_params, "tv"))
         
-        idx = 0
-        if req.target_type in ["movie", "both"] and idx < len(res_list):
-             for item in res_list[idx]: item["media_type"] = "movie"
-             candidates.extend(res_list[idx])
-             idx += 1
-        if req.target_type in ["tv", "both"] and idx < len(res_list):
-             for item in res_list[idx]: item["media_type"] = "tv"
-             candidates.extend(res_list[idx])
-             idx += 1
-
-    # KROK 4: Punktacja i Pierwsze Filtrowanie (bez detali)
-    scored_items = []
-    seen_ids = set()
-
-    for item in candidates:
-        mid = item.get("id")
-        if not mid or mid in fav_ids or mid in seen_ids: continue
-        if not item.get("poster_path"): continue
-
-        if preference == "niche":
-            if item.get("popularity", 0) > 15: continue
-            if item.get("vote_count", 0) > 800: continue
-
-        if req.mode == "advanced":
-            item_year = get_year_from_item(item)
-            if filters.year_min and item_year < filters.year_min: continue
-            if filters.year_max and item_year > filters.year_max: continue
-            if filters.vote_min and item.get("vote_average", 0) < filters.vote_min: continue
-            
-            item_genres = set(item.get("genre_ids", []))
-            if mood_genres:
-                if not set(mood_genres).intersection(item_genres): continue
-            if filters.genres and filters.genre_mode == "and":
-                if not set(filters.genres).issubset(item_genres): continue
-
-        seen_ids.add(mid)
-        score = calculate_score(item, user_profile, filters, req.mode)
-        scored_items.append((score, item))
-
-    scored_items.sort(key=lambda x: x[0], reverse=True)
-    
-    if not scored_items:
-        return {"results": []}
+    if user_profile["top_directors"]:
+        directors_str = "|".join(map(str, user_profile["top_directors"]))
+        dir_params = api_params.copy()
+        dir_params.pop("with_genres", None) 
+        dir_params["with_crew"] = directors_str
+        if req.target_type in ["movie", "both"]:
+            queries.append(("/discover/movie", dir_params, "movie"))
+
+    async def fetch_query(endpoint, params, m_type, pages) -> List[Candidate]:
+        # Najpierw lokalny korpus; TMDB tylko gdy korpus nie zna filtra albo ma za mało wyników
+        local = candidate_corpus.current()
+        if local is not None:
+            res = local.discover(endpoint, params, pages)
+            if res is not None and len(res) >= settings.CORPUS_MIN_RESULTS:
+                return [Candidate.from_tmdb(item, m_type) for item in res]
+        return await fetch_discover(client, endpoint, params, pages=pages, media_type=m_type)
+
+    async def fetch_candidates(pages) -> List[Candidate]:
+        with span("discover"):
+            res_list = await asyncio.gather(*(fetch_query(ep, p, m_type, pages) for ep, p, m_type in queries))
+        candidates = []
+        # Podobne / CF jako dodatkowe źródło - tylko w trybie szybkim (w zaawansowanym
+        # nie spełniają filtrów API typu kraj/dostawca, więc działają tylko jako bonus punktowy)
+        if req.mode == "quick" and pages[0] == 1:
+            candidates.extend(extra_candidates)
+        for res in res_list:
+            candidates.extend(res)
+        return candidates
+
+    return RecPlan(user_profile, fav_ids, preference, mood_genres, filters, queries, fetch_candidates)
 
-    # Bierzemy większą pulę do sprawdzenia detali, bo Hard Filter może odrzucić wiele filmów
-    top_candidates = scored_items[:30] # Zwiększamy pulę z 20 do 30
-    
-    final_results = []
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        # Pobieramy pełne detale (w tym dokładny runtime)
-        tasks = [fetch_details_and_update(client, item[1]) for item in top_candidates]
-        updated_items = await asyncio.gather(*tasks)
-        
-        for item in updated_items:
-            # --- HARD FILTER CZASU TRWANIA ---
-            # To jest kluczowa zmiana. Sprawdzamy dokładny czas po pobraniu detali.
-            # Jeśli film nie mieści się w widełkach, nie dodajemy go do final_results.
-            
-            if req.mode == "advanced":
-                r_val = item.get("runtime", 0)
-                # Sprawdzamy tylko jeśli runtime > 0 (żeby nie wycinać filmów z brakiem danych, chyba że chcesz ostro)
-                # Zakładamy, że jak 0 to przepuszczamy, albo odrzucamy - tu wersja "Soft na brak danych"
-                if r_val > 0:
-                    if filters.runtime_min and r_val < filters.runtime_min: continue
-                    if filters.runtime_max and r_val > filters.runtime_max: continue
-            
-            # -------------------------------
-
-            title = item.get("title") or item.get("name")
-            final_results.append({
-                "id": item.get("id"), 
-                "title": title, 
-                "poster_path": item.get("poster_path"),
-                "vote_average": item.get("vote_average"),
-                "release_date": item.get("release_date") or item.get("first_air_date"),
-                "media_type": item.get("media_type"),
-                "runtime": item.get("runtime", 0)
-            })
-
-    # Ponieważ mogliśmy odrzucić filmy, lista może być krótsza niż 20.
-    # Jeśli chcesz zawsze 20, trzeba by pobierać więcej w pętli, ale to skomplikuje kod.
-    # Obecna wersja zwraca to, co przeszło przez filtr (max 30).
-    
-    return {"results": final_results}
\ No newline at end of file
+
+@router.post("/generate")
+async def generate_recommendations(
+    req: RecRequest, 
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    client: TMDBClient = Depends(get_tmdb)
+):
+    # Gotowa odpowiedź - bez przechodzenia wyników przez jsonable_encoder
+    return FastJSONResponse(await recommend(req, request.session.get("session_id"), db, client))
+
+
+@router.post("/stream")
+async def stream_recommendations(req: RecRequest, request: Request, client: TMDBClient = Depends(get_tmdb)):
+    """
+    Te same wyniki co /generate, ale jako NDJSON: linia {"type": "result", "item": ...} zaraz po tym,
+    jak tytuł przejdzie hard filtr, na końcu {"type": "done", "next_offset": ..., "count": ...}.
+    Błąd po wysłaniu nagłówków 200 kończy strumień linią {"type": "error", "status": ..., "detail": ...}
+    (handler 503 z app/main.py już nie zadziała) - brak "done" oznacza niepełną listę.
+    """
+    session_id = request.session.get("session_id")
+
+    async def lines():
+        # Zależność get_db kończy się przed strumieniowaniem - własna sesja bazy
+        try:
+            async with AsyncSessionLocal() as db:
+                async with aclosing(iter_recommendations(req, session_id, db, client)) as events:
+                    async for event in events:
+                        yield dumps(event) + b"\n"
+        except TMDBUnavailable:
+            yield dumps({"type": "error", "status": 503, "detail": "TMDB chwilowo niedostępne"}) + b"\n"
+        except Exception as e:
+            print(f"Błąd strumienia rekomendacji: {e}")
+            yield dumps({"type": "error", "status": 500, "detail": "Błąd generowania rekomendacji"}) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def recommend(req: RecRequest, session_id: Optional[str], db: AsyncSession, client: TMDBClient) -> dict:
+    results, next_offset = [], None
+    async with aclosing(iter_recommendations(req, session_id, db, client)) as events:
+        async for event in events:
+            if event["type"] == "result":
+                results.append(event["item"])
+            else:
+                next_offset = event["next_offset"]
+    return {"results": results, "next_offset": next_offset}
+
+
+async def iter_recommendations(req: RecRequest, session_id: Optional[str], db: AsyncSession, client: TMDBClient
+                               ) -> AsyncIterator[dict]:
+    """Zdarzenia "result" w kolejności rankingu, gdy tylko są gotowe, i na końcu jedno "done"."""
+    # Ranking z cache (ten sam użytkownik, tryb, typ i filtry) - kroki 1-3 tylko gdy trzeba dociągnąć kandydatów
+    version = await fav_store.get_version(db, session_id) if session_id else 0
+    cache_key = rec_cache.make_key(session_id, version, req)
+    state = await rec_cache.get_state(cache_key)
+    plan = None
+    if state is None:
+        plan = await plan_recommendations(req, session_id, db, client)
+        state = rec_cache.RecState(plan.fav_ids, req.seed)
+        await rec_cache.put_state(cache_key, state)
+
+    # KROK 4: Punktacja i Pierwsze Filtrowanie (bez detali) - wektorowo, cała partia naraz
+    def score_candidates(candidates) -> List[tuple]:
+        with span("scoring"):
+            return scoring.score_candidates(
+                candidates, plan.user_profile, plan.filters, req.mode, plan.preference, plan.mood_genres,
+                state.seen_ids, state.rng
+            )
+
+    # KROK 5: Detale partiami w kolejności punktacji + Hard Filter czasu trwania.
+    # Idziemy po uszeregowanej liście od `offset`; kończymy, gdy mamy `limit` wyników albo skończy
+    # się budżet czasu. Gdy lista się wyczerpie, dociągamy leniwie kolejne strony discover
+    # (do REC_MAX_PAGES) i dopisujemy je na koniec listy - kolejne strony wyników są stabilne.
+    filters = req.filters or RecFilters()
+    limit = max(1, min(req.limit, 100))
+    runtime_filter = req.mode == "advanced" and bool(filters.runtime_min or filters.runtime_max)
+    deadline = time.monotonic() + settings.REC_TIME_BUDGET
+
+    count = 0
+    cursor = max(0, req.offset)
+    while count < limit and time.monotonic() < deadline:
+        if cursor >= len(state.ranked):
+            # Blokada tylko na dociąganie kandydatów, nigdy na czas yield - wolny czytelnik strumienia
+            # trzymałby ją dowolnie długo (a anonimowi użytkownicy dzielą jeden stan na filtry).
+            # Lista tylko rośnie, więc wycinek czytamy już bez blokady.
+            async with state.lock:
+                if cursor < len(state.ranked):
+                    continue  # ktoś inny dociągnął, gdy czekaliśmy na blokadę
+                if state.exhausted or state.next_page > settings.REC_MAX_PAGES:
+                    break
+                if plan is None:
+                    plan = await plan_recommendations(req, session_id, db, client)
+                if not plan.queries:
+                    state.exhausted = True
+                    break
+                last_page = min(state.next_page + settings.REC_PAGES_PER_ROUND, settings.REC_MAX_PAGES + 1)
+                candidates = await plan.fetch_candidates(range(state.next_page, last_page))
+                state.next_page = last_page
+                if not candidates:
+                    state.exhausted = True  # TMDB nie ma już kolejnych stron
+                    break
+                state.ranked.extend(item for _, item in score_candidates(candidates))
+            continue
+
+        # Bez hard filtra wszystko przejdzie - pobieramy dokładnie tyle, ile brakuje
+        needed = limit - count
+        batch_size = max(needed, settings.REC_DETAILS_BATCH) if runtime_filter else needed
+        batch = state.ranked[cursor:cursor + batch_size]
+
+        # Dokładny runtime bierzemy z lokalnych metadanych - do TMDB idą tylko brakujące tytuły,
+        # równolegle, a każdy tytuł wychodzi, gdy tylko on i wyżej uszeregowane są gotowe
+        by_key = {(item.id, item.media_type): item for item in batch}
+        with span("details"):
+            async with aclosing(titles.iter_titles(db, client, by_key)) as rows:
+                async for key, row in rows:
+                    item = by_key[key]
+                    cursor += 1
+                    item.runtime = row.runtime if row else 0
+
+                    # --- HARD FILTER CZASU TRWANIA ---
+                    if runtime_filter:
+                        r_val = item.runtime
+                        # Sprawdzamy tylko jeśli runtime > 0 (żeby nie wycinać filmów z brakiem danych)
+                        # Wersja "Soft na brak danych" - jak 0, to przepuszczamy
+                        if r_val > 0:
+                            if filters.runtime_min and r_val < filters.runtime_min: continue
+                            if filters.runtime_max and r_val > filters.runtime_max: continue
+
+                    count += 1
+                    yield {"type": "result", "item": item.to_dict()}
+                    if count >= limit:
+                        break
+
+    has_more = cursor < len(state.ranked) or not (state.exhausted or state.next_page > settings.REC_MAX_PAGES)
+
+    # next_offset - pozycja w rankingu dla "pokaż więcej" (None = koniec listy)
+    yield {"type": "done", "next_offset": cursor if has_more else None, "count": count}
+
+
+async def prewarm_recommendations(session_id: str, client: TMDBClient):
+    """Po dodaniu ulubionego liczymy w tle ranking szybkiego trybu - następne kliknięcie trafia w cache."""
+    for target in settings.REC_PREWARM_TARGETS:
+        try:
+            async with AsyncSessionLocal() as db:
+                await recommend(RecRequest(mode="quick", target_type=target), session_id, db, client)
+            rec_cache.record_prewarm()
+        except Exception as e:
+            print(f"Błąd pre-warmu rekomendacji: {e}")
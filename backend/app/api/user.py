@@ -1,21 +1,26 @@
-from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, Response, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-import json
-import os
+from sqlalchemy.exc import IntegrityError
 from collections import Counter
-import httpx 
+from typing import Dict, List, Literal, Optional, Tuple, Union
+import json
 
-from app.db.database import get_db
-from app.db.models import FavoriteMovie
+from app.db.database import AsyncSessionLocal, get_db
+from app.db.models import FavoriteMovie, TitleMetadata
 from app.core.templates import templates
+from app.core.tmdb import TMDBClient, get_tmdb
+from app.services import titles
+from app.services import profile as profiles
+from app.services import favorites as fav_store
 from app.core.config import settings
+from app.core.http_cache import make_etag, not_modified, set_cache_headers
+from app.api.suggestions import prewarm_recommendations
 
 router = APIRouter(prefix="/user", tags=["user"])
 
-API_KEY = os.getenv("TMDB_API_KEY") or settings.TMDB_API_KEY
-BASE_URL = settings.TMDB_BASE_URL
-
 GENRE_MAP = {
     28: "Akcja", 12: "Przygodowy", 16: "Animacja", 35: "Komedia", 80: "Kryminał",
     99: "Dokument", 18: "Dramat", 10751: "Familijny", 14: "Fantasy", 36: "Historyczny",
@@ -28,17 +33,40 @@ async def favorites_page(request: Request):
     return templates.TemplateResponse("favorites.html", {"request": request})
 
 @router.get("/favorites.json")
-async def get_favorites_json(request: Request, db: AsyncSession = Depends(get_db)):
+async def get_favorites_json(
+    request: Request,
+    response: Response,
+    after: Optional[int] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Lista ulubionych stronami (keyset po id wiersza): `next` to kursor do `?after=`, None na końcu.
+    ETag z wersji listy - niezmieniona lista to 304 bez zapytania o wiersze.
+    """
     session_id = request.session.get("session_id")
     if not session_id:
-        return {"favorites": []} 
-        
-    stmt = select(FavoriteMovie).where(FavoriteMovie.user_session_id == session_id)
-    result = await db.execute(stmt)
-    favorites = result.scalars().all()
-    
+        return {"favorites": [], "next": None}
+
+    limit = max(1, min(limit or settings.FAVORITES_PAGE_SIZE, settings.FAVORITES_PAGE_MAX))
+    # Wersja PRZED wierszami - przy równoległej zmianie ETag najwyżej się zdezaktualizuje, nigdy odwrotnie
+    version = await fav_store.get_version(db, session_id)
+    etag = make_etag("favorites", session_id, version, after, limit)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    # Same kolumny, bez obiektów ORM
+    stmt = select(
+        FavoriteMovie.id, FavoriteMovie.tmdb_id, FavoriteMovie.title, FavoriteMovie.poster_path,
+        FavoriteMovie.vote_average, FavoriteMovie.release_date, FavoriteMovie.media_type, FavoriteMovie.runtime
+    ).where(FavoriteMovie.user_session_id == session_id)
+    if after is not None:
+        stmt = stmt.where(FavoriteMovie.id > after)
+    rows = (await db.execute(stmt.order_by(FavoriteMovie.id).limit(limit + 1))).all()
+
     out = []
-    for f in favorites:
+    for f in rows[:limit]:
         out.append({
             "id": f.tmdb_id,
             "title": f.title,
@@ -48,13 +76,37 @@ async def get_favorites_json(request: Request, db: AsyncSession = Depends(get_db
             "media_type": f.media_type,
             "runtime": f.runtime
         })
-    return {"favorites": out}
+    set_cache_headers(response, etag)
+    return {"favorites": out, "next": rows[limit - 1].id if len(rows) > limit else None}
+
+
+@router.get("/favorites/ids")
+async def get_favorite_ids(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    """
+    Klucze ulubionych "movie:603" / "tv:1396" (do zaznaczania serduszek) + wersja listy;
+    warunkowy GET jak favorites.json.
+    """
+    session_id = request.session.get("session_id")
+    if not session_id:
+        return {"version": 0, "keys": []}
+
+    version = await fav_store.get_version(db, session_id)
+    etag = make_etag("favorite-keys", session_id, version)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    set_cache_headers(response, etag)
+    return {"version": version, "keys": await fav_store.get_keys(db, session_id)}
 
 @router.post("/favorite/{tmdb_id}")
 async def toggle_favorite(
     tmdb_id: int, 
     request: Request, 
-    db: AsyncSession = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    media_type: Optional[Literal["movie", "tv"]] = None,  # bez typu: najpierw film, potem serial
+    db: AsyncSession = Depends(get_db),
+    client: TMDBClient = Depends(get_tmdb)
 ):
     session_id = request.session.get("session_id")
     if not session_id:
@@ -64,11 +116,17 @@ async def toggle_favorite(
         FavoriteMovie.user_session_id == session_id,
         FavoriteMovie.tmdb_id == tmdb_id
     )
-    result = await db.execute(stmt)
+    if media_type:
+        stmt = stmt.where(FavoriteMovie.media_type == media_type)
+    result = await db.execute(stmt.order_by(FavoriteMovie.media_type).limit(1))
     existing = result.scalar_one_or_none()
 
     if existing:
+        attrs = await fav_store.get_attributes(db, existing.id)
+        await fav_store.delete_attributes(db, existing.id)
         await db.delete(existing)
+        await fav_store.bump_version(db, session_id)
+        await profiles.update_profile(db, session_id, [(existing, attrs, -1)])
         await db.commit()
         return {"removed": True}
     else:
@@ -76,53 +134,23 @@ async def toggle_favorite(
         poster = ""
         date = ""
         vote = 0.0
-        m_type = "movie"
+        m_type = media_type or "movie"
         runtime = 0
-        genre_ids = []
-        director_ids = [] # Lista ID reżyserów
+        attrs = fav_store.empty_attributes() # Gatunki, reżyserzy, obsada, słowa kluczowe (ID)
 
         try:
-            async with httpx.AsyncClient() as client:
-                # Dodajemy append_to_response, żeby pobrać ekipę (credits) w jednym strzale
-                params = {
-                    "api_key": API_KEY, 
-                    "language": "pl-PL",
-                    "append_to_response": "credits"
-                }
-                
-                resp = await client.get(f"{BASE_URL}/movie/{tmdb_id}", params=params)
-                
-                if resp.status_code != 200:
-                    m_type = "tv"
-                    resp = await client.get(f"{BASE_URL}/tv/{tmdb_id}", params=params)
-                
-                if resp.status_code == 200:
-                    data = resp.json()
-                    
-                    title = data.get("title") or data.get("name") or "Bez tytułu"
-                    poster = data.get("poster_path")
-                    date = data.get("release_date") or data.get("first_air_date")
-                    vote = data.get("vote_average") or 0.0
-                    
-                    genres_data = data.get("genres", [])
-                    genre_ids = [g["id"] for g in genres_data]
-                    
-                    if "runtime" in data:
-                        runtime = data["runtime"] or 0
-                    elif "episode_run_time" in data and data["episode_run_time"]:
-                        runtime = data["episode_run_time"][0]
-
-                    # Ekstrakcja Reżyserów / Twórców
-                    if m_type == "movie":
-                        crew = data.get("credits", {}).get("crew", [])
-                        director_ids = [m['id'] for m in crew if m.get("job") == "Director"]
-                    else:
-                        # W serialach są "created_by"
-                        created_by = data.get("created_by", [])
-                        director_ids = [p['id'] for p in created_by]
-
-                else:
-                    print(f"BŁĄD TMDB API: Status {resp.status_code} dla ID {tmdb_id}")
+            # Metadane najpierw z lokalnej bazy (title_metadata), TMDB tylko gdy ich brak
+            meta = await titles.get_title(db, client, tmdb_id, media_type)
+            if meta is not None:
+                title = meta.title
+                poster = meta.poster_path
+                date = meta.release_date
+                vote = meta.vote_average or 0.0
+                m_type = meta.media_type
+                runtime = meta.runtime or 0
+                attrs = fav_store.attributes_from_metadata(meta)
+            else:
+                print(f"BŁĄD TMDB API: brak danych dla ID {tmdb_id}")
 
         except Exception as e:
             print(f"WYJĄTEK W TOGGLE_FAVORITE: {e}")
@@ -135,67 +163,284 @@ async def toggle_favorite(
             poster_path=poster,
             release_date=date,
             vote_average=vote,
-            runtime=runtime,
-            genres_json=json.dumps(genre_ids),
-            directors_json=json.dumps(director_ids) # Zapisujemy reżyserów
+            runtime=runtime
         )
         db.add(new_fav)
+        try:
+            await db.flush()  # potrzebujemy new_fav.id dla tabel atrybutów
+        except IntegrityError:
+            # Równoległe kliknięcie już dodało ten tytuł (unikalny indeks user+tmdb_id+typ)
+            await db.rollback()
+            return {"removed": False, "added": True}
+        # Dopiero po flush - upsert wersji zrobiłby autoflush new_fav poza try powyżej
+        await fav_store.bump_version(db, session_id)
+        fav_store.add_attributes(db, new_fav.id, attrs)
+        await profiles.update_profile(db, session_id, [(new_fav, attrs, 1)])
         await db.commit()
+        if settings.REC_PREWARM:
+            # Po wysłaniu odpowiedzi - liczymy ranking, zanim użytkownik wejdzie w rekomendacje
+            background_tasks.add_task(prewarm_recommendations, session_id, client)
         return {"removed": False, "added": True}
 
+class BatchItem(BaseModel):
+    id: int
+    media_type: Optional[Literal["movie", "tv"]] = None  # bez typu: najpierw film, potem serial
+
+
+class FavoritesBatch(BaseModel):
+    add: List[Union[int, BatchItem]] = []
+    remove: List[Union[int, BatchItem]] = []  # bez typu: każdy ulubiony o tym ID
+
+
+BatchKey = Tuple[int, Optional[str]]  # (tmdb_id, media_type albo None = bez typu)
+
+
+def _favorite_from_metadata(session_id: str, meta: TitleMetadata) -> FavoriteMovie:
+    return FavoriteMovie(
+        user_session_id=session_id,
+        tmdb_id=meta.tmdb_id,
+        media_type=meta.media_type,
+        title=meta.title,
+        poster_path=meta.poster_path,
+        release_date=meta.release_date,
+        vote_average=meta.vote_average or 0.0,
+        runtime=meta.runtime or 0
+    )
+
+
+async def _batch_metadata(db: AsyncSession, client: TMDBClient, items: List[BatchKey]
+                          ) -> Dict[BatchKey, TitleMetadata]:
+    """Metadane partiami po FAVORITES_BATCH_CONCURRENCY tytułów (każda partia równolegle)."""
+    found: Dict[BatchKey, TitleMetadata] = {}
+    step = max(1, settings.FAVORITES_BATCH_CONCURRENCY)
+    # Druga runda tylko dla ID bez typu, których TMDB nie zna jako filmu
+    for m_pass, fallback in (("movie", False), ("tv", True)):
+        pending = [(i, m) for i, m in items if (i, m) not in found and (not fallback or m is None)]
+        for start in range(0, len(pending), step):
+            chunk = pending[start:start + step]
+            rows = await titles.get_titles(db, client, [(i, m or m_pass) for i, m in chunk])
+            for i, m in chunk:
+                if (i, m or m_pass) in rows:
+                    found[(i, m)] = rows[(i, m or m_pass)]
+    return found
+
+
+def _item(tmdb_id: int, media_type: Optional[str]) -> dict:
+    return {"id": tmdb_id, "media_type": media_type}
+
+
+async def apply_batch(db: AsyncSession, client: TMDBClient, session_id: str,
+                      add: List[BatchKey], remove: List[BatchKey]) -> dict:
+    """
+    Dodaje/usuwa wiele ulubionych w jednej transakcji: jeden SELECT istniejących, metadane
+    z title_metadata (TMDB tylko dla brakujących) i jeden commit na całą partię.
+    Tytuł to (id, typ) - film i serial o tym samym ID są osobnymi ulubionymi. Pozycja bez typu
+    (add: najpierw film, potem serial; remove: każdy typ) pasuje do istniejącego ulubionego o tym ID.
+    W odpowiedzi listy {"id", "media_type"}; w `skipped` także pozycje, które po ustaleniu typu
+    okazały się tym samym tytułem co wcześniejsza pozycja partii.
+    Rzuca IntegrityError, gdy równoległy request dodał któryś tytuł w międzyczasie.
+    """
+    def removed(i: int, m: Optional[str]) -> bool:
+        return (i, None) in remove_keys or (m is not None and (i, m) in remove_keys)
+
+    remove_keys = set(remove)
+    add = [(i, m) for i, m in dict.fromkeys(add) if not removed(i, m)]
+    ids = {i for i, _ in remove_keys} | {i for i, _ in add}
+    if not ids:
+        return {"added": [], "removed": [], "skipped": [], "missing": []}
+
+    result = await db.execute(select(FavoriteMovie).where(
+        FavoriteMovie.user_session_id == session_id,
+        FavoriteMovie.tmdb_id.in_(ids)
+    ))
+    existing = result.scalars().all()
+    existing_keys = {(f.tmdb_id, f.media_type or "movie") for f in existing}
+    existing_ids = {f.tmdb_id for f in existing}
+
+    def exists(i: int, m: Optional[str]) -> bool:
+        return (i, m) in existing_keys if m is not None else i in existing_ids
+
+    skipped = [_item(i, m) for i, m in add if exists(i, m)]
+    to_add = [(i, m) for i, m in add if not exists(i, m)]
+    # Metadane przed zmianami w ulubionych - get_titles zapisuje title_metadata upsertem i commituje
+    metas = await _batch_metadata(db, client, to_add)
+    missing = [_item(i, m) for i, m in to_add if (i, m) not in metas]
+
+    to_remove = [f for f in existing if removed(f.tmdb_id, f.media_type or "movie")]
+    attrs_map = await fav_store.get_attributes_many(db, [f.id for f in to_remove])
+    changes = [(fav, attrs_map[fav.id], -1) for fav in to_remove]
+    for fav in to_remove:
+        await db.delete(fav)
+    await fav_store.delete_attributes_many(db, [f.id for f in to_remove])
+
+    # Pozycja bez typu mogła wskazać ten sam tytuł co inna pozycja partii - liczy się pierwsza
+    new_metas: Dict[Tuple[int, str], TitleMetadata] = {}
+    for i, m in to_add:
+        meta = metas.get((i, m))
+        if meta is None:
+            continue
+        key = (meta.tmdb_id, meta.media_type)
+        if key in new_metas or key in existing_keys:
+            skipped.append(_item(i, m))
+        else:
+            new_metas[key] = meta
+    new_favs = [_favorite_from_metadata(session_id, meta) for meta in new_metas.values()]
+    db.add_all(new_favs)
+    try:
+        await db.flush()  # id nowych wierszy dla tabel atrybutów
+    except IntegrityError:
+        await db.rollback()
+        raise
+    if new_favs or to_remove:
+        await fav_store.bump_version(db, session_id)
+    for fav in new_favs:
+        attrs = fav_store.attributes_from_metadata(new_metas[(fav.tmdb_id, fav.media_type)])
+        fav_store.add_attributes(db, fav.id, attrs)
+        changes.append((fav, attrs, 1))
+    if changes:
+        await profiles.update_profile(db, session_id, changes)
+    await db.commit()
+    return {
+        "added": [_item(f.tmdb_id, f.media_type) for f in new_favs],
+        "removed": [_item(f.tmdb_id, f.media_type) for f in to_remove],
+        "skipped": skipped,
+        "missing": missing,
+    }
+
+
+@router.post("/favorites/batch")
+async def favorites_batch(
+    batch: FavoritesBatch,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    client: TMDBClient = Depends(get_tmdb)
+):
+    session_id = request.session.get("session_id")
+    if not session_id:
+        raise HTTPException(status_code=401, detail="Not logged in")
+    if len(batch.add) + len(batch.remove) > settings.FAVORITES_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Max {settings.FAVORITES_BATCH_MAX} ids per batch")
+
+    add = [(a, None) if isinstance(a, int) else (a.id, a.media_type) for a in batch.add]
+    remove = [(r, None) if isinstance(r, int) else (r.id, r.media_type) for r in batch.remove]
+    try:
+        out = await apply_batch(db, client, session_id, add, remove)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Favorites changed concurrently, retry")
+    if out["added"] and settings.REC_PREWARM:
+        background_tasks.add_task(prewarm_recommendations, session_id, client)
+    return out
+
+
+IMPORT_LISTS = ("favorite", "watchlist")
+
+
+async def _account_id(request: Request, client: TMDBClient, session_id: str) -> Optional[int]:
+    account_id = request.session.get("tmdb_account_id")
+    if account_id:
+        return account_id
+    resp = await client.get("/account", params={"session_id": session_id})
+    if resp.status_code != 200:
+        return None
+    account_id = resp.json().get("id")
+    request.session["tmdb_account_id"] = account_id
+    return account_id
+
+
+@router.post("/import/tmdb")
+async def import_from_tmdb(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    lists: str = "favorite,watchlist",
+    client: TMDBClient = Depends(get_tmdb)
+):
+    """
+    Import ulubionych i watchlisty z konta TMDB. Odpowiedź to NDJSON z postępem - jedna linia
+    na przetworzoną stronę listy (każda strona to jedna partia i jeden commit), na końcu podsumowanie.
+    """
+    session_id = request.session.get("session_id")
+    if not session_id:
+        raise HTTPException(status_code=401, detail="Not logged in")
+    wanted = [l for l in lists.split(",") if l in IMPORT_LISTS]
+    if not wanted:
+        raise HTTPException(status_code=400, detail=f"lists: {', '.join(IMPORT_LISTS)}")
+    # Przed startem strumienia - potem nie da się już ustawić ciasteczka sesji
+    account_id = await _account_id(request, client, session_id)
+    if not account_id:
+        raise HTTPException(status_code=401, detail="TMDB account unavailable")
+
+    async def progress():
+        totals = {"added": 0, "skipped": 0, "missing": 0}
+        # Zależność get_db kończy się przed strumieniowaniem - własna sesja bazy
+        async with AsyncSessionLocal() as db:
+            for list_name in wanted:
+                for media_type, suffix in (("movie", "movies"), ("tv", "tv")):
+                    page, total_pages = 1, 1
+                    while page <= min(total_pages, settings.FAVORITES_IMPORT_MAX_PAGES):
+                        line = {"list": list_name, "media_type": media_type, "page": page}
+                        try:
+                            # Dane konta są prywatne - bez wspólnego cache odpowiedzi
+                            resp = await client.get(f"/account/{account_id}/{list_name}/{suffix}",
+                                                    params={"session_id": session_id, "page": page,
+                                                            "language": "pl-PL", "sort_by": "created_at.asc"})
+                            if resp.status_code != 200:
+                                raise RuntimeError(f"TMDB {resp.status_code}")
+                            data = resp.json()
+                            total_pages = data.get("total_pages") or 1
+                            ids = [(r["id"], media_type) for r in data.get("results", []) if r.get("id")]
+                            out = await apply_batch(db, client, session_id, ids, [])
+                        except Exception as e:
+                            print(f"Błąd importu z TMDB ({list_name}/{suffix}, strona {page}): {e}")
+                            await db.rollback()
+                            yield json.dumps({**line, "error": str(e)}) + "\n"
+                            break
+                        for k in totals:
+                            totals[k] += len(out[k])
+                        yield json.dumps({**line, "total_pages": total_pages, "added": len(out["added"]),
+                                          "skipped": len(out["skipped"]), "missing": len(out["missing"])}) + "\n"
+                        page += 1
+        if totals["added"] and settings.REC_PREWARM:
+            background_tasks.add_task(prewarm_recommendations, session_id, client)
+        yield json.dumps({"done": True, **totals}) + "\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+
 @router.get("/stats")
 async def get_user_stats(request: Request, db: AsyncSession = Depends(get_db)):
     session_id = request.session.get("session_id")
     if not session_id:
         return {"count": 0, "top_genre": "Brak danych", "avg_rating": 0, "avg_runtime": "0 min"}
 
-    stmt = select(FavoriteMovie).where(FavoriteMovie.user_session_id == session_id)
-    result = await db.execute(stmt)
-    movies = result.scalars().all()
+    # Wszystko z gotowego profilu (user_profiles) - bez skanowania ulubionych
+    profile = await profiles.get_profile(db, session_id)
 
-    count = len(movies)
+    count = profile.favorites_count or 0
     if count == 0:
         return {"count": 0, "top_genre": "Brak danych", "avg_rating": 0, "avg_runtime": "0 min"}
 
-    all_genres = []
-    total_rating = 0
-    total_runtime = 0
-    valid_ratings = 0
-    valid_runtimes = 0
-
-    for m in movies:
-        if m.vote_average:
-            total_rating += m.vote_average
-            valid_ratings += 1
-        
-        if m.runtime and m.runtime > 0:
-            total_runtime += m.runtime
-            valid_runtimes += 1
-            
-        try:
-            if m.genres_json:
-                g_list = json.loads(m.genres_json)
-                for g_id in g_list:
-                    if g_id in GENRE_MAP:
-                        all_genres.append(GENRE_MAP[g_id])
-        except: pass
+    genre_totals = Counter()
+    for g_id, g_count in profiles.genre_counts(profile).items():
+        if g_id in GENRE_MAP:
+            genre_totals[GENRE_MAP[g_id]] += g_count
 
     top_genre_str = "Mieszany"
-    if all_genres:
-        most_common = Counter(all_genres).most_common(1)
+    if genre_totals:
+        most_common = genre_totals.most_common(1)
         if most_common:
             g_name = most_common[0][0]
             g_count = most_common[0][1]
-            percent = int((g_count / len(all_genres)) * 100)
+            percent = int((g_count / sum(genre_totals.values())) * 100)
             top_genre_str = f"{g_name} ({percent}%)"
 
     avg_rating = 0
-    if valid_ratings > 0:
-        avg_rating = round(total_rating / valid_ratings, 1)
+    if profile.vote_n:
+        avg_rating = round(profiles.avg_vote(profile), 1)
 
     avg_runtime_str = "0 min"
-    if valid_runtimes > 0:
-        avg_min = int(total_runtime / valid_runtimes)
+    if profile.runtime_n:
+        avg_min = int(profiles.avg_runtime(profile))
         h = avg_min // 60
         m = avg_min % 60
         if h > 0:
@@ -208,4 +453,4 @@ async def get_user_stats(request: Request, db: AsyncSession = Depends(get_db)):
         "top_genre": top_genre_str,
         "avg_rating": avg_rating,
         "avg_runtime": avg_runtime_str
-    }
\ No newline at end of file
+    }
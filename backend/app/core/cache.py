@@ -0,0 +1,167 @@
+# backend/app/core/cache.py
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urlencode
+import asyncio
+import time
+
+from app.core.singleflight import SingleFlight
+
+
+class CacheEntry:
+    """Wartość w cache + dwa terminy: do kiedy świeża i do kiedy można ją jeszcze podać jako 'stale'."""
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value, fresh_until: float, stale_until: float):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class MemoryCache:
+    """
+    Backend w pamięci procesu - LRU ograniczone liczbą wpisów.
+    Interfejs (get/set/delete/clear) jest asynchroniczny, żeby dało się go podmienić
+    na backend współdzielony (np. Redis) bez zmian w ResponseCache.
+    """
+
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data: "OrderedDict[str, CacheEntry]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: CacheEntry):
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def make_key(path: str, params: Optional[dict] = None) -> str:
+    """Klucz = endpoint + znormalizowane (posortowane, bez api_key) parametry."""
+    items = sorted((k, str(v)) for k, v in (params or {}).items() if k != "api_key" and v is not None)
+    return f"{path}?{urlencode(items)}" if items else path
+
+
+class ResponseCache:
+    """
+    Cache odpowiedzi TMDB:
+    - TTL per wpis + okno stale-while-revalidate (przeterminowany wpis podajemy od razu,
+      a odświeżamy go w tle),
+    - coalescing: N równoległych missów na ten sam klucz = jedno zapytanie do TMDB,
+    - liczniki hit/miss do podglądu skuteczności,
+    - awaria upstreamu: podajemy ostatni znany wpis, nawet po oknie stale.
+    Wartości `None` (błąd / brak danych) nie są zapisywane.
+    Backend współdzielony między procesami (app/core/shared_cache.py) może dodatkowo mieć
+    claim/release/wait_for - wtedy coalescing działa też między workerami.
+    """
+
+    def __init__(self, backend=None, stale_factor: float = 1.0):
+        self.backend = backend if backend is not None else MemoryCache()
+        self.stale_factor = stale_factor
+        self._flight = SingleFlight()
+        self._background: set = set()  # referencje do zadań w tle, żeby GC ich nie zjadł
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+        self.fallbacks = 0  # podane przeterminowane wpisy, bo upstream nie odpowiedział
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable], ttl: float, min_fresh: float = 0):
+        """`min_fresh` > 0 (rozgrzewanie): wpis świeży jeszcze krócej niż tyle sekund pobieramy od razu."""
+        now = time.time()
+        entry = await self.backend.get(key)
+        if entry is not None:
+            if now < entry.fresh_until - min_fresh:
+                self.hits += 1
+                return entry.value
+            if now < entry.stale_until and not min_fresh:
+                self.stale_hits += 1
+                self._refresh_in_background(key, fetch, ttl)
+                return entry.value
+
+        self.misses += 1
+        try:
+            value = await self._load(key, fetch, ttl)
+        except Exception:
+            # Upstream leży - lepsze stare dane niż żadne
+            if entry is None:
+                raise
+            self.fallbacks += 1
+            return entry.value
+        if value is None and entry is not None:
+            self.fallbacks += 1
+            return entry.value
+        return value
+
+    async def _load(self, key: str, fetch: Callable[[], Awaitable], ttl: float):
+        return await self._flight.do(key, lambda: self._fetch_and_store(key, fetch, ttl))
+
+    async def _fetch_and_store(self, key: str, fetch: Callable[[], Awaitable], ttl: float):
+        claim = getattr(self.backend, "claim", None)
+        if claim is not None and not await claim(key):
+            # Ten sam klucz pobiera właśnie inny worker - czekamy na jego wpis, potem ewentualnie sami
+            entry = await self.backend.wait_for(key)
+            if entry is not None:
+                return entry.value
+            claim = None
+        try:
+            value = await fetch()
+            if value is not None:
+                now = time.time()
+                await self.backend.set(key, CacheEntry(value, now + ttl, now + ttl * (1 + self.stale_factor)))
+            return value
+        finally:
+            if claim is not None:
+                await self.backend.release(key)
+
+    def _refresh_in_background(self, key: str, fetch: Callable[[], Awaitable], ttl: float):
+        if key in self._flight:
+            return
+        self.refreshes += 1
+
+        async def _refresh():
+            try:
+                await self._load(key, fetch, ttl)
+            except Exception as e:
+                self.errors += 1
+                print(f"Błąd odświeżania cache ({key}): {e}")
+
+        task = asyncio.ensure_future(_refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def invalidate(self, key: str):
+        await self.backend.delete(key)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.backend) if hasattr(self.backend, "__len__") else None,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self._flight.deduplicated,
+            "coalesced_top": dict(self._flight.per_key.most_common(10)),
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "fallbacks": self.fallbacks,
+            "evictions": getattr(self.backend, "evictions", 0),
+            "shared": self.backend.stats() if hasattr(self.backend, "stats") else None,
+        }
@@ -0,0 +1,48 @@
+# backend/app/core/fastjson.py
+"""
+Szybkie (de)kodowanie JSON: orjson, jeśli jest zainstalowany (pip install orjson), inaczej
+standardowy `json` z kompaktowymi separatorami. FastJSONResponse to domyślna klasa odpowiedzi
+aplikacji (app/main.py); gorące endpointy zwracają ją wprost, z pominięciem jsonable_encoder.
+"""
+from typing import Any
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _default(obj):
+    # Rekordy z app/core/records.py i typy NumPy (np.int64 nie dziedziczy po int)
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+if ORJSON_AVAILABLE:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def loads(raw) -> Any:
+        return orjson.loads(raw)
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+else:
+    def loads(raw) -> Any:
+        return json.loads(raw)
+
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse kodowany przez `dumps` (orjson, gdy dostępny)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,66 @@
+# backend/app/core/http_cache.py
+"""
+Warunkowe GET-y: ETag z wersji danych + odpowiedź 304 Not Modified.
+
+Dane per użytkownik, więc `private` (bez cache współdzielonych proxy) i `no-cache`
+(przeglądarka trzyma kopię, ale zawsze pyta z If-None-Match - zmiana na serwerze widać od razu).
+"""
+from typing import Optional
+import gzip
+import hashlib
+
+from fastapi import Request, Response
+
+PRIVATE_REVALIDATE = "private, no-cache"
+# Odpowiedzi kompresowane przez gzip_body - treść (i ETag) zależy też od Accept-Encoding
+VARY_ENCODING = "Accept-Encoding, Cookie"
+
+
+def make_etag(*parts) -> str:
+    """Silny ETag z dowolnych części (ID sesji wchodzi w hash - nie wycieka w nagłówku)."""
+    raw = "\x1f".join(str(p) for p in parts).encode()
+    return '"' + hashlib.sha1(raw).hexdigest()[:24] + '"'
+
+
+def _matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match porównuje słabo - W/"x" pasuje do "x"
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def not_modified(request: Request, etag: str, cache_control: str = PRIVATE_REVALIDATE,
+                 vary: str = "Cookie") -> Optional[Response]:
+    """Pusta odpowiedź 304, gdy klient ma aktualną wersję; None - trzeba wysłać pełną treść."""
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control, "Vary": vary})
+    return None
+
+
+def set_cache_headers(response: Response, etag: str, cache_control: str = PRIVATE_REVALIDATE, vary: str = "Cookie"):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    response.headers["Vary"] = vary
+
+
+def accepts_gzip(request: Request, body: bytes, min_size: int = 1024) -> bool:
+    """Czy gzip_body skompresuje tę treść - np. do ETagu, który musi się różnić między kodowaniami."""
+    return len(body) >= min_size and "gzip" in request.headers.get("accept-encoding", "")
+
+
+def gzip_body(request: Request, response: Response, min_size: int = 1024, level: int = 6) -> Response:
+    """
+    Kompresja gotowej treści, gdy klient przyjmuje gzip, a treść nie jest za mała.
+    Tylko dla wybranych odpowiedzi - globalny GZipMiddleware buforowałby strumień rekomendacji (NDJSON).
+    """
+    vary = [v.strip() for v in response.headers.get("Vary", "").split(",") if v.strip()]
+    if "Accept-Encoding" not in vary:
+        response.headers["Vary"] = ", ".join(vary + ["Accept-Encoding"])
+    if not accepts_gzip(request, response.body, min_size):
+        return response
+    response.body = gzip.compress(response.body, compresslevel=level)
+    response.headers["Content-Encoding"] = "gzip"
+    response.headers["Content-Length"] = str(len(response.body))
+    return response
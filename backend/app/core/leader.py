@@ -0,0 +1,39 @@
+# backend/app/core/leader.py
+"""
+Wybór lidera między workerami na jednym hoście: nieblokujący flock na WARMER_LOCK_PATH.
+
+Zadania w tle, których wynik trafia do plików (korpus, model CF) albo do cache współdzielonego
+(rozgrzewanie), wykonuje tylko lider - reszta wczytuje jego wyniki. Lider zostaje nim do końca
+procesu; gdy worker zniknie, blokadę zwalnia system i przy następnej próbie przejmuje ją inny.
+"""
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows - bez wyboru lidera, każdy proces działa sam
+    fcntl = None
+
+from app.core.config import settings
+
+_lock_file = None
+
+
+def available() -> bool:
+    return fcntl is not None
+
+
+def is_leader() -> bool:
+    """Jedna blokada na proces (flock dotyczy otwartego pliku) - wspólna dla wszystkich zadań w tle."""
+    global _lock_file
+    if fcntl is None or _lock_file is not None:
+        return True
+    path = Path(settings.WARMER_LOCK_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = open(path, "a+")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _lock_file = f
+    return True
@@ -0,0 +1,78 @@
+# backend/app/core/paging.py
+from contextlib import nullcontext
+from typing import Any, AsyncContextManager, Callable, Iterable, List, Optional
+import asyncio
+import time
+
+from app.core.tmdb import TMDBClient
+from app.core.tracing import span
+
+
+class PagedFetch:
+    """Wynik pobierania stronicowanego: wyniki w kolejności stron + czasy poszczególnych stron."""
+    __slots__ = ("results", "timings", "stopped_early")
+
+    def __init__(self):
+        self.results: List[Any] = []  # słowniki TMDB albo rekordy z `convert`
+        self.timings: List[dict] = []  # {"page", "ms", "count", "ok"} - strony pobrane do końca
+        self.stopped_early = False
+
+
+async def fetch_pages(
+    client: TMDBClient,
+    path: str,
+    params: dict,
+    pages: Iterable[int] = range(1, 6),
+    enough: Optional[Callable[[List[Any]], bool]] = None,
+    convert: Optional[Callable[[dict], Any]] = None,
+    gate: Optional[AsyncContextManager] = None,
+) -> PagedFetch:
+    """
+    Pobiera strony listy TMDB równolegle (pod globalnym limiterem klienta), ale składa
+    wyniki w kolejności stron. `enough(results)` sprawdzamy po każdej kolejnej stronie -
+    gdy zwróci True, pozostałe (jeszcze czekające) strony są anulowane.
+    Błąd pojedynczej strony nie przerywa reszty - strona jest pomijana.
+    `convert` (np. Candidate.converter) zamienia wyniki od razu po zdekodowaniu strony -
+    pełne słowniki TMDB nie dożywają do końca requestu.
+    `gate` (np. resilience.Throttle) - dodatkowy limit dla pobierania w tle, brany przed każdą stroną.
+    Czas każdej strony (z oczekiwaniem na limiter i `convert`) trafia do `timings` i do spanu
+    "tmdb_page_<n>" (Server-Timing). Strony anulowane po `enough` przerywają też zapytanie do TMDB,
+    o ile nikt inny na nie nie czeka (SingleFlight klienta); token limitera mógł już zostać zużyty.
+    """
+    out = PagedFetch()
+
+    async def _one(page: int):
+        p = params.copy()
+        p["page"] = page
+        start = time.perf_counter()
+        with span(f"tmdb_page_{page}"):
+            try:
+                async with gate or nullcontext():
+                    data = await client.get_json(path, params=p)
+            except Exception as e:
+                print(f"Błąd strony {page} ({path}): {e}")
+                data = None
+            results = data.get("results", []) if data else []
+            if convert is not None:
+                results = [convert(r) for r in results]
+        out.timings.append({
+            "page": page,
+            "ms": round((time.perf_counter() - start) * 1000, 1),
+            "count": len(results),
+            "ok": data is not None,
+        })
+        return results
+
+    tasks = [asyncio.ensure_future(_one(page)) for page in pages]
+    try:
+        for task in tasks:
+            out.results.extend(await task)
+            if enough is not None and enough(out.results):
+                out.stopped_early = any(not t.done() for t in tasks)
+                break
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    out.timings.sort(key=lambda t: t["page"])
+    return out
@@ -0,0 +1,42 @@
+# backend/app/core/profiler.py
+"""
+Próbkujący profiler wątku pętli zdarzeń (opt-in: PROFILER_ENABLED=1).
+
+Osobny wątek co PROFILER_INTERVAL zagląda w bieżący stos wątku pętli (sys._current_frames)
+i zlicza stosy w formacie "folded" (a;b;c N) - wprost do flamegraph.pl / speedscope.
+Nic nie instrumentuje, więc poza oknem próbkowania nie kosztuje nic.
+"""
+from collections import Counter
+import asyncio
+import sys
+import threading
+import time
+
+_lock = asyncio.Lock()  # jedno próbkowanie naraz
+
+
+def _folded(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _sample(thread_id: int, seconds: float, interval: float, stacks: Counter):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            stacks[_folded(frame)] += 1
+        time.sleep(interval)
+
+
+async def profile(seconds: float, interval: float) -> str:
+    """Próbkuje pętlę przez `seconds` sekund; zwraca stosy "folded" od najczęstszych."""
+    async with _lock:
+        stacks: Counter = Counter()
+        # Wołane z pętli - jej wątek to bieżący wątek
+        await asyncio.to_thread(_sample, threading.get_ident(), seconds, interval, stacks)
+    return "\n".join(f"{stack} {n}" for stack, n in stacks.most_common()) + "\n"
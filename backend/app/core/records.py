@@ -0,0 +1,68 @@
+# backend/app/core/records.py
+"""
+Odchudzone rekordy z odpowiedzi TMDB.
+
+Strona /discover czy /movie/popular to ~20 pełnych słowników (overview, backdrop_path,
+original_title...), a rekomendacje i listy na stronie głównej korzystają z kilku pól.
+`Candidate` (__slots__) trzyma tylko te pola - pełny słownik strony znika zaraz po konwersji
+(fetch_pages(..., convert=...)), a w cache rankingu (rec_cache) siedzą małe obiekty.
+"""
+from typing import Iterable, List, Optional
+
+
+class Candidate:
+    """Tytuł z listy TMDB (discover / popular / korpus / title_metadata) - pola używane w rekomendacjach."""
+    __slots__ = ("id", "media_type", "title", "poster_path", "release_date",
+                 "vote_average", "vote_count", "popularity", "genre_ids", "runtime")
+
+    def __init__(self, id: int, media_type: Optional[str], title: Optional[str], poster_path: Optional[str],
+                 release_date: Optional[str], vote_average: float, vote_count: int, popularity: float,
+                 genre_ids: List[int], runtime: int = 0):
+        self.id = id
+        self.media_type = media_type
+        self.title = title
+        self.poster_path = poster_path
+        self.release_date = release_date
+        self.vote_average = vote_average
+        self.vote_count = vote_count
+        self.popularity = popularity
+        self.genre_ids = genre_ids
+        self.runtime = runtime
+
+    @classmethod
+    def from_tmdb(cls, d: dict, media_type: Optional[str] = None) -> "Candidate":
+        """Z wyniku listy TMDB (film: title/release_date, serial: name/first_air_date)."""
+        return cls(
+            d.get("id") or 0,
+            media_type or d.get("media_type"),
+            d.get("title") or d.get("name"),
+            d.get("poster_path"),
+            d.get("release_date") or d.get("first_air_date"),
+            d.get("vote_average") or 0.0,
+            d.get("vote_count") or 0,
+            d.get("popularity") or 0.0,
+            d.get("genre_ids") or [],
+            d.get("runtime") or 0,
+        )
+
+    @classmethod
+    def converter(cls, media_type: Optional[str] = None):
+        """Funkcja dla fetch_pages(convert=...) - ustawia od razu media_type listy."""
+        return lambda d: cls.from_tmdb(d, media_type)
+
+    def to_dict(self) -> dict:
+        """Kształt wyniku w API (karty filmów na froncie)."""
+        return {
+            "id": self.id,
+            "title": self.title,
+            "poster_path": self.poster_path,
+            "vote_average": self.vote_average,
+            "release_date": self.release_date,
+            "media_type": self.media_type,
+            "runtime": self.runtime,
+        }
+
+
+def slim(items: Optional[Iterable[dict]], fields: tuple) -> List[dict]:
+    """Lista słowników obcięta do `fields` (np. obsada w detalach: bez gender, credit_id, order...)."""
+    return [{f: it.get(f) for f in fields} for it in items or []]
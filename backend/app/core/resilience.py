@@ -0,0 +1,112 @@
+# backend/app/core/resilience.py
+from typing import Optional
+import asyncio
+import random
+import time
+
+
+class TMDBUnavailable(Exception):
+    """TMDB uznane za niedostępne (otwarty circuit breaker) - nie wysyłamy zapytania."""
+
+
+class TokenBucket:
+    """
+    Limiter token-bucket: średnio `rate` zapytań/s, chwilowo do `capacity`.
+    Jeden na proces (w TMDBClient), więc obejmuje wszystkie routery.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """Pobiera token; zwraca ile sekund trzeba było na niego czekać."""
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+class Throttle:
+    """
+    Osobny, mały przydział dla zadań w tle (np. budowa korpusu): najwyżej `concurrency` zapytań
+    naraz i średnio `rate`/s. Działa przed wspólnym limiterem klienta, więc zadanie w tle zajmuje
+    tylko ułamek jego tokenów i miejsc - zapytania użytkowników nie stoją za nim w kolejce.
+    """
+
+    def __init__(self, concurrency: int, rate: float):
+        self._sem = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate, 1)
+
+    async def __aenter__(self):
+        await self._sem.acquire()
+        try:
+            await self._bucket.acquire()
+        except BaseException:
+            self._sem.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        self._sem.release()
+        return False
+
+
+class CircuitBreaker:
+    """
+    Po `threshold` kolejnych porażkach otwiera obwód na `reset_timeout` sekund - w tym czasie
+    zapytania od razu kończą się TMDBUnavailable (serwujemy cache). Potem przepuszcza próbne
+    zapytania: sukces zamyka obwód, porażka otwiera go ponownie.
+    """
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Wykładniczy backoff z pełnym jitterem (0 .. base * 2^attempt, max `cap`)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after_seconds(value: Optional[str], cap: float) -> Optional[float]:
+    """Nagłówek Retry-After w sekundach (wariantu z datą TMDB nie używa)."""
+    if not value:
+        return None
+    try:
+        return min(cap, max(0.0, float(value)))
+    except ValueError:
+        return None
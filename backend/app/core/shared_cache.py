@@ -0,0 +1,278 @@
+# backend/app/core/shared_cache.py
+"""
+Drugi poziom cache odpowiedzi TMDB - wspólny dla workerów uvicorna na jednym hoście.
+
+SharedCache to plik SQLite (WAL + mmap): surowe bajty odpowiedzi (zlib powyżej progu), terminy
+fresh/stale i limit rozmiaru pliku. TieredCache składa go z MemoryCache procesu:
+- odczyt: L1, a gdy tam brak (albo wpis już nieświeży) - L2 i kopia do L1,
+- zapis: L1 + L2, więc odpowiedź pobrana przez jednego workera widzą wszystkie,
+- dzierżawa (lease) na klucz: przy równoległym missie w kilku workerach do TMDB idzie tylko jeden,
+  reszta chwilę czeka na jego wpis w L2,
+- warm start: po restarcie L1 wypełniamy najnowszymi ważnymi wpisami z pliku.
+
+Operacje na pliku idą w jednym wątku roboczym (jedno połączenie sqlite3) - pętla zdarzeń nie czeka na dysk.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+import asyncio
+import os
+import sqlite3
+import time
+import uuid
+import zlib
+
+from app.core.cache import CacheEntry, MemoryCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    compressed INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    fresh_until REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_entries_stale_until ON entries (stale_until);
+CREATE INDEX IF NOT EXISTS ix_entries_stored_at ON entries (stored_at);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+
+class SharedCache:
+    """Wpisy w pliku SQLite; wartości to bajty (odpowiedzi TMDB)."""
+
+    def __init__(self, path: str, max_bytes: int, compress_min: int = 1024,
+                 lease_timeout: float = 5.0, prune_every: int = 200, busy_timeout: float = 5.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compress_min = compress_min
+        self.lease_timeout = lease_timeout
+        self.prune_every = prune_every
+        self.busy_timeout = busy_timeout
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-cache")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._sets_since_prune = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evicted": 0,       # usunięte przy przycinaniu (przeterminowane + najstarsze ponad limit)
+            "lease_waits": 0,   # czekaliśmy na wpis innego workera
+            "lease_served": 0,  # ...i się doczekaliśmy
+            "lease_empty": 0,   # ...albo tamten skończył bez wpisu (błąd, 404) - pobieramy od razu sami
+            "errors": 0,
+        }
+
+    # --- wątek roboczy ---
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, fn, *args):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except sqlite3.Error as e:
+            # Cache to tylko przyspieszenie - błąd pliku nie może wywrócić requestu
+            self.stats["errors"] += 1
+            print(f"Błąd współdzielonego cache ({self.path}): {e}")
+            return None
+
+    def _decode(self, row) -> CacheEntry:
+        value, compressed, fresh_until, stale_until = row
+        return CacheEntry(zlib.decompress(value) if compressed else bytes(value), fresh_until, stale_until)
+
+    def _get(self, key: str) -> Optional[CacheEntry]:
+        row = self._db().execute(
+            "SELECT value, compressed, fresh_until, stale_until FROM entries WHERE key = ? AND stale_until > ?",
+            (key, time.time()),
+        ).fetchone()
+        return self._decode(row) if row else None
+
+    def _set(self, key: str, entry: CacheEntry):
+        raw = entry.value
+        compressed = len(raw) >= self.compress_min
+        blob = zlib.compress(raw, 1) if compressed else raw
+        self._db().execute(
+            "INSERT OR REPLACE INTO entries (key, value, compressed, size, fresh_until, stale_until, stored_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, blob, int(compressed), len(blob), entry.fresh_until, entry.stale_until, time.time()),
+        )
+        self._sets_since_prune += 1
+        if self._sets_since_prune >= self.prune_every:
+            self._prune()
+
+    def _prune(self):
+        """Najpierw wpisy po oknie stale, potem najstarsze - aż plik zejdzie do 90% limitu."""
+        self._sets_since_prune = 0
+        db = self._db()
+        now = time.time()
+        evicted = db.execute("DELETE FROM entries WHERE stale_until <= ?", (now,)).rowcount
+        db.execute("DELETE FROM leases WHERE expires <= ?", (now,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total > self.max_bytes:
+            target = total - int(self.max_bytes * 0.9)
+            keys, freed = [], 0
+            for key, size in db.execute("SELECT key, size FROM entries ORDER BY stored_at"):
+                keys.append((key,))
+                freed += size
+                if freed >= target:
+                    break
+            db.executemany("DELETE FROM entries WHERE key = ?", keys)
+            evicted += len(keys)
+        self.stats["evicted"] += evicted
+
+    def _recent(self, limit: int) -> List[Tuple[str, CacheEntry]]:
+        rows = self._db().execute(
+            "SELECT key, value, compressed, fresh_until, stale_until FROM entries "
+            "WHERE stale_until > ? ORDER BY stored_at DESC LIMIT ?",
+            (time.time(), limit),
+        ).fetchall()
+        return [(row[0], self._decode(row[1:])) for row in rows]
+
+    def _claim(self, key: str) -> bool:
+        now = time.time()
+        cur = self._db().execute(
+            "INSERT INTO leases (key, owner, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            "WHERE leases.expires <= ?",
+            (key, self.owner, now + self.lease_timeout, now),
+        )
+        return cur.rowcount == 1
+
+    def _poll(self, key: str) -> Tuple[bool, Optional[CacheEntry]]:
+        """(dzierżawa nadal trwa, wpis). Najpierw dzierżawa - wpis zapisany przed jej zwolnieniem już widać."""
+        leased = self._db().execute(
+            "SELECT 1 FROM leases WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone() is not None
+        return leased, self._get(key)
+
+    def _release(self, key: str):
+        self._db().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+
+    def _size(self) -> Tuple[int, int]:
+        return self._db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+
+    # --- interfejs backendu (jak MemoryCache) ---
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entry = await self._run(self._get, key)
+        self.stats["hits" if entry is not None else "misses"] += 1
+        return entry
+
+    async def set(self, key: str, entry: CacheEntry):
+        self.stats["sets"] += 1
+        await self._run(self._set, key, entry)
+
+    async def delete(self, key: str):
+        await self._run(lambda: self._db().execute("DELETE FROM entries WHERE key = ?", (key,)))
+
+    async def clear(self):
+        await self._run(lambda: self._db().execute("DELETE FROM entries"))
+
+    async def recent(self, limit: int) -> List[Tuple[str, CacheEntry]]:
+        return await self._run(self._recent, limit) or []
+
+    async def claim(self, key: str) -> bool:
+        """True = ten worker pobiera klucz z TMDB. Błąd pliku = pobieramy sami."""
+        claimed = await self._run(self._claim, key)
+        return claimed is not False
+
+    async def release(self, key: str):
+        await self._run(self._release, key)
+
+    async def wait_for(self, key: str, poll: float = 0.05) -> Optional[CacheEntry]:
+        """
+        Czeka (max lease_timeout) na świeży wpis, który zapisuje właśnie inny worker. None od razu,
+        gdy tamten zwolnił dzierżawę bez wpisu (TMDB nie dało 200, wyjątek) - nie ma na co czekać.
+        """
+        self.stats["lease_waits"] += 1
+        deadline = time.monotonic() + self.lease_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(poll)
+            leased, entry = await self._run(self._poll, key) or (True, None)
+            if entry is not None and entry.fresh_until > time.time():
+                self.stats["lease_served"] += 1
+                return entry
+            if not leased:
+                self.stats["lease_empty"] += 1
+                return None
+        return None
+
+    async def size(self) -> Tuple[int, int]:
+        return await self._run(self._size) or (0, 0)
+
+    def close(self):
+        if self._conn is not None:
+            self._executor.submit(self._conn.close).result()
+            self._conn = None
+        self._executor.shutdown(wait=False)
+
+
+class TieredCache:
+    """Backend ResponseCache: L1 (MemoryCache procesu) przed L2 (SharedCache)."""
+
+    def __init__(self, local: MemoryCache, shared: SharedCache):
+        self.local = local
+        self.shared = shared
+        self.claim = shared.claim
+        self.release = shared.release
+        self.wait_for = shared.wait_for
+
+    @property
+    def evictions(self) -> int:
+        return self.local.evictions
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entry = await self.local.get(key)
+        if entry is not None and time.time() < entry.fresh_until:
+            return entry
+        # Brak albo nieświeży w L1 - inny worker mógł już mieć nowszy
+        shared = await self.shared.get(key)
+        if shared is not None and (entry is None or shared.fresh_until > entry.fresh_until):
+            await self.local.set(key, shared)
+            return shared
+        return entry
+
+    async def set(self, key: str, entry: CacheEntry):
+        await self.local.set(key, entry)
+        await self.shared.set(key, entry)
+
+    async def delete(self, key: str):
+        await self.local.delete(key)
+        await self.shared.delete(key)
+
+    async def clear(self):
+        await self.local.clear()
+        await self.shared.clear()
+
+    async def warm(self) -> int:
+        """Warm start: najnowsze ważne wpisy z pliku do L1 (najstarsze pierwsze - LRU zostawi nowsze)."""
+        entries = await self.shared.recent(self.local.max_entries)
+        for key, entry in reversed(entries):
+            await self.local.set(key, entry)
+        return len(entries)
+
+    def stats(self) -> dict:
+        return dict(self.shared.stats)
+
+    def close(self):
+        self.shared.close()
+
+    def __len__(self):
+        return len(self.local)
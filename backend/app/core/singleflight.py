@@ -0,0 +1,71 @@
+# backend/app/core/singleflight.py
+from collections import Counter
+from typing import Awaitable, Callable, Dict
+import asyncio
+
+
+class SingleFlight:
+    """
+    Koalescencja identycznych zapytań w locie: pierwszy wywołujący dla klucza uruchamia `fn`,
+    kolejni (do czasu zakończenia) czekają na ten sam task i dostają ten sam wynik albo wyjątek.
+    Liczniki per klucz pokazują, gdzie deduplikacja faktycznie coś oszczędza.
+    Anulowanie jednego czekającego nie przerywa zadania, na które czekają inni; gdy anulowany
+    zostanie ostatni, anulujemy też zadanie (np. zapytanie do TMDB, którego wyniku nikt już nie chce).
+    """
+
+    def __init__(self, max_keys: int = 500):
+        self.max_keys = max_keys
+        self.calls = 0
+        self.executions = 0
+        self.deduplicated = 0
+        self.per_key: Counter = Counter()  # klucz -> ilu wywołujących dołączyło do cudzego zapytania
+        self.cancelled = 0  # zadania przerwane, bo nikt już na nie nie czekał
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self.deduplicated += 1
+            self.per_key[key] += 1
+            if len(self.per_key) > self.max_keys:
+                # Zostawiamy połowę najczęstszych kluczy, żeby licznik nie rósł bez końca
+                self.per_key = Counter(dict(self.per_key.most_common(self.max_keys // 2)))
+        else:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # shield - anulowanie jednego klienta nie przerywa zapytania, na które czekają inni
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters.get(key) == 1 and self._inflight.get(key) is task and not task.done():
+                self.cancelled += 1
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # wyjątek odebrany, nawet jeśli wszyscy czekający zostali anulowani
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._inflight
+
+    def stats(self, top: int = 10) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "deduplicated": self.deduplicated,
+            "cancelled": self.cancelled,
+            "in_flight": len(self._inflight),
+            "top_keys": dict(self.per_key.most_common(top)),
+        }
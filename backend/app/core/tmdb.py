@@ -0,0 +1,225 @@
+# backend/app/core/tmdb.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from fastapi import Request
+import asyncio
+import httpx
+import time
+
+from app.core.config import settings
+from app.core.cache import ResponseCache, MemoryCache, make_key
+from app.core.shared_cache import SharedCache, TieredCache
+from app.core.singleflight import SingleFlight
+from app.core import fastjson, tracing
+from app.core.resilience import (
+    TMDBUnavailable, TokenBucket, CircuitBreaker, backoff_delay, retry_after_seconds
+)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# TTL (sekundy) per endpoint - pierwszy pasujący prefiks wygrywa, więc bardziej szczegółowe wyżej
+CACHE_TTLS = [
+    ("/watch/providers", 24 * 3600),
+    ("/movie/top_rated", 6 * 3600),
+    ("/movie/popular", 3600),
+    ("/trending/", 3600),
+    ("/discover/", 3600),
+    ("/search/", 600),
+    ("/movie/", 6 * 3600),  # detale tytułu
+    ("/tv/", 6 * 3600),
+]
+
+def ttl_for(path: str) -> int:
+    for prefix, ttl in CACHE_TTLS:
+        if path.startswith(prefix):
+            return ttl
+    return settings.CACHE_DEFAULT_TTL
+
+
+_refresh_ahead: ContextVar[float] = ContextVar("tmdb_refresh_ahead", default=0.0)
+
+
+@contextmanager
+def refresh_ahead(seconds: float):
+    """
+    get_json w tym bloku (i w zadaniach z niego uruchomionych) pobiera od nowa wpisy cache,
+    którym zostało mniej niż `seconds` świeżości - tak rozgrzewa cache app/services/warmer.py.
+    """
+    token = _refresh_ahead.set(seconds)
+    try:
+        yield
+    finally:
+        _refresh_ahead.reset(token)
+
+
+class TMDBClient:
+    """
+    Jeden współdzielony klient TMDB na cały proces.
+    Trzyma pulę połączeń keep-alive (i HTTP/2, jeśli jest `h2`), więc kolejne
+    zapytania nie płacą za nowy handshake TCP+TLS do api.themoviedb.org.
+    Tworzony w `lifespan` (app/main.py), wstrzykiwany przez `get_tmdb`.
+    """
+
+    def __init__(self, cache: Optional[ResponseCache] = None):
+        if cache is None and settings.CACHE_ENABLED:
+            backend = MemoryCache(settings.CACHE_MAX_ENTRIES)
+            if settings.SHARED_CACHE_ENABLED:
+                # L2 w pliku - wspólny dla workerów i przeżywa restart (app/core/shared_cache.py)
+                backend = TieredCache(backend, SharedCache(
+                    settings.SHARED_CACHE_PATH,
+                    max_bytes=settings.SHARED_CACHE_MAX_MB * 1024 * 1024,
+                    compress_min=settings.SHARED_CACHE_COMPRESS_MIN,
+                    lease_timeout=settings.SHARED_CACHE_LEASE_TIMEOUT,
+                ))
+            cache = ResponseCache(backend, stale_factor=settings.CACHE_STALE_FACTOR)
+        self.cache = cache
+        # Globalny limit równoległych zapytań do TMDB (wszystkie routery, wszystkie requesty)
+        self.limiter = asyncio.Semaphore(settings.TMDB_CONCURRENCY)
+        # Limit tempa (TMDB ~40-50 req/s na IP) i bezpiecznik na czas awarii TMDB
+        self.bucket = TokenBucket(settings.TMDB_RATE_LIMIT, settings.TMDB_RATE_BURST)
+        self.breaker = CircuitBreaker(settings.TMDB_BREAKER_THRESHOLD, settings.TMDB_BREAKER_RESET)
+        # Identyczne GET-y w locie (też te z pominięciem cache) idą do TMDB raz
+        self.flight = SingleFlight()
+        self.stats = {
+            "requests": 0,     # faktycznie wysłane zapytania (z powtórkami)
+            "rate_waits": 0,   # ile razy czekaliśmy na token z lokalnego limitera
+            "throttled": 0,    # odpowiedzi 429 od TMDB
+            "retried": 0,      # powtórzone zapytania
+            "failed": 0,       # zapytania nieudane po wszystkich próbach
+            "rejected": 0,     # odrzucone od razu przez otwarty circuit breaker
+        }
+        self._client = httpx.AsyncClient(
+            base_url=settings.TMDB_BASE_URL,
+            headers=settings.TMDB_HEADERS,
+            params={"api_key": settings.TMDB_API_KEY},
+            timeout=httpx.Timeout(settings.TMDB_TIMEOUT, connect=settings.TMDB_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.TMDB_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.TMDB_MAX_KEEPALIVE,
+                keepalive_expiry=settings.TMDB_KEEPALIVE_EXPIRY,
+            ),
+            http2=settings.TMDB_HTTP2 and HTTP2_AVAILABLE,
+        )
+
+    async def _request(self, method: str, path: str, params: Optional[dict] = None, json: Optional[dict] = None) -> httpx.Response:
+        """
+        Wspólna ścieżka każdego zapytania: circuit breaker -> token bucket -> limiter równoległości.
+        429 i 5xx/błędy sieci powtarzamy (z jitterowanym backoffem, z szacunkiem dla Retry-After);
+        POST powtarzamy tylko po 429, bo wtedy TMDB na pewno go nie wykonało.
+        """
+        if not self.breaker.allow():
+            self.stats["rejected"] += 1
+            raise TMDBUnavailable(f"TMDB niedostępne (circuit open): {path}")
+
+        resp, error = None, None
+        for attempt in range(settings.TMDB_MAX_RETRIES + 1):
+            if await self.bucket.acquire() > 0:
+                self.stats["rate_waits"] += 1
+            self.stats["requests"] += 1
+            start = time.perf_counter()
+            try:
+                async with self.limiter:
+                    resp = await self._client.request(method, path, params=params, json=json)
+                error = None
+            except httpx.TransportError as e:
+                resp, error = None, e
+            tracing.record_upstream(path, resp.status_code if resp is not None else "error", time.perf_counter() - start)
+
+            if resp is not None and resp.status_code != 429 and resp.status_code < 500:
+                self.breaker.record_success()
+                return resp
+
+            retryable = method == "GET" or (resp is not None and resp.status_code == 429)
+            if attempt == settings.TMDB_MAX_RETRIES or not retryable:
+                break
+
+            delay = backoff_delay(attempt, settings.TMDB_RETRY_BASE_DELAY, settings.TMDB_RETRY_MAX_DELAY)
+            if resp is not None and resp.status_code == 429:
+                self.stats["throttled"] += 1
+                delay = retry_after_seconds(resp.headers.get("Retry-After"), settings.TMDB_RETRY_MAX_DELAY) or delay
+            self.stats["retried"] += 1
+            await asyncio.sleep(delay)
+
+        if resp is not None and resp.status_code == 429:
+            self.stats["throttled"] += 1
+        self.stats["failed"] += 1
+        self.breaker.record_failure()
+        if error is not None:
+            raise error
+        return resp
+
+    async def get(self, path: str, params: Optional[dict] = None) -> httpx.Response:
+        # `path` względny, np. "/movie/popular" - api_key dokleja klient.
+        # Bez koalescencji - np. /authentication/token/new musi dać każdemu własny token.
+        start = time.perf_counter()
+        resp = await self._request("GET", path, params=params)
+        tracing.record_tmdb_call(path, "none", (time.perf_counter() - start) * 1000, len(resp.content))
+        return resp
+
+    async def get_json(self, path: str, params: Optional[dict] = None, ttl: Optional[int] = None) -> Optional[dict]:
+        """
+        GET przez cache. Zwraca zdekodowany JSON albo None, gdy TMDB nie odpowie 200.
+        Gdy TMDB leży, a w cache jest choćby przeterminowany wpis - dostajemy jego.
+        W cache trzymamy surowe bajty - każdy odczyt dostaje własną kopię, więc
+        wywołujący mogą bezpiecznie modyfikować wynik (np. dopisywać media_type).
+        """
+        start = time.perf_counter()
+        if self.cache is None or ttl == 0:
+            cache_status = "bypass"
+            raw = await self._fetch_raw(path, params)
+        else:
+            cache_status = "hit"
+
+            def fetch():
+                nonlocal cache_status
+                cache_status = "miss"
+                return self._fetch_raw(path, params)
+
+            raw = await self.cache.get_or_fetch(make_key(path, params), fetch, ttl if ttl is not None else ttl_for(path),
+                                                min_fresh=_refresh_ahead.get())
+        tracing.record_tmdb_call(path, cache_status, (time.perf_counter() - start) * 1000, len(raw or b""))
+        return fastjson.loads(raw) if raw is not None else None
+
+    async def _fetch_raw(self, path: str, params: Optional[dict] = None) -> Optional[bytes]:
+        return await self.flight.do(make_key(path, params), lambda: self._download(path, params))
+
+    async def _download(self, path: str, params: Optional[dict] = None) -> Optional[bytes]:
+        resp = await self._request("GET", path, params=params)
+        if resp.status_code != 200:
+            return None
+        return resp.content
+
+    async def post(self, path: str, params: Optional[dict] = None, json: Optional[dict] = None) -> httpx.Response:
+        start = time.perf_counter()
+        resp = await self._request("POST", path, params=params, json=json)
+        tracing.record_tmdb_call(path, "none", (time.perf_counter() - start) * 1000, len(resp.content))
+        return resp
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "breaker": self.breaker.state,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "singleflight": self.flight.stats(),
+        }
+
+    async def warm_cache(self) -> int:
+        """Warm start L1 z cache współdzielonego; 0, gdy go nie ma."""
+        if self.cache is None or not hasattr(self.cache.backend, "warm"):
+            return 0
+        return await self.cache.backend.warm()
+
+    async def aclose(self):
+        await self._client.aclose()
+        if self.cache is not None and hasattr(self.cache.backend, "close"):
+            self.cache.backend.close()
+
+
+def get_tmdb(request: Request) -> TMDBClient:
+    """Dependency FastAPI - zwraca klienta utworzonego w lifespan."""
+    return request.app.state.tmdb
@@ -0,0 +1,223 @@
+# backend/app/core/tracing.py
+"""
+Pomiar czasu per request: etapy (span) i zapytania do TMDB.
+
+TracingMiddleware zakłada dla requestu obiekt Trace (contextvar); `span("etap")` dolicza czas
+etapu, a TMDBClient każde wywołanie (status cache, bajty, czas). Wynik idzie w nagłówku
+Server-Timing i do histogramów Prometheusa (/metrics w app/api/metrics.py, wystawiany dopiero
+z METRICS_ROUTES_ENABLED=1).
+
+Wyłączone (TRACING_ENABLED=0, METRICS_ENABLED=0) = brak middleware, a `span()` zwraca
+współdzielony pusty kontekst - koszt to jedno sprawdzenie contextvara.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+import time
+
+from app.core.config import settings
+
+# Górne granice kubełków (sekundy) - od trafień w cache po pełny pipeline rekomendacji
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Histogram Prometheusa z etykietami: wartości etykiet -> (kubełki, suma, licznik)."""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...], buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, n) in sorted(self._series.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {n}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Czas obsługi requestu", ("method", "route", "status"))
+STAGE_SECONDS = Histogram("stage_duration_seconds", "Czas etapów (span) wewnątrz requestów", ("stage",))
+TMDB_SECONDS = Histogram("tmdb_request_duration_seconds", "Czas zapytań HTTP do TMDB", ("endpoint", "status"))
+TMDB_CALLS = defaultdict(int)  # (endpoint, cache) -> liczba wywołań get_json/get/post
+TMDB_BYTES = defaultdict(int)  # endpoint -> bajty odpowiedzi
+
+
+def endpoint_label(path: str) -> str:
+    """/movie/123 -> /movie/{id} - ścieżki z ID zwijamy, żeby liczba serii była stała."""
+    return "/".join("{id}" if part.isdigit() else part for part in path.split("/"))
+
+
+class Trace:
+    __slots__ = ("start", "spans", "tmdb_calls", "tmdb_ms", "tmdb_bytes", "cache")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: Dict[str, List[float]] = {}  # etap -> [ms, ile razy]
+        self.tmdb_calls = 0
+        self.tmdb_ms = 0.0
+        self.tmdb_bytes = 0
+        self.cache: Dict[str, int] = {}
+
+    def add_span(self, name: str, ms: float):
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [ms, 1]
+        else:
+            entry[0] += ms
+            entry[1] += 1
+
+    def server_timing(self) -> str:
+        parts = [f'{name};dur={ms:.1f};desc="x{n}"' if n > 1 else f"{name};dur={ms:.1f}"
+                 for name, (ms, n) in self.spans.items()]
+        if self.tmdb_calls:
+            cache = " ".join(f"{k}={v}" for k, v in sorted(self.cache.items()))
+            parts.append(f'tmdb;dur={self.tmdb_ms:.1f};desc="n={self.tmdb_calls} {cache} {self.tmdb_bytes}B"')
+        parts.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+class _Span:
+    __slots__ = ("name", "trace", "start")
+
+    def __init__(self, name: str, trace: Trace):
+        self.name = name
+        self.trace = trace
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.trace.add_span(self.name, elapsed * 1000)
+        STAGE_SECONDS.observe(elapsed, self.name)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str):
+    """`with span("discover"):` - czas etapu w bieżącym requeście (poza requestem nic nie robi)."""
+    trace = _current.get()
+    return _NOOP if trace is None else _Span(name, trace)
+
+
+def record_tmdb_call(path: str, cache: str, ms: float, size: int):
+    """Wywołanie klienta TMDB z punktu widzenia requestu (cache: hit / miss / bypass)."""
+    if settings.METRICS_ENABLED:
+        endpoint = endpoint_label(path)
+        TMDB_CALLS[(endpoint, cache)] += 1
+        TMDB_BYTES[endpoint] += size
+    trace = _current.get()
+    if trace is not None:
+        trace.tmdb_calls += 1
+        trace.tmdb_ms += ms
+        trace.tmdb_bytes += size
+        trace.cache[cache] = trace.cache.get(cache, 0) + 1
+
+
+def record_upstream(path: str, status, seconds: float):
+    """Pojedyncze zapytanie HTTP do TMDB (każda próba, także powtórki)."""
+    if settings.METRICS_ENABLED:
+        TMDB_SECONDS.observe(seconds, endpoint_label(path), str(status))
+
+
+class TracingMiddleware:
+    """Czysty middleware ASGI (bez BaseHTTPMiddleware) - nie buforuje odpowiedzi strumieniowych."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace = Trace()
+        token = _current.set(trace)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.TRACING_ENABLED:
+                    # Dla odpowiedzi strumieniowych nagłówek obejmuje etapy sprzed pierwszego bajtu
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", trace.server_timing().encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if settings.METRICS_ENABLED:
+                route = scope.get("route")
+                label = getattr(route, "path", None) or ("/static" if scope["path"].startswith("/static") else "other")
+                REQUEST_SECONDS.observe(time.perf_counter() - trace.start, scope["method"], label, str(status))
+
+
+def render_metrics(gauges: Dict[str, float]) -> str:
+    """Tekstowy format Prometheusa: histogramy + liczniki TMDB + gauge z przekazanych statystyk."""
+    lines = []
+    for hist in (REQUEST_SECONDS, STAGE_SECONDS, TMDB_SECONDS):
+        lines.extend(hist.render())
+    lines += ["# HELP tmdb_calls_total Wywołania klienta TMDB wg statusu cache", "# TYPE tmdb_calls_total counter"]
+    lines += [f'tmdb_calls_total{{endpoint="{_escape(e)}",cache="{c}"}} {n}' for (e, c), n in sorted(TMDB_CALLS.items())]
+    lines += ["# HELP tmdb_response_bytes_total Bajty odpowiedzi TMDB", "# TYPE tmdb_response_bytes_total counter"]
+    lines += [f'tmdb_response_bytes_total{{endpoint="{_escape(e)}"}} {n}' for e, n in sorted(TMDB_BYTES.items())]
+    for name, value in sorted(gauges.items()):
+        lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def flatten_stats(prefix: str, stats: dict) -> Dict[str, float]:
+    """{"cache": {"hits": 3}} -> {"prefix_cache_hits": 3}; pomija wartości nieliczbowe i klucze-URL (top_keys)."""
+    out = {}
+    for key, value in (stats or {}).items():
+        if not str(key).isidentifier():
+            continue
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            out.update(flatten_stats(name, value))
+        elif isinstance(value, bool):
+            out[name] = int(value)
+        elif isinstance(value, (int, float)):
+            out[name] = value
+    return out
@@ -1,11 +1,61 @@
 # backend/app/db/database.py
+from pathlib import Path
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-# Plik bazy danych utworzy się w folderze backend
-DATABASE_URL = "sqlite+aiosqlite:///./app.db"
+from app.core.config import settings
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+# Domyślnie plik bazy w folderze backend - niezależnie od katalogu, z którego startuje uvicorn
+BACKEND_DIR = Path(__file__).resolve().parent.parent.parent
+DEFAULT_DATABASE_URL = f"sqlite+aiosqlite:///{BACKEND_DIR / 'app.db'}"
+
+
+def normalize_database_url(url: str) -> str:
+    """Render/Heroku podają `postgres://...` - SQLAlchemy async potrzebuje jawnego sterownika."""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+DATABASE_URL = normalize_database_url(settings.DATABASE_URL or DEFAULT_DATABASE_URL)
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+if IS_SQLITE:
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=settings.DB_ECHO,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        # Czekanie na blokadę po stronie sterownika (sekundy) - uzupełnia PRAGMA busy_timeout
+        connect_args={"timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000},
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        # WAL: czytelnicy nie blokują pisarza (i odwrotnie), więc równoległe toggle ulubionych
+        # z wielu workerów nie kończą się "database is locked"
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+else:
+    # Postgres (asyncpg): pip install asyncpg
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=settings.DB_ECHO,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
 
 # Fabryka sesji (połączeń)
 AsyncSessionLocal = sessionmaker(
@@ -17,4 +67,4 @@ Base = declarative_base()
 # Funkcja pomocnicza do wstrzykiwania sesji w endpointach
 async def get_db():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
@@ -0,0 +1,74 @@
+# backend/app/db/migrations.py
+"""
+Proste migracje uruchamiane w lifespan, po create_all (które tworzy tylko brakujące tabele -
+nie dodaje indeksów do istniejących ani nie przenosi danych).
+Wykonane wersje zapisujemy w tabeli schema_migrations.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+import json
+
+
+def _ids(raw):
+    try:
+        return list(dict.fromkeys(json.loads(raw or "[]")))
+    except ValueError:
+        return []
+
+
+def m001_normalize_favorites(conn: Connection):
+    """Unikalny (user_session_id, tmdb_id) + przeniesienie gatunków/ludzi/słów kluczowych z JSON-ów do tabel."""
+    # Duplikaty blokowałyby indeks unikalny - zostawiamy najstarszy wpis
+    conn.execute(text("""
+        DELETE FROM favorites WHERE id NOT IN (
+            SELECT MIN(id) FROM favorites GROUP BY user_session_id, tmdb_id
+        )
+    """))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_favorites_user_tmdb ON favorites (user_session_id, tmdb_id)"
+    ))
+
+    rows = conn.execute(text(
+        "SELECT id, genres_json, directors_json, cast_json, keywords_json FROM favorites"
+    )).all()
+    genres, people, keywords = [], [], []
+    for fav_id, g_json, d_json, c_json, k_json in rows:
+        genres += [{"f": fav_id, "g": g} for g in _ids(g_json)]
+        people += [{"f": fav_id, "r": "directors", "p": p} for p in _ids(d_json)]
+        people += [{"f": fav_id, "r": "cast", "p": p} for p in _ids(c_json)]
+        keywords += [{"f": fav_id, "k": k} for k in _ids(k_json)]
+    if genres:
+        conn.execute(text("INSERT INTO favorite_genres (favorite_id, genre_id) VALUES (:f, :g)"), genres)
+    if people:
+        conn.execute(text("INSERT INTO favorite_people (favorite_id, role, person_id) VALUES (:f, :r, :p)"), people)
+    if keywords:
+        conn.execute(text("INSERT INTO favorite_keywords (favorite_id, keyword_id) VALUES (:f, :k)"), keywords)
+
+    # Profile policzone na starych danych (z ewentualnymi duplikatami) przeliczą się przy odczycie
+    conn.execute(text("DELETE FROM user_profiles"))
+
+
+def m002_favorites_per_media_type(conn: Connection):
+    """Unikalny (user_session_id, tmdb_id, media_type) - film i serial o tym samym ID to dwa tytuły."""
+    conn.execute(text("UPDATE favorites SET media_type = 'movie' WHERE media_type IS NULL"))
+    conn.execute(text("DROP INDEX IF EXISTS ux_favorites_user_tmdb"))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_favorites_user_title ON favorites (user_session_id, tmdb_id, media_type)"
+    ))
+
+
+MIGRATIONS = [
+    (1, m001_normalize_favorites),
+    (2, m002_favorites_per_media_type),
+]
+
+
+def run_migrations(conn: Connection):
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY)"))
+    done = set(conn.execute(text("SELECT version FROM schema_migrations")).scalars().all())
+    for version, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        migrate(conn)
+        conn.execute(text("INSERT INTO schema_migrations (version) VALUES (:v)"), {"v": version})
+        print(f"Migracja bazy {version} ({migrate.__name__}) wykonana")
@@ -1,9 +1,14 @@
 # backend/app/db/models.py
-from sqlalchemy import Column, Integer, String, Float, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, Text, ForeignKey, Index
 from .database import Base
 
 class FavoriteMovie(Base):
     __tablename__ = "favorites"
+    __table_args__ = (
+        # Jeden tytuł raz na użytkownika + szybki lookup (user, tmdb_id) w toggle_favorite.
+        # Z typem - ID w TMDB powtarzają się między filmami i serialami
+        Index("ux_favorites_user_title", "user_session_id", "tmdb_id", "media_type", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_session_id = Column(String, index=True)
@@ -23,9 +28,99 @@ class FavoriteMovie(Base):
     original_language = Column(String, nullable=True) 
     runtime = Column(Integer, default=0)
 
-    # Pola JSON (przechowywane jako String)
+    # Pola JSON (przechowywane jako String) - LEGACY, tylko do migracji starej bazy.
+    # Aktualne dane są w tabelach favorite_genres / favorite_people / favorite_keywords.
     genres_json = Column(String, default="[]")    # Gatunki
     keywords_json = Column(String, default="[]")  # Słowa kluczowe (np. "space", "zombie")
     cast_json = Column(String, default="[]")      # Top 5-10 aktorów (IDs)
     directors_json = Column(String, default="[]") # Reżyserzy lub Twórcy serialu (IDs)
-    production_countries_json = Column(String, default="[]") # Kraje produkcji
\ No newline at end of file
+    production_countries_json = Column(String, default="[]") # Kraje produkcji
+
+
+# --- ZNORMALIZOWANE ATRYBUTY ULUBIONYCH ---
+# Agregaty per użytkownik to zwykłe GROUP BY po join z favorites zamiast dekodowania JSON-ów.
+
+class FavoriteGenre(Base):
+    __tablename__ = "favorite_genres"
+
+    favorite_id = Column(Integer, ForeignKey("favorites.id", ondelete="CASCADE"), primary_key=True)
+    genre_id = Column(Integer, primary_key=True, index=True)
+
+
+class FavoritePerson(Base):
+    __tablename__ = "favorite_people"
+
+    favorite_id = Column(Integer, ForeignKey("favorites.id", ondelete="CASCADE"), primary_key=True)
+    role = Column(String, primary_key=True)  # directors / cast
+    person_id = Column(Integer, primary_key=True)
+
+    __table_args__ = (
+        Index("ix_favorite_people_role_person", "role", "person_id"),
+    )
+
+
+class FavoriteKeyword(Base):
+    __tablename__ = "favorite_keywords"
+
+    favorite_id = Column(Integer, ForeignKey("favorites.id", ondelete="CASCADE"), primary_key=True)
+    keyword_id = Column(Integer, primary_key=True, index=True)
+
+
+class FavoritesVersion(Base):
+    """
+    Licznik zmian ulubionych użytkownika - podbijany w tej samej transakcji co zmiana listy.
+    Z niego powstają ETagi /user/favorites.json i /user/favorites/ids. Osobna tabela, bo
+    user_profiles bywa czyszczone (migracje) - licznik nie może się cofnąć.
+    """
+    __tablename__ = "favorites_versions"
+
+    user_session_id = Column(String, primary_key=True)
+    version = Column(Integer, default=0)
+
+
+class TitleMetadata(Base):
+    """
+    Lokalna kopia metadanych tytułu z TMDB (zapis write-through z każdej odpowiedzi z detalami).
+    Rekomendacje i ulubione czytają najpierw stąd, zamiast pytać TMDB o każdy tytuł.
+    """
+    __tablename__ = "title_metadata"
+
+    tmdb_id = Column(Integer, primary_key=True)
+    media_type = Column(String, primary_key=True)  # movie / tv - ID w TMDB powtarzają się między typami
+
+    title = Column(String)
+    poster_path = Column(String, nullable=True)
+    release_date = Column(String, nullable=True)
+    runtime = Column(Integer, default=0)
+    original_language = Column(String, nullable=True)
+
+    vote_average = Column(Float, default=0.0)
+    vote_count = Column(Integer, default=0)
+    popularity = Column(Float, default=0.0)
+
+    genres_json = Column(String, default="[]")
+    directors_json = Column(String, default="[]")
+    cast_json = Column(String, default="[]")
+    keywords_json = Column(String, default="[]")
+    production_countries_json = Column(String, default="[]")
+
+    refreshed_at = Column(Float, default=0.0, index=True)  # unix timestamp ostatniego pobrania z TMDB
+
+
+class UserProfile(Base):
+    """
+    Zagregowany profil gustu użytkownika, aktualizowany przyrostowo przy dodaniu/usunięciu ulubionego.
+    Rekomendacje i statystyki czytają jeden wiersz zamiast parsować JSON-y wszystkich ulubionych.
+    """
+    __tablename__ = "user_profiles"
+
+    user_session_id = Column(String, primary_key=True)
+
+    favorites_count = Column(Integer, default=0)
+    genre_counts_json = Column(String, default="{}")     # {genre_id: liczba ulubionych}
+    director_counts_json = Column(String, default="{}")  # {person_id: liczba ulubionych}
+
+    vote_sum = Column(Float, default=0.0)   # suma ocen (tylko niezerowych)
+    vote_n = Column(Integer, default=0)
+    runtime_sum = Column(Integer, default=0)  # suma czasów trwania (tylko > 0)
+    runtime_n = Column(Integer, default=0)
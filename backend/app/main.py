@@ -1,6 +1,6 @@
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
@@ -10,12 +10,21 @@ import os
 from app.db.database import engine, Base
 # --- NAPRAWA: Importujemy modele, żeby SQLAlchemy wiedziało co utworzyć ---
 from app.db import models 
+from app.db.migrations import run_migrations
+from app.core.tmdb import TMDBClient
+from app.core.resilience import TMDBUnavailable
+from app.core.config import settings
+from app.core.tracing import TracingMiddleware
+from app.core.fastjson import FastJSONResponse
+from app.services import corpus, similarity, collab, typeahead, warmer
+import asyncio
 
 # Importy routerów
 from app.api import auth, user, movies, home
 from app.routes import tmdb_auth
 
 from app.api import suggestions
+from app.api import metrics
 
 # --- LIFESPAN ---
 @asynccontextmanager
@@ -24,16 +33,52 @@ async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         # Teraz Base.metadata "widzi" tabelę favorites dzięki importowi models
         await conn.run_sync(Base.metadata.create_all)
+        # Indeksy/dane, których create_all nie ruszy w istniejącej bazie (app/db/migrations.py)
+        await conn.run_sync(run_migrations)
+
+    # Indeks podobieństwa treści z lokalnych metadanych (potem rośnie przyrostowo)
+    await similarity.load_index()
+    # Lokalny indeks podpowiedzi wyszukiwania (tytuły z title_metadata, potem korpus i wyniki TMDB)
+    await typeahead.load_index()
+
+    # Jeden klient TMDB (pula połączeń keep-alive) dla wszystkich routerów
+    app.state.tmdb = TMDBClient()
+    # Warm start cache odpowiedzi z pliku współdzielonego (po restarcie / dla nowego workera)
+    warmed = await app.state.tmdb.warm_cache()
+    if warmed:
+        print(f"Cache TMDB: {warmed} wpisów z cache współdzielonego")
+
+    # Lokalny korpus kandydatów: wczytanie z dysku + okresowe odświeżanie w tle
+    corpus_task = asyncio.create_task(corpus.corpus_refresher(app.state.tmdb)) if settings.CORPUS_ENABLED else None
+    # Model CF: wczytanie ostatniej wersji (mmap) + okresowy retrening w tle
+    collab_task = asyncio.create_task(collab.collab_trainer()) if settings.COLLAB_ENABLED else None
+    # Rozgrzewanie cache list strony głównej i discover (przy wielu workerach - tylko lider)
+    warmer_task = asyncio.create_task(warmer.cache_warmer(app.state.tmdb)) if settings.WARMER_ENABLED else None
     
     yield  # Tutaj aplikacja działa
     
     # 2. Kod uruchamiany przy ZAMKNIĘCIU aplikacji
+    for task in (corpus_task, collab_task, warmer_task):
+        if task:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    await app.state.tmdb.aclose()
     await engine.dispose()
 
 # Przekazujemy lifespan do FastAPI
-app = FastAPI(title="Film Recommender", lifespan=lifespan)
+# orjson (gdy zainstalowany) zamiast json.dumps dla wszystkich odpowiedzi JSON
+app = FastAPI(title="Film Recommender", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("SECRET_KEY"))
+# Najbardziej zewnętrzny - mierzy też sesję; wyłączone pomiary = zero narzutu
+if settings.TRACING_ENABLED or settings.METRICS_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
+# TMDB leży (otwarty circuit breaker) i nie mamy nic w cache - mówimy to wprost zamiast 500
+@app.exception_handler(TMDBUnavailable)
+async def tmdb_unavailable_handler(request: Request, exc: TMDBUnavailable):
+    return JSONResponse(status_code=503, content={"detail": "TMDB chwilowo niedostępne"})
 
 # Rejestracja Routerów
 app.include_router(auth.router)
@@ -42,6 +87,8 @@ app.include_router(movies.router)
 app.include_router(home.router)
 app.include_router(tmdb_auth.router)
 app.include_router(suggestions.router)
+if settings.METRICS_ROUTES_ENABLED:
+    app.include_router(metrics.router)
 
 # Pliki statyczne
 app.mount("/static", StaticFiles(directory="../frontend/static"), name="static")
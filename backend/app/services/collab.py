@@ -0,0 +1,261 @@
+# backend/app/services/collab.py
+"""
+Collaborative filtering "kto polubił X, polubił też Y" na ulubionych wszystkich użytkowników.
+
+Trening (offline, w tle co COLLAB_RETRAIN_INTERVAL): macierz współwystąpień item-item z tabeli
+favorites, podobieństwo cosinusowe, dla każdego tytułu zostaje top-N sąsiadów (CSR).
+Model zapisujemy jako wersjonowany katalog plików .npy (data/collab/v<timestamp>/) i wczytujemy
+przez mmap - kolejne procesy/workery dzielą te same strony pamięci, a podmiana wersji to
+zmiana wskaźnika CURRENT. Przy kilku workerach trenuje tylko lider (app/core/leader.py), reszta
+wczytuje wersję wskazaną przez CURRENT.
+
+Serwowanie: searchsorted po kluczach ulubionych + sklejenie ich list sąsiadów - poniżej 1 ms.
+"""
+from typing import Iterable, List, Optional, Set, Tuple
+from pathlib import Path
+from sqlalchemy.future import select
+import asyncio
+import json
+import random
+import shutil
+import time
+import numpy as np
+
+from app.core import leader
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models import FavoriteMovie
+
+TitleKey = Tuple[int, str]  # (tmdb_id, media_type)
+
+ARRAYS = ("keys", "indptr", "neighbors", "weights")
+
+
+def encode_key(tmdb_id: int, media_type: str) -> int:
+    # ID w TMDB powtarzają się między filmami i serialami - typ w najniższym bicie
+    return tmdb_id * 2 + (1 if media_type == "tv" else 0)
+
+
+def decode_key(code: int) -> TitleKey:
+    return code // 2, ("tv" if code % 2 else "movie")
+
+
+class CollabModel:
+    """Top-N sąsiadów każdego tytułu w formacie CSR: keys[i] -> neighbors/weights[indptr[i]:indptr[i+1]]."""
+
+    def __init__(self, keys: np.ndarray, indptr: np.ndarray, neighbors: np.ndarray, weights: np.ndarray, meta: dict):
+        self.keys = keys
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.weights = weights
+        self.meta = meta
+
+    @property
+    def version(self) -> str:
+        return self.meta.get("version", "")
+
+    def __len__(self):
+        return len(self.keys)
+
+    def recommend(self, favorites: Iterable[TitleKey], k: int = 50, media_types: Optional[Set[str]] = None
+                  ) -> List[Tuple[float, TitleKey]]:
+        """[(wynik 0..1, (tmdb_id, media_type))] malejąco; ulubione są pomijane."""
+        codes = np.array(sorted({encode_key(i, m) for i, m in favorites}), dtype=np.int64)
+        if not len(codes) or not len(self.keys):
+            return []
+        pos = np.minimum(np.searchsorted(self.keys, codes), len(self.keys) - 1)
+        pos = pos[self.keys[pos] == codes]
+        if not len(pos):
+            return []
+
+        nbrs = np.concatenate([self.neighbors[self.indptr[p]:self.indptr[p + 1]] for p in pos])
+        wts = np.concatenate([self.weights[self.indptr[p]:self.indptr[p + 1]] for p in pos])
+        if not len(nbrs):
+            return []
+        uniq, inv = np.unique(nbrs, return_inverse=True)
+        scores = np.bincount(inv, weights=wts)
+        cand = np.asarray(self.keys[uniq])
+
+        keep = ~np.isin(cand, codes)
+        if media_types is not None and len(media_types) == 1:
+            keep &= (cand % 2 == 1) if "tv" in media_types else (cand % 2 == 0)
+        cand, scores = cand[keep], scores[keep]
+        if not len(cand):
+            return []
+
+        k = min(k, len(cand))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        best = scores[top[0]]
+        return [(float(scores[t] / best), decode_key(int(cand[t]))) for t in top]
+
+
+def train(users: np.ndarray, items: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    users/items: równoległe tablice (indeks użytkownika, zakodowany klucz tytułu), posortowane
+    po użytkowniku i od najnowszych ulubionych. Zwraca (keys, indptr, neighbors, weights).
+    """
+    keys, item_idx = np.unique(items, return_inverse=True)
+    n_items = len(keys)
+    empty = (keys, np.zeros(n_items + 1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+    if not n_items:
+        return empty
+
+    # Grupy użytkowników: początek i rozmiar (przycięty do COLLAB_MAX_USER_ITEMS najnowszych)
+    starts = np.flatnonzero(np.concatenate(([True], users[1:] != users[:-1])))
+    sizes = np.diff(np.concatenate((starts, [len(users)])))
+    sizes = np.minimum(sizes, settings.COLLAB_MAX_USER_ITEMS)
+
+    # Pary (a, b) w obrębie użytkownika - wektorowo, osobno dla każdego rozmiaru grupy
+    pair_codes = []
+    used = np.zeros(len(users), dtype=bool)
+    for size in np.unique(sizes):
+        group_starts = starts[sizes == size]
+        rows = group_starts[:, None] + np.arange(size)
+        used[rows.ravel()] = True
+        if size < 2:
+            continue
+        block = item_idx[rows]  # (użytkownicy, size)
+        ia, ib = np.triu_indices(size, k=1)
+        a, b = block[:, ia].ravel(), block[:, ib].ravel()
+        lo, hi = np.minimum(a, b), np.maximum(a, b)
+        pair_codes.append(lo.astype(np.int64) * n_items + hi)
+    if not pair_codes:
+        return empty
+
+    codes, counts = np.unique(np.concatenate(pair_codes), return_counts=True)
+    support = counts >= settings.COLLAB_MIN_SUPPORT
+    codes, counts = codes[support], counts[support]
+    a, b = codes // n_items, codes % n_items
+
+    # Liczba użytkowników na tytuł (tylko z przyciętych grup, spójnie z parami)
+    item_users = np.bincount(item_idx[used], minlength=n_items).astype(np.float64)
+
+    sim = counts / np.sqrt(item_users[a] * item_users[b])
+
+    # Symetrycznie + top-N sąsiadów na tytuł
+    src = np.concatenate([a, b])
+    dst = np.concatenate([b, a])
+    w = np.concatenate([sim, sim])
+    order = np.lexsort((-w, src))
+    src, dst, w = src[order], dst[order], w[order]
+    group_start = np.searchsorted(src, src, "left")
+    keep = (np.arange(len(src)) - group_start) < settings.COLLAB_NEIGHBORS
+    src, dst, w = src[keep], dst[keep], w[keep]
+
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(src, minlength=n_items)))).astype(np.int64)
+    return keys, indptr, dst.astype(np.int32), w.astype(np.float32)
+
+
+# --- zapis / odczyt wersji ---
+
+def _model_dir() -> Path:
+    return Path(settings.COLLAB_DIR)
+
+
+def save_model(arrays: Tuple[np.ndarray, ...], meta: dict) -> Path:
+    root = _model_dir()
+    target = root / meta["version"]
+    tmp = root / f".{meta['version']}.tmp"
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    for name, arr in zip(ARRAYS, arrays):
+        np.save(tmp / f"{name}.npy", arr)
+    (tmp / "meta.json").write_text(json.dumps(meta))
+    tmp.rename(target)
+
+    # Atomowa podmiana wskaźnika na aktualną wersję
+    pointer = root / "CURRENT.tmp"
+    pointer.write_text(meta["version"])
+    pointer.replace(root / "CURRENT")
+
+    # Sprzątanie starych wersji (otwarte mmapy działają dalej - pliki znikają dopiero po zamknięciu).
+    # Poprzednia zostaje zawsze: follower mógł przed chwilą przeczytać CURRENT i właśnie otwiera jej pliki.
+    versions = sorted(p for p in root.iterdir() if p.is_dir() and p.name.startswith("v"))
+    for old in versions[:-max(settings.COLLAB_KEEP_VERSIONS, 2)]:
+        shutil.rmtree(old, ignore_errors=True)
+    return target
+
+
+def load_model() -> Optional[CollabModel]:
+    root = _model_dir()
+    pointer = root / "CURRENT"
+    if not pointer.exists():
+        return None
+    path = root / pointer.read_text().strip()
+    arrays = [np.load(path / f"{name}.npy", mmap_mode="r") for name in ARRAYS]
+    meta = json.loads((path / "meta.json").read_text())
+    return CollabModel(*arrays, meta)
+
+
+_model: Optional[CollabModel] = None
+
+
+def get_model() -> Optional[CollabModel]:
+    return _model
+
+
+async def retrain() -> Optional[CollabModel]:
+    """Odczyt favorites, trening w wątku (CPU), zapis nowej wersji i podmiana modelu."""
+    global _model
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(FavoriteMovie.user_session_id, FavoriteMovie.tmdb_id, FavoriteMovie.media_type)
+            .order_by(FavoriteMovie.user_session_id, FavoriteMovie.id.desc())
+        )
+        rows = result.all()
+
+    user_ids = {}
+    users = np.fromiter((user_ids.setdefault(sid, len(user_ids)) for sid, _, _ in rows), dtype=np.int64, count=len(rows))
+    items = np.fromiter((encode_key(tmdb_id, m_type or "movie") for _, tmdb_id, m_type in rows), dtype=np.int64, count=len(rows))
+
+    arrays = await asyncio.to_thread(train, users, items)
+    meta = {"version": f"v{int(time.time() * 1000)}", "trained_at": time.time(), "users": len(user_ids),
+            "rows": len(rows), "items": int(len(arrays[0])), "edges": int(len(arrays[2]))}
+    await asyncio.to_thread(save_model, arrays, meta)
+    _model = load_model()
+    print(f"Model CF {meta['version']}: {meta['rows']} ulubionych, {meta['edges']} krawędzi "
+          f"w {time.perf_counter() - start:.1f}s")
+    return _model
+
+
+def reload_model() -> Optional[CollabModel]:
+    """Wczytanie wersji wskazanej przez CURRENT, jeśli to nie ta, której już używamy (np. nowa od lidera)."""
+    global _model
+    pointer = _model_dir() / "CURRENT"
+    if not pointer.exists():
+        return _model
+    if _model is None or _model.version != pointer.read_text().strip():
+        _model = load_model()
+    return _model
+
+
+async def collab_trainer():
+    """
+    Pętla w tle: wczytanie ostatniej wersji (mmap), potem retrening co COLLAB_RETRAIN_INTERVAL - tylko
+    w workerze-liderze. Pozostałe co FOLLOWER_POLL_INTERVAL przełączają się na najnowszą wersję.
+    """
+    try:
+        reload_model()
+    except Exception as e:
+        print(f"Nie udało się wczytać modelu CF: {e}")
+
+    delay = settings.COLLAB_INITIAL_DELAY
+    while True:
+        await asyncio.sleep(delay)
+        delay = settings.COLLAB_RETRAIN_INTERVAL * random.uniform(0.9, 1.1)
+        try:
+            if not leader.is_leader():
+                delay = settings.FOLLOWER_POLL_INTERVAL
+                reload_model()
+                continue
+            age = time.time() - _model.meta.get("trained_at", 0) if _model is not None else None
+            if age is not None and age < settings.COLLAB_RETRAIN_INTERVAL:
+                # Świeży model z dysku (np. po restarcie albo przejęciu roli lidera)
+                delay = settings.COLLAB_RETRAIN_INTERVAL - age
+                continue
+            await retrain()
+        except Exception as e:
+            print(f"Błąd treningu modelu CF: {e}")
@@ -0,0 +1,296 @@
+# backend/app/services/corpus.py
+"""
+Lokalny korpus kandydatów do rekomendacji.
+
+Zadanie w tle (start w lifespan) co CORPUS_REFRESH_INTERVAL pobiera strony discover/popular/top_rated
+(oraz discover per dostawca i per kraj - tych informacji nie ma w wynikach list) i składa je
+w kolumnowy korpus NumPy. `CandidateCorpus.discover` odpowiada na te same parametry, które
+generate_recommendations buduje w `api_params`, więc rekomendacje liczą się z pamięci,
+a TMDB zostaje fallbackiem (zapytania, na które korpus nie umie odpowiedzieć, albo za mało wyników).
+Przy kilku workerach korpus buduje tylko lider (app/core/leader.py), reszta wczytuje jego plik.
+"""
+from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+from sqlalchemy.future import select
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import numpy as np
+
+from app.core import leader
+from app.core.config import settings
+from app.core.paging import fetch_pages
+from app.core.resilience import Throttle
+from app.core.tmdb import TMDBClient
+from app.db.database import AsyncSessionLocal
+from app.db.models import TitleMetadata
+from app.services.scoring import genre_mask, get_year_from_item
+from app.services import typeahead
+
+MEDIA = {"movie": 0, "tv": 1}
+PAGE_SIZE = 20  # tyle wyników ma strona discover w TMDB
+
+# Parametry, których korpus nie zna (np. ekipa) - takie zapytania idą do TMDB
+UNSUPPORTED_PARAMS = {"with_crew", "with_cast", "with_people", "with_companies", "with_keywords"}
+
+# Pola zachowywane z wyników list (reszta, np. overview, jest zbędna dla rekomendacji)
+ITEM_FIELDS = ("id", "title", "name", "poster_path", "release_date", "first_air_date", "popularity",
+               "vote_average", "vote_count", "genre_ids", "original_language", "origin_country")
+
+_current: Optional["CandidateCorpus"] = None
+_loaded_mtime: Optional[float] = None  # mtime wczytanego pliku korpusu (workery-followerzy)
+
+
+def current() -> Optional["CandidateCorpus"]:
+    return _current
+
+
+def _feed_typeahead(corpus: "CandidateCorpus"):
+    # Tytuły z korpusu zasilają też lokalne podpowiedzi wyszukiwania
+    typeahead.remember({**it, "media_type": "tv" if m else "movie"} for it, m in zip(corpus.items, corpus.media.tolist()))
+
+
+def _bits(values: List[str]) -> Dict[str, int]:
+    return {v: i for i, v in enumerate(values)}
+
+
+class CandidateCorpus:
+    """Kolumny NumPy + odchudzone słowniki tytułów (te same indeksy)."""
+
+    def __init__(self, items: List[dict], media: List[int], runtime: List[int],
+                 providers: List[int], countries: List[int], built_at: float):
+        self.items = items
+        self.built_at = built_at
+        self.provider_bits = _bits([str(p) for p in settings.WATCH_PROVIDER_IDS])
+        self.country_bits = _bits(settings.CORPUS_COUNTRIES)
+
+        n = len(items)
+        self.media = np.array(media, dtype=np.int8)
+        self.ids = np.fromiter((it["id"] for it in items), dtype=np.int64, count=n)
+        self.genres = np.fromiter((genre_mask(it.get("genre_ids")) for it in items), dtype=np.uint64, count=n)
+        self.year = np.fromiter((get_year_from_item(it) for it in items), dtype=np.int32, count=n)
+        self.popularity = np.fromiter((it.get("popularity") or 0 for it in items), dtype=np.float64, count=n)
+        self.vote = np.fromiter((it.get("vote_average") or 0 for it in items), dtype=np.float64, count=n)
+        self.vote_count = np.fromiter((it.get("vote_count") or 0 for it in items), dtype=np.int64, count=n)
+        self.runtime = np.array(runtime, dtype=np.int32)
+        self.providers = np.array(providers, dtype=np.uint64)
+        self.countries = np.array(countries, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.items)
+
+    def discover(self, endpoint: str, params: dict, pages) -> Optional[List[dict]]:
+        """
+        Lokalny odpowiednik fetch_discover: te same parametry, wyniki w kolejności `sort_by`,
+        pocięte na strony po 20. None = korpus nie umie odpowiedzieć na to zapytanie.
+        """
+        media = MEDIA.get(endpoint.rsplit("/", 1)[-1])
+        if media is None or not len(self.items) or UNSUPPORTED_PARAMS.intersection(params):
+            return None
+
+        m = self.media == media
+
+        genres = params.get("with_genres")
+        if genres:
+            sep = "," if "," in str(genres) else "|"
+            mask = np.uint64(genre_mask(int(g) for g in str(genres).split(sep) if g))
+            m &= ((self.genres & mask) == mask) if sep == "," else ((self.genres & mask) != 0)
+
+        date_field = "primary_release_date" if media == 0 else "first_air_date"
+        if params.get(f"{date_field}.gte"):
+            m &= self.year >= int(str(params[f"{date_field}.gte"])[:4])
+        if params.get(f"{date_field}.lte"):
+            m &= self.year <= int(str(params[f"{date_field}.lte"])[:4])
+
+        if params.get("vote_average.gte") is not None:
+            m &= self.vote >= float(params["vote_average.gte"])
+        if params.get("vote_count.gte") is not None:
+            m &= self.vote_count >= int(params["vote_count.gte"])
+        if params.get("vote_count.lte") is not None:
+            m &= self.vote_count <= int(params["vote_count.lte"])
+        if params.get("popularity.lte") is not None:
+            m &= self.popularity <= float(params["popularity.lte"])
+
+        # Runtime znamy tylko dla tytułów z detalami - nieznany przepuszczamy (hard filter i tak go sprawdzi)
+        if params.get("with_runtime.gte"):
+            m &= (self.runtime == 0) | (self.runtime >= int(params["with_runtime.gte"]))
+        if params.get("with_runtime.lte"):
+            m &= (self.runtime == 0) | (self.runtime <= int(params["with_runtime.lte"]))
+
+        if params.get("with_origin_country"):
+            bit = self.country_bits.get(str(params["with_origin_country"]))
+            if bit is None:
+                return None
+            m &= (self.countries & np.uint64(1 << bit)) != 0
+        if params.get("with_watch_providers"):
+            bit = self.provider_bits.get(str(params["with_watch_providers"]))
+            if bit is None:
+                return None
+            m &= (self.providers & np.uint64(1 << bit)) != 0
+
+        idx = np.flatnonzero(m)
+        if params.get("sort_by") == "vote_average.desc":
+            order = np.lexsort((-self.vote_count[idx], -self.vote[idx]))
+        else:
+            order = np.argsort(-self.popularity[idx], kind="stable")
+        idx = idx[order]
+
+        pages = list(pages)
+        start, end = (min(pages) - 1) * PAGE_SIZE, max(pages) * PAGE_SIZE
+        # Bez kopii - wywołujący przepisują pola do własnych rekordów (app/core/records.Candidate)
+        return [self.items[i] for i in idx[start:end]]
+
+    # --- zapis / odczyt (warm start po restarcie) ---
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Unikalny plik tymczasowy - dwa zapisy naraz nie piszą do tego samego pliku
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.stem}.", suffix=".tmp.npz",
+                                         delete=False) as tmp:
+            try:
+                np.savez_compressed(
+                    tmp,
+                    items=np.frombuffer(json.dumps(self.items).encode(), dtype=np.uint8),
+                    media=self.media, runtime=self.runtime, providers=self.providers, countries=self.countries,
+                    built_at=np.array([self.built_at]),
+                )
+            except BaseException:
+                tmp.close()
+                os.unlink(tmp.name)
+                raise
+        os.replace(tmp.name, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["CandidateCorpus"]:
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            items = json.loads(data["items"].tobytes().decode())
+            return cls(items, data["media"].tolist(), data["runtime"].tolist(), data["providers"].tolist(),
+                       data["countries"].tolist(), float(data["built_at"][0]))
+
+
+def _sources(media_type: str) -> List[Tuple[str, dict, Optional[str], Optional[str]]]:
+    """(endpoint, parametry, dostawca, kraj) - wszystko, co ingestia pobiera dla danego typu."""
+    endpoint = f"/discover/{media_type}"
+    base = {"language": "pl-PL", "include_adult": "false"}
+    sources = [
+        (endpoint, {**base, "sort_by": "popularity.desc", "vote_count.gte": 100}, None, None),
+        (endpoint, {**base, "sort_by": "vote_average.desc", "vote_count.gte": 15,
+                    "vote_count.lte": 500, "popularity.lte": 10}, None, None),
+        (f"/{media_type}/popular", {"language": "pl-PL"}, None, None),
+        (f"/{media_type}/top_rated", {"language": "pl-PL"}, None, None),
+    ]
+    for provider in settings.WATCH_PROVIDER_IDS:
+        sources.append((endpoint, {**base, "sort_by": "popularity.desc", "with_watch_providers": provider,
+                                   "watch_region": "PL"}, str(provider), None))
+    for country in settings.CORPUS_COUNTRIES:
+        sources.append((endpoint, {**base, "sort_by": "popularity.desc", "with_origin_country": country},
+                        None, country))
+    return sources
+
+
+async def build_corpus(client: TMDBClient) -> CandidateCorpus:
+    items: Dict[Tuple[int, int], dict] = {}
+    providers: Dict[Tuple[int, int], int] = {}
+    countries: Dict[Tuple[int, int], int] = {}
+    provider_bits = _bits([str(p) for p in settings.WATCH_PROVIDER_IDS])
+    country_bits = _bits(settings.CORPUS_COUNTRIES)
+
+    # Źródła po kolei, strony pod własnym limitem - przebudowa nie zjada limitów klienta TMDB
+    throttle = Throttle(settings.CORPUS_CONCURRENCY, settings.CORPUS_RATE_LIMIT)
+    for media_type, media in MEDIA.items():
+        for endpoint, params, prov, country in _sources(media_type):
+            pages = range(1, (settings.CORPUS_FILTER_PAGES if (prov or country) else settings.CORPUS_PAGES) + 1)
+            result = await fetch_pages(client, endpoint, params, pages=pages, gate=throttle)
+            for it in result.results:
+                if not it.get("id"):
+                    continue
+                key = (media, it["id"])
+                items.setdefault(key, {f: it[f] for f in ITEM_FIELDS if f in it})
+                if prov is not None:
+                    providers[key] = providers.get(key, 0) | (1 << provider_bits[prov])
+                if country is not None:
+                    countries[key] = countries.get(key, 0) | (1 << country_bits[country])
+                for c in it.get("origin_country") or []:
+                    if c in country_bits:
+                        countries[key] = countries.get(key, 0) | (1 << country_bits[c])
+
+    # Runtime z lokalnych metadanych (title_metadata) - bez dodatkowych zapytań do TMDB
+    runtimes: Dict[Tuple[int, int], int] = {}
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(select(TitleMetadata.tmdb_id, TitleMetadata.media_type, TitleMetadata.runtime))
+        for tmdb_id, media_type, runtime in rows.all():
+            if media_type in MEDIA:
+                runtimes[(MEDIA[media_type], tmdb_id)] = runtime or 0
+
+    keys = list(items)
+    return CandidateCorpus(
+        [items[k] for k in keys],
+        [k[0] for k in keys],
+        [runtimes.get(k, 0) for k in keys],
+        [providers.get(k, 0) for k in keys],
+        [countries.get(k, 0) for k in keys],
+        time.time(),
+    )
+
+
+async def refresh_corpus(client: TMDBClient) -> CandidateCorpus:
+    global _current
+    start = time.perf_counter()
+    corpus = await build_corpus(client)
+    if len(corpus):  # pusty wynik (np. TMDB leży) nie nadpisuje poprzedniego korpusu
+        _current = corpus
+        corpus.save(Path(settings.CORPUS_PATH))
+        _feed_typeahead(corpus)
+    print(f"Korpus kandydatów: {len(corpus)} tytułów w {time.perf_counter() - start:.1f}s")
+    return corpus
+
+
+def reload_corpus() -> Optional[CandidateCorpus]:
+    """Wczytanie korpusu z dysku, jeśli plik zmienił się od ostatniego odczytu (np. zapisał go lider)."""
+    global _current, _loaded_mtime
+    path = Path(settings.CORPUS_PATH)
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return _current
+    if mtime != _loaded_mtime:
+        corpus = CandidateCorpus.load(path)
+        if corpus is not None:
+            _current = corpus
+            _feed_typeahead(corpus)
+        _loaded_mtime = mtime
+    return _current
+
+
+async def corpus_refresher(client: TMDBClient):
+    """
+    Pętla w tle: wczytanie z dysku, potem przebudowa co CORPUS_REFRESH_INTERVAL (z jitterem) - tylko
+    w workerze-liderze. Pozostałe co FOLLOWER_POLL_INTERVAL wczytują plik zapisany przez lidera.
+    """
+    try:
+        reload_corpus()
+    except Exception as e:
+        print(f"Nie udało się wczytać korpusu: {e}")
+
+    delay = settings.CORPUS_INITIAL_DELAY
+    while True:
+        await asyncio.sleep(delay)
+        delay = settings.CORPUS_REFRESH_INTERVAL * random.uniform(0.9, 1.1)
+        try:
+            if not leader.is_leader():
+                delay = settings.FOLLOWER_POLL_INTERVAL
+                reload_corpus()
+                continue
+            age = time.time() - _current.built_at if _current is not None else None
+            if age is not None and age < settings.CORPUS_REFRESH_INTERVAL:
+                # Świeży korpus z dysku (np. po restarcie albo przejęciu roli lidera)
+                delay = settings.CORPUS_REFRESH_INTERVAL - age
+                continue
+            await refresh_corpus(client)
+        except Exception as e:
+            print(f"Błąd budowania korpusu: {e}")
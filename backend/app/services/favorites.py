@@ -0,0 +1,125 @@
+# backend/app/services/favorites.py
+"""
+Atrybuty ulubionych w znormalizowanych tabelach (favorite_genres / favorite_people / favorite_keywords).
+"""
+from typing import Dict, List, Optional
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+import json
+
+from app.db.database import IS_SQLITE
+from app.db.models import FavoriteGenre, FavoriteMovie, FavoritePerson, FavoriteKeyword, FavoritesVersion, TitleMetadata
+
+if IS_SQLITE:
+    from sqlalchemy.dialects.sqlite import insert
+else:
+    from sqlalchemy.dialects.postgresql import insert
+
+Attributes = Dict[str, List[int]]  # {"genres": [...], "directors": [...], "cast": [...], "keywords": [...]}
+
+
+def empty_attributes() -> Attributes:
+    return {"genres": [], "directors": [], "cast": [], "keywords": []}
+
+
+def _ids(raw: Optional[str]) -> List[int]:
+    try:
+        return list(dict.fromkeys(json.loads(raw or "[]")))
+    except ValueError:
+        return []
+
+
+def attributes_from_metadata(meta: TitleMetadata) -> Attributes:
+    return {
+        "genres": _ids(meta.genres_json),
+        "directors": _ids(meta.directors_json),
+        "cast": _ids(meta.cast_json),
+        "keywords": _ids(meta.keywords_json),
+    }
+
+
+async def get_attributes(db: AsyncSession, favorite_id: int) -> Attributes:
+    attrs = empty_attributes()
+    res = await db.execute(select(FavoriteGenre.genre_id).where(FavoriteGenre.favorite_id == favorite_id))
+    attrs["genres"] = list(res.scalars().all())
+    res = await db.execute(select(FavoritePerson.role, FavoritePerson.person_id).where(FavoritePerson.favorite_id == favorite_id))
+    for role, person_id in res.all():
+        if role in ("directors", "cast"):
+            attrs[role].append(person_id)
+    res = await db.execute(select(FavoriteKeyword.keyword_id).where(FavoriteKeyword.favorite_id == favorite_id))
+    attrs["keywords"] = list(res.scalars().all())
+    return attrs
+
+
+def add_attributes(db: AsyncSession, favorite_id: int, attrs: Attributes):
+    """Dodaje wiersze atrybutów do sesji (favorite musi mieć już id - po flush)."""
+    db.add_all([FavoriteGenre(favorite_id=favorite_id, genre_id=g) for g in attrs["genres"]])
+    db.add_all([FavoritePerson(favorite_id=favorite_id, role="directors", person_id=p) for p in attrs["directors"]])
+    db.add_all([FavoritePerson(favorite_id=favorite_id, role="cast", person_id=p) for p in attrs["cast"]])
+    db.add_all([FavoriteKeyword(favorite_id=favorite_id, keyword_id=k) for k in attrs["keywords"]])
+
+
+async def delete_attributes(db: AsyncSession, favorite_id: int):
+    # Jawnie, bez polegania na ON DELETE CASCADE (SQLite bez PRAGMA foreign_keys go ignoruje)
+    for model in (FavoriteGenre, FavoritePerson, FavoriteKeyword):
+        await db.execute(delete(model).where(model.favorite_id == favorite_id))
+
+
+async def get_attributes_many(db: AsyncSession, favorite_ids: List[int]) -> Dict[int, Attributes]:
+    """Jak get_attributes, ale dla wielu ulubionych naraz - trzy zapytania zamiast trzech na tytuł."""
+    out = {fid: empty_attributes() for fid in favorite_ids}
+    if not out:
+        return out
+    res = await db.execute(select(FavoriteGenre.favorite_id, FavoriteGenre.genre_id).where(FavoriteGenre.favorite_id.in_(list(out))))
+    for fid, genre_id in res.all():
+        out[fid]["genres"].append(genre_id)
+    res = await db.execute(select(FavoritePerson.favorite_id, FavoritePerson.role, FavoritePerson.person_id)
+                           .where(FavoritePerson.favorite_id.in_(list(out))))
+    for fid, role, person_id in res.all():
+        if role in ("directors", "cast"):
+            out[fid][role].append(person_id)
+    res = await db.execute(select(FavoriteKeyword.favorite_id, FavoriteKeyword.keyword_id).where(FavoriteKeyword.favorite_id.in_(list(out))))
+    for fid, keyword_id in res.all():
+        out[fid]["keywords"].append(keyword_id)
+    return out
+
+
+async def delete_attributes_many(db: AsyncSession, favorite_ids: List[int]):
+    if not favorite_ids:
+        return
+    for model in (FavoriteGenre, FavoritePerson, FavoriteKeyword):
+        await db.execute(delete(model).where(model.favorite_id.in_(favorite_ids)))
+
+
+# --- WERSJA LISTY (ETagi) ---
+
+async def get_version(db: AsyncSession, session_id: str) -> int:
+    return await db.scalar(
+        select(FavoritesVersion.version).where(FavoritesVersion.user_session_id == session_id)
+    ) or 0
+
+
+def title_key(tmdb_id: int, media_type: Optional[str]) -> str:
+    """"movie:603" / "tv:1396" - ID w TMDB powtarzają się między typami, samo ID nie wystarcza."""
+    return f"{media_type or 'movie'}:{tmdb_id}"
+
+
+async def get_keys(db: AsyncSession, session_id: str) -> List[str]:
+    """Klucze ulubionych (title_key) w kolejności dodania (/user/favorites/ids, /home/bundle)."""
+    result = await db.execute(
+        select(FavoriteMovie.tmdb_id, FavoriteMovie.media_type)
+        .where(FavoriteMovie.user_session_id == session_id).order_by(FavoriteMovie.id)
+    )
+    return [title_key(tmdb_id, media_type) for tmdb_id, media_type in result.all()]
+
+
+async def bump_version(db: AsyncSession, session_id: str):
+    """+1 w bieżącej transakcji (commit robi wołający razem ze zmianą ulubionych)."""
+    # Upsert, a nie UPDATE + INSERT - dwa pierwsze równoległe kliknięcia nowego użytkownika
+    # nie mogą się wywrócić na kluczu głównym
+    stmt = insert(FavoritesVersion).values(user_session_id=session_id, version=1)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[FavoritesVersion.user_session_id],
+        set_={"version": FavoritesVersion.version + 1},
+    ))
@@ -0,0 +1,152 @@
+# backend/app/services/profile.py
+"""
+Profil gustu użytkownika (tabela user_profiles).
+
+toggle_favorite aktualizuje go przyrostowo (update_profile -> apply_favorite z sign=+1/-1), a rekomendacje
+i /user/stats czytają go w O(1). Gdy profilu nie ma (nowy użytkownik, po migracji), budujemy
+go jednorazowo agregatami SQL (GROUP BY) po tabelach ulubionych.
+"""
+from collections import Counter
+from typing import Dict, Iterable, Set, Tuple
+from sqlalchemy import case, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+import json
+
+from app.db.database import IS_SQLITE
+from app.db.models import FavoriteMovie, FavoriteGenre, FavoritePerson, UserProfile
+from app.services.favorites import Attributes
+
+if IS_SQLITE:
+    from sqlalchemy.dialects.sqlite import insert
+else:
+    from sqlalchemy.dialects.postgresql import insert
+
+
+def _load_counts(raw: str) -> Dict[int, int]:
+    try:
+        return {int(k): v for k, v in json.loads(raw or "{}").items()}
+    except (ValueError, AttributeError):
+        return {}
+
+
+def _bump(counts: Dict[int, int], ids, sign: int):
+    for i in ids:
+        counts[i] = counts.get(i, 0) + sign
+        if counts[i] <= 0:
+            del counts[i]
+
+
+def apply_favorite(profile: UserProfile, fav: FavoriteMovie, attrs: Attributes, sign: int):
+    """Dolicza (sign=1) albo odejmuje (sign=-1) jeden ulubiony tytuł od profilu."""
+    genres = _load_counts(profile.genre_counts_json)
+    directors = _load_counts(profile.director_counts_json)
+    _bump(genres, attrs["genres"], sign)
+    _bump(directors, attrs["directors"], sign)
+    profile.genre_counts_json = json.dumps(genres)
+    profile.director_counts_json = json.dumps(directors)
+
+    profile.favorites_count = max(0, (profile.favorites_count or 0) + sign)
+    if fav.vote_average:
+        profile.vote_sum = (profile.vote_sum or 0.0) + sign * fav.vote_average
+        profile.vote_n = max(0, (profile.vote_n or 0) + sign)
+    if fav.runtime and fav.runtime > 0:
+        profile.runtime_sum = (profile.runtime_sum or 0) + sign * fav.runtime
+        profile.runtime_n = max(0, (profile.runtime_n or 0) + sign)
+
+
+async def _ensure_row(db: AsyncSession, session_id: str) -> bool:
+    """Pusty wiersz profilu, jeśli go nie ma; True = wstawiony teraz. Dwa równoległe pierwsze dostępy się nie wywrócą."""
+    res = await db.execute(insert(UserProfile).values(user_session_id=session_id).on_conflict_do_nothing(
+        index_elements=[UserProfile.user_session_id]
+    ))
+    return res.rowcount == 1
+
+
+async def _locked(db: AsyncSession, session_id: str) -> UserProfile:
+    # Postgres: FOR UPDATE do końca transakcji; SQLite pomija klauzulę, ale po flush zmian ulubionych
+    # transakcja trzyma już blokadę zapisu. populate_existing - nie ufamy wcześniej wczytanej kopii
+    return await db.scalar(
+        select(UserProfile).where(UserProfile.user_session_id == session_id)
+        .with_for_update().execution_options(populate_existing=True)
+    )
+
+
+async def rebuild_profile(db: AsyncSession, session_id: str) -> UserProfile:
+    """Pełne przeliczenie z tabel ulubionych - same agregaty SQL, bez ładowania wierszy."""
+    await _ensure_row(db, session_id)
+    profile = await _locked(db, session_id)
+
+    totals = (await db.execute(
+        select(
+            func.count(FavoriteMovie.id),
+            func.sum(case((FavoriteMovie.vote_average > 0, FavoriteMovie.vote_average), else_=0)),
+            func.count(case((FavoriteMovie.vote_average > 0, 1))),
+            func.sum(case((FavoriteMovie.runtime > 0, FavoriteMovie.runtime), else_=0)),
+            func.count(case((FavoriteMovie.runtime > 0, 1))),
+        ).where(FavoriteMovie.user_session_id == session_id)
+    )).one()
+    profile.favorites_count = totals[0] or 0
+    profile.vote_sum, profile.vote_n = float(totals[1] or 0.0), totals[2] or 0
+    profile.runtime_sum, profile.runtime_n = int(totals[3] or 0), totals[4] or 0
+
+    genre_rows = await db.execute(
+        select(FavoriteGenre.genre_id, func.count())
+        .join(FavoriteMovie, FavoriteMovie.id == FavoriteGenre.favorite_id)
+        .where(FavoriteMovie.user_session_id == session_id)
+        .group_by(FavoriteGenre.genre_id)
+    )
+    profile.genre_counts_json = json.dumps({g: n for g, n in genre_rows.all()})
+
+    director_rows = await db.execute(
+        select(FavoritePerson.person_id, func.count())
+        .join(FavoriteMovie, FavoriteMovie.id == FavoritePerson.favorite_id)
+        .where(FavoriteMovie.user_session_id == session_id, FavoritePerson.role == "directors")
+        .group_by(FavoritePerson.person_id)
+    )
+    profile.director_counts_json = json.dumps({d: n for d, n in director_rows.all()})
+    return profile
+
+
+async def get_profile(db: AsyncSession, session_id: str) -> UserProfile:
+    """Profil do odczytu (rekomendacje, /user/stats); brakujący przeliczamy i zapisujemy."""
+    profile = await db.get(UserProfile, session_id)
+    if profile is None:
+        profile = await rebuild_profile(db, session_id)
+        await db.commit()
+    return profile
+
+
+async def update_profile(db: AsyncSession, session_id: str,
+                         changes: Iterable[Tuple[FavoriteMovie, Attributes, int]]) -> UserProfile:
+    """
+    Zmiany ulubionych (już po flush, commit robi wołający) w profilu. Wiersz czytamy dopiero teraz,
+    pod blokadą - równoległe toggle tego samego użytkownika nie gubią swoich delt.
+    Profilu nie było: przeliczenie z tabel, które zawierają już te zmiany.
+    """
+    if await _ensure_row(db, session_id):
+        return await rebuild_profile(db, session_id)
+    profile = await _locked(db, session_id)
+    for fav, attrs, sign in changes:
+        apply_favorite(profile, fav, attrs, sign)
+    return profile
+
+
+def top_genres(profile: UserProfile, n: int = 5) -> Set[int]:
+    return {g for g, _ in Counter(_load_counts(profile.genre_counts_json)).most_common(n)}
+
+
+def top_directors(profile: UserProfile, n: int = 3) -> Set[int]:
+    return {d for d, _ in Counter(_load_counts(profile.director_counts_json)).most_common(n)}
+
+
+def genre_counts(profile: UserProfile) -> Dict[int, int]:
+    return _load_counts(profile.genre_counts_json)
+
+
+def avg_vote(profile: UserProfile) -> float:
+    return profile.vote_sum / profile.vote_n if profile.vote_n else 0.0
+
+
+def avg_runtime(profile: UserProfile) -> float:
+    return profile.runtime_sum / profile.runtime_n if profile.runtime_n else 0.0
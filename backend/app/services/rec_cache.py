@@ -0,0 +1,77 @@
+# backend/app/services/rec_cache.py
+"""
+Cache rankingów rekomendacji per użytkownik.
+
+Klucz = (użytkownik + wersja ulubionych, mode, target_type, hash znormalizowanych filtrów). Wartość
+to stan potoku: uszeregowana lista kandydatów + numer następnej strony discover, więc kolejne
+strony wyników ("pokaż więcej") to wycinek tej samej listy, a nie nowe zapytania do TMDB.
+Wersja pochodzi z favorites_versions (podbijana w tej samej transakcji co zmiana ulubionych),
+więc zmiana w dowolnym workerze unieważnia rankingi we wszystkich - stare wpisy przestają być
+osiągalne i wypadają z LRU.
+"""
+from typing import List, Optional, Set
+import asyncio
+import hashlib
+import json
+import time
+import numpy as np
+
+from app.core.cache import CacheEntry, MemoryCache
+from app.core.config import settings
+
+_backend = MemoryCache(settings.REC_CACHE_MAX_ENTRIES)
+_stats = {"hits": 0, "misses": 0, "prewarms": 0}
+
+
+class RecState:
+    """Stan potoku dla jednego klucza; `lock` - jeden request naraz dociąga listę (czytamy bez niej - tylko rośnie)."""
+    __slots__ = ("ranked", "next_page", "seen_ids", "exhausted", "rng", "lock", "created_at")
+
+    def __init__(self, seen_ids: Set[int], seed: Optional[int]):
+        self.ranked: List[dict] = []
+        self.next_page = 1
+        self.seen_ids = set(seen_ids)
+        self.exhausted = False
+        self.rng = np.random.default_rng(seed)
+        self.lock = asyncio.Lock()
+        self.created_at = time.time()
+
+
+def filters_hash(req) -> str:
+    """Hash żądania bez stronicowania; listy gatunków posortowane, puste pola pominięte."""
+    payload = req.model_dump(exclude={"limit", "offset"})
+    filters = payload.get("filters") or {}
+    filters = {k: (sorted(set(v)) if isinstance(v, list) else v) for k, v in filters.items() if v not in (None, "", [])}
+    payload["filters"] = filters
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def make_key(session_id: Optional[str], favorites_version: int, req) -> str:
+    """`favorites_version` - favorites.get_version (0 dla anonimowych)."""
+    return f"{session_id or '-'}:{favorites_version}:{req.mode}:{req.target_type}:{filters_hash(req)}"
+
+
+async def get_state(key: str) -> Optional[RecState]:
+    if not settings.REC_CACHE_ENABLED:
+        return None
+    entry = await _backend.get(key)
+    if entry is not None and time.time() < entry.fresh_until:
+        _stats["hits"] += 1
+        return entry.value
+    _stats["misses"] += 1
+    return None
+
+
+async def put_state(key: str, state: RecState):
+    if not settings.REC_CACHE_ENABLED:
+        return
+    now = time.time()
+    await _backend.set(key, CacheEntry(state, now + settings.REC_CACHE_TTL, now + settings.REC_CACHE_TTL))
+
+
+def record_prewarm():
+    _stats["prewarms"] += 1
+
+
+def stats() -> dict:
+    return {"entries": len(_backend), **_stats, "evictions": _backend.evictions}
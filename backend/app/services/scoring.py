@@ -0,0 +1,205 @@
+# backend/app/services/scoring.py
+"""
+Wektorowa punktacja kandydatów do rekomendacji (NumPy).
+
+Kandydaci są pakowani do tablic (popularność, ocena, liczba głosów, rok, maska bitowa gatunków),
+a filtry i punktacja liczą się naraz dla całej partii. Semantyka jest taka sama jak we
+wcześniejszej pętli w generate_recommendations (łącznie z losowym jitterem 0..3 - z ziarnem,
+jeśli podano `seed`).
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+
+from app.core.config import settings
+from app.core.records import Candidate
+from app.services.collab import encode_key
+
+TitleKey = Tuple[int, str]  # (tmdb_id, media_type)
+
+# Gatunki TMDB (filmy + seriale) -> numer bitu w masce uint64
+_GENRE_BITS = {}
+for _gid in [28, 12, 16, 35, 80, 99, 18, 10751, 14, 36, 27, 10402, 9648, 10749, 878, 10770, 53, 10752, 37,
+             10759, 10762, 10763, 10764, 10765, 10766, 10767, 10768]:
+    _GENRE_BITS[_gid] = len(_GENRE_BITS)
+
+
+def genre_bit(genre_id: int) -> int:
+    """Bit gatunku; nieznane ID dostają kolejne wolne bity (max 64 gatunki)."""
+    bit = _GENRE_BITS.get(genre_id)
+    if bit is None:
+        if len(_GENRE_BITS) >= 64:
+            return -1
+        bit = _GENRE_BITS[genre_id] = len(_GENRE_BITS)
+    return bit
+
+
+def genre_mask(genre_ids: Iterable[int]) -> int:
+    mask = 0
+    for g in genre_ids or []:
+        bit = genre_bit(g)
+        if bit >= 0:
+            mask |= 1 << bit
+    return mask
+
+
+def year_from_date(d: Optional[str]) -> int:
+    if d and len(d) >= 4:
+        try: return int(d[:4])
+        except ValueError: return 0
+    return 0
+
+
+def get_year_from_item(item) -> int:
+    return year_from_date(item.get("release_date") or item.get("first_air_date"))
+
+
+class CandidateBatch:
+    """Kandydaci (app/core/records.Candidate) spakowani kolumnowo; `items` w tej samej kolejności."""
+    __slots__ = ("items", "ids", "keys", "popularity", "vote", "vote_count", "year", "genres", "has_poster")
+
+    def __init__(self, items: List[Candidate]):
+        # Jedno przejście w Pythonie; maski gatunków i lata cache'owane (kombinacji jest niewiele)
+        ids, keys, pop, vote, vote_count, year, genres, poster = [], [], [], [], [], [], [], []
+        mask_cache, year_cache = {}, {}
+        for it in items:
+            ids.append(it.id)
+            keys.append(encode_key(it.id, it.media_type or "movie"))
+            pop.append(it.popularity)
+            vote.append(it.vote_average)
+            vote_count.append(it.vote_count)
+            poster.append(bool(it.poster_path))
+
+            d = it.release_date
+            y = year_cache.get(d)
+            if y is None:
+                y = year_cache[d] = year_from_date(d)
+            year.append(y)
+
+            g = it.genre_ids
+            key = tuple(g) if g else ()
+            m = mask_cache.get(key)
+            if m is None:
+                m = mask_cache[key] = genre_mask(key)
+            genres.append(m)
+
+        self.items = items
+        self.ids = np.array(ids, dtype=np.int64)
+        self.keys = np.array(keys, dtype=np.int64)  # (id, typ) zakodowane jak w collab - ID filmów i seriali się powtarzają
+        self.popularity = np.array(pop, dtype=np.float64)
+        self.vote = np.array(vote, dtype=np.float64)
+        self.vote_count = np.array(vote_count, dtype=np.int64)
+        self.year = np.array(year, dtype=np.int32)
+        self.genres = np.array(genres, dtype=np.uint64)
+        self.has_poster = np.array(poster, dtype=bool)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _popcount(a: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(a).astype(np.int64)
+    return np.unpackbits(a.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+
+def lookup_title_scores(batch_keys: np.ndarray, scores: Dict[TitleKey, float]) -> np.ndarray:
+    """
+    Wynik (0..1) ze słownika {(id, typ): wynik} dla każdego tytułu partii (CandidateBatch.keys);
+    0 = brak w słowniku.
+    """
+    keys = np.fromiter((encode_key(i, m) for i, m in scores), dtype=np.int64, count=len(scores))
+    vals = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+    order = np.argsort(keys)
+    keys, vals = keys[order], vals[order]
+    pos = np.minimum(np.searchsorted(keys, batch_keys), len(keys) - 1)
+    return np.where(keys[pos] == batch_keys, vals[pos], 0.0)
+
+
+def filter_mask(batch: CandidateBatch, preference: str, mode: str, filters, mood_genres) -> np.ndarray:
+    """Filtry bez detali (krok 4): plakat, niszowość, rok, ocena, nastrój, gatunki w trybie AND."""
+    ok = (batch.ids != 0) & batch.has_poster
+
+    if preference == "niche":
+        ok &= (batch.popularity <= 15) & (batch.vote_count <= 800)
+
+    if mode == "advanced":
+        if filters.year_min: ok &= batch.year >= filters.year_min
+        if filters.year_max: ok &= batch.year <= filters.year_max
+        if filters.vote_min: ok &= batch.vote >= filters.vote_min
+        if mood_genres:
+            ok &= (batch.genres & np.uint64(genre_mask(mood_genres))) != 0
+        if filters.genres and filters.genre_mode == "and":
+            required = np.uint64(genre_mask(filters.genres))
+            ok &= (batch.genres & required) == required
+    return ok
+
+
+def score(batch: CandidateBatch, user_profile: dict, filters, mode: str, rng: np.random.Generator) -> np.ndarray:
+    pop, vote = batch.popularity, batch.vote
+
+    if filters.preference == "niche":
+        scores = vote * 10 - pop / 2
+    else:
+        scores = vote * 3 + np.minimum(pop, 200) / 10.0
+
+    if user_profile:
+        # A. Gatunki
+        if user_profile.get("top_genres"):
+            common = _popcount(batch.genres & np.uint64(genre_mask(user_profile["top_genres"])))
+            scores += np.where(common > 0, 5.0 + common * 8.0, 0.0)
+
+        # B. Zgodność Ocen
+        avg_user_vote = user_profile.get("avg_vote")
+        if avg_user_vote and avg_user_vote > 0:
+            scores += np.maximum(0, 10.0 - np.abs(vote - avg_user_vote) * 2)
+
+        # C. Podobieństwo treści do ulubionych (gatunki, słowa kluczowe, obsada, twórcy)
+        if user_profile.get("similar"):
+            scores += lookup_title_scores(batch.keys, user_profile["similar"]) * settings.SIM_WEIGHT
+
+        # D. Collaborative filtering - "kto polubił Twoje ulubione, polubił też..."
+        if user_profile.get("collab"):
+            scores += lookup_title_scores(batch.keys, user_profile["collab"]) * settings.COLLAB_WEIGHT
+
+    if mode == "advanced" and filters and filters.genres:
+        scores += _popcount(batch.genres & np.uint64(genre_mask(filters.genres))) * 3
+
+    scores += rng.uniform(0, 3.0, size=len(batch))
+    return scores
+
+
+def score_candidates(
+    candidates: List[Candidate],
+    user_profile: dict,
+    filters,
+    mode: str,
+    preference: str,
+    mood_genres,
+    exclude_ids: Set[int],
+    rng: np.random.Generator,
+) -> List[Tuple[float, Candidate]]:
+    """
+    Filtruje, deduplikuje (pierwsze przechodzące wystąpienie ID, pomijając `exclude_ids`)
+    i punktuje kandydatów. Zwraca [(score, item)] malejąco; ID wyników dopisuje do `exclude_ids`.
+    """
+    if not candidates:
+        return []
+    batch = CandidateBatch(candidates)
+    idx = np.flatnonzero(filter_mask(batch, preference, mode, filters, mood_genres))
+    if exclude_ids and len(idx):
+        idx = idx[~np.isin(batch.ids[idx], np.fromiter(exclude_ids, dtype=np.int64, count=len(exclude_ids)))]
+    # Pierwsze wystąpienie każdego ID (np.unique zwraca indeksy pierwszych wystąpień)
+    _, first = np.unique(batch.ids[idx], return_index=True)
+    idx = idx[np.sort(first)]
+    if not len(idx):
+        return []
+
+    sub = CandidateBatch.__new__(CandidateBatch)
+    for name in CandidateBatch.__slots__[1:]:
+        setattr(sub, name, getattr(batch, name)[idx])
+    sub.items = [candidates[i] for i in idx]
+
+    scores = score(sub, user_profile, filters, mode, rng)
+    order = np.argsort(-scores, kind="stable")
+    exclude_ids.update(int(i) for i in sub.ids)
+    return [(float(scores[i]), sub.items[i]) for i in order]
@@ -0,0 +1,261 @@
+# backend/app/services/similarity.py
+"""
+Indeks podobieństwa treści tytułów ("więcej takich jak moje ulubione").
+
+Każdy tytuł z title_metadata to rzadki wektor haszowanych cech (gatunki, słowa kluczowe,
+obsada, reżyserzy/twórcy, kraje) z wagami pól. Zapytanie = suma wektorów ulubionych,
+ważona IDF; wynik to iloczyn skalarny z każdym tytułem, liczony po listach postingów
+(tylko cechy z zapytania), więc top-K dla 100k tytułów to kilka-kilkanaście ms.
+
+Indeks rośnie przyrostowo (titles.py dopisuje każdy zapisany tytuł): nowe wiersze trafiają
+do małego segmentu "delta", który co jakiś czas scalamy z głównym (jak w LSM) - przy scalaniu
+wypadają też martwe wiersze (poprzednie wersje zaktualizowanych tytułów).
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.future import select
+import functools
+import json
+import math
+import time
+import zlib
+import numpy as np
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models import TitleMetadata
+
+TitleKey = Tuple[int, str]  # (tmdb_id, media_type)
+
+DIM = 1 << 20  # przestrzeń haszowanych cech
+
+# Waga pola w wektorze tytułu (pole -> (kolumna title_metadata, waga))
+FIELDS = {
+    "g": ("genres_json", 1.0),
+    "k": ("keywords_json", 1.5),
+    "c": ("cast_json", 0.8),
+    "d": ("directors_json", 2.0),
+    "n": ("production_countries_json", 0.5),
+}
+
+# Pola z listy wyników, z których składamy kandydata (jak z /discover)
+ITEM_FIELDS = ("title", "poster_path", "release_date", "vote_average", "vote_count", "popularity")
+
+
+def _ids(raw) -> list:
+    if isinstance(raw, list):
+        return raw
+    try:
+        return json.loads(raw or "[]")
+    except ValueError:
+        return []
+
+
+@functools.lru_cache(maxsize=1 << 18)
+def _feature(field: str, value) -> int:
+    # crc32 zamiast hash() - stabilny między procesami
+    return zlib.crc32(f"{field}:{value}".encode()) & (DIM - 1)
+
+
+def features_from_metadata(meta: dict) -> Tuple[np.ndarray, np.ndarray]:
+    """(posortowane ID cech, wagi) - kolizje haszy sumujemy."""
+    acc: Dict[int, float] = {}
+    for field, (column, weight) in FIELDS.items():
+        for value in _ids(meta.get(column)):
+            f = _feature(field, value)
+            acc[f] = acc.get(f, 0.0) + weight
+    feats = sorted(acc)
+    return np.array(feats, dtype=np.int64), np.array([acc[f] for f in feats], dtype=np.float32)
+
+
+class _Segment:
+    """Postingi posortowane po cesze: feats[i] -> (rows[i], vals[i])."""
+    __slots__ = ("feats", "rows", "vals")
+
+    def __init__(self, feats: np.ndarray, rows: np.ndarray, vals: np.ndarray):
+        order = np.argsort(feats, kind="stable")
+        self.feats, self.rows, self.vals = feats[order], rows[order], vals[order]
+
+    def __len__(self):
+        return len(self.feats)
+
+    def accumulate(self, qf: np.ndarray, qw: np.ndarray, n: int) -> np.ndarray:
+        lo = np.searchsorted(self.feats, qf, "left")
+        hi = np.searchsorted(self.feats, qf, "right")
+        lengths = hi - lo
+        total = int(lengths.sum())
+        if not total:
+            return np.zeros(n)
+        # Indeksy wszystkich postingów z zapytania bez pętli w Pythonie
+        offsets = np.repeat(lo - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        idx = offsets + np.arange(total)
+        return np.bincount(self.rows[idx], weights=self.vals[idx] * np.repeat(qw, lengths), minlength=n)
+
+
+def _empty_segment() -> _Segment:
+    return _Segment(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+
+
+class SimilarityIndex:
+    def __init__(self):
+        self.keys: List[TitleKey] = []
+        self.rows: Dict[TitleKey, int] = {}
+        self.items: List[dict] = []
+        self.row_feats: List[Tuple[np.ndarray, np.ndarray]] = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.is_tv = np.zeros(0, dtype=bool)
+        self.df = np.zeros(DIM, dtype=np.int32)  # w ilu żywych tytułach występuje cecha
+        self.n_alive = 0
+
+        self.main = _empty_segment()
+        self.delta = _empty_segment()
+        self._pending: List[int] = []  # wiersze jeszcze poza segmentami
+
+    def __len__(self):
+        return self.n_alive
+
+    def add(self, meta: dict):
+        """Dodaje/aktualizuje tytuł (słownik z kolumnami title_metadata)."""
+        key = (meta["tmdb_id"], meta["media_type"])
+        feats, weights = features_from_metadata(meta)
+        item = {"id": key[0], "media_type": key[1], "genre_ids": _ids(meta.get("genres_json")),
+                **{f: meta.get(f) for f in ITEM_FIELDS}}
+        old = self.rows.get(key)
+        if old is not None:
+            old_feats, old_weights = self.row_feats[old]
+            if np.array_equal(old_feats, feats) and np.array_equal(old_weights, weights):
+                # Te same cechy (zwykle ponowny zapis tych samych detali) - tylko pola kandydata w miejscu
+                self.items[old] = item
+                return
+            # Aktualizacja = wygaszenie starego wiersza + nowy wiersz
+            if old < len(self.alive):
+                self.alive[old] = False
+            self.df[old_feats] -= 1
+            self.n_alive -= 1
+
+        row = len(self.keys)
+        self.keys.append(key)
+        self.rows[key] = row
+        self.row_feats.append((feats, weights))
+        self.items.append(item)
+        self._pending.append(row)
+        self.df[feats] += 1
+        self.n_alive += 1
+
+    def add_many(self, metas: Iterable[dict]):
+        for meta in metas:
+            self.add(meta)
+        self._flush()
+
+    def _flush(self):
+        """Przenosi oczekujące wiersze do segmentu delta; duży delta scala z głównym."""
+        if not self._pending:
+            return
+        n = len(self.keys)
+        grow = n - len(self.alive)
+        if grow > 0:
+            self.alive = np.concatenate([self.alive, np.zeros(grow, dtype=bool)])
+            self.is_tv = np.concatenate([self.is_tv, np.zeros(grow, dtype=bool)])
+
+        parts_f, parts_r, parts_v = [self.delta.feats], [self.delta.rows], [self.delta.vals]
+        for row in self._pending:
+            feats, weights = self.row_feats[row]
+            norm = math.sqrt(float((weights.astype(np.float64) ** 2).sum())) or 1.0
+            parts_f.append(feats)
+            parts_r.append(np.full(len(feats), row, dtype=np.int64))
+            parts_v.append((weights / norm).astype(np.float32))
+            self.alive[row] = self.rows.get(self.keys[row]) == row
+            self.is_tv[row] = self.keys[row][1] == "tv"
+        self._pending = []
+        self.delta = _Segment(np.concatenate(parts_f), np.concatenate(parts_r), np.concatenate(parts_v))
+
+        if len(self.delta) > settings.SIM_MERGE_RATIO * max(len(self.main), 1):
+            self._merge()
+
+    def _merge(self):
+        """Delta do głównego segmentu; martwe wiersze wypadają, żywe dostają kolejne numery."""
+        keep_main = self.alive[self.main.rows]
+        keep_delta = self.alive[self.delta.rows]
+        live = np.flatnonzero(self.alive)
+        remap = np.cumsum(self.alive) - 1  # stary numer wiersza -> nowy (ważne tylko dla żywych)
+
+        self.keys = [self.keys[r] for r in live]
+        self.items = [self.items[r] for r in live]
+        self.row_feats = [self.row_feats[r] for r in live]
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        self.is_tv = self.is_tv[live]
+        self.alive = np.ones(len(live), dtype=bool)
+
+        self.main = _Segment(
+            np.concatenate([self.main.feats[keep_main], self.delta.feats[keep_delta]]),
+            remap[np.concatenate([self.main.rows[keep_main], self.delta.rows[keep_delta]])],
+            np.concatenate([self.main.vals[keep_main], self.delta.vals[keep_delta]]),
+        )
+        self.delta = _empty_segment()
+
+    def query(self, favorites: Iterable[TitleKey], k: int = 50, media_types: Optional[Set[str]] = None,
+              exclude: Optional[Set[TitleKey]] = None) -> List[Tuple[float, dict]]:
+        """
+        Top-K tytułów najbardziej podobnych do zbioru `favorites`. Zwraca [(podobieństwo 0..1, item)]
+        malejąco - podobieństwo względem najlepszego trafienia.
+        """
+        self._flush()
+        fav_rows = [self.rows[f] for f in favorites if f in self.rows]
+        if not fav_rows or not self.n_alive:
+            return []
+
+        feats = np.concatenate([self.row_feats[r][0] for r in fav_rows])
+        weights = np.concatenate([self.row_feats[r][1] for r in fav_rows]).astype(np.float64)
+        if not len(feats):
+            return []
+        qf, inv = np.unique(feats, return_inverse=True)
+        idf = np.log((self.n_alive + 1) / (self.df[qf] + 1)) + 1.0
+        # IDF po obu stronach (zapytanie i tytuł) - rzadkie cechy (słowo kluczowe, reżyser) ważą więcej niż gatunek
+        qw = np.bincount(inv, weights=weights) * idf * idf
+
+        n = len(self.keys)
+        scores = self.main.accumulate(qf, qw, n) + self.delta.accumulate(qf, qw, n)
+        valid = self.alive.copy()
+        valid[fav_rows] = False
+        if media_types is not None and len(media_types) == 1:
+            valid &= self.is_tv if "tv" in media_types else ~self.is_tv
+        if exclude:
+            for key in exclude:
+                row = self.rows.get(key)
+                if row is not None:
+                    valid[row] = False
+        scores[~valid] = 0.0
+
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[scores[top] > 0]
+        if not len(top):
+            return []
+        best = scores[top[0]]
+        return [(float(scores[r] / best), dict(self.items[r])) for r in top]
+
+
+_index = SimilarityIndex()
+
+
+def get_index() -> SimilarityIndex:
+    return _index
+
+
+def remember(meta: dict):
+    """Hook dla titles.py - każdy zapisany tytuł trafia do indeksu."""
+    if settings.SIM_ENABLED:
+        _index.add(meta)
+
+
+async def load_index():
+    """Zbudowanie indeksu z całej tabeli title_metadata (przy starcie aplikacji)."""
+    if not settings.SIM_ENABLED:
+        return
+    start = time.perf_counter()
+    columns = [TitleMetadata.tmdb_id, TitleMetadata.media_type, *(getattr(TitleMetadata, c) for c, _ in FIELDS.values()),
+               *(getattr(TitleMetadata, f) for f in ITEM_FIELDS)]
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(*columns))
+        _index.add_many(row._asdict() for row in result.all())
+    print(f"Indeks podobieństwa: {len(_index)} tytułów w {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,287 @@
+# backend/app/services/titles.py
+"""
+Lokalny magazyn metadanych tytułów (tabela title_metadata).
+
+Każda odpowiedź TMDB z detalami jest zapisywana write-through, a rekomendacje
+i ulubione czytają najpierw z bazy. Do TMDB idziemy tylko po brakujące tytuły;
+przeterminowane wiersze podajemy od razu i odświeżamy w tle.
+"""
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+import asyncio
+import json
+import time
+
+from app.core.config import settings
+from app.core.records import Candidate
+from app.core.tmdb import TMDBClient
+from app.db.database import AsyncSessionLocal, IS_SQLITE
+from app.db.models import TitleMetadata
+from app.services import similarity, typeahead
+
+if IS_SQLITE:
+    from sqlalchemy.dialects.sqlite import insert
+else:
+    from sqlalchemy.dialects.postgresql import insert
+
+# Te same parametry co w /movies/details - dzięki temu oba miejsca trafiają w ten sam wpis cache
+DETAILS_APPEND = "credits,watch/providers,keywords"
+
+TitleKey = Tuple[int, str]  # (tmdb_id, media_type)
+
+STORE_CHUNK = 500  # wierszy na jeden INSERT (limit zmiennych SQLite)
+
+_refreshing: set = set()      # klucze odświeżane właśnie w tle
+_background: set = set()      # referencje do zadań w tle
+
+
+def runtime_from_details(data: dict) -> int:
+    """Ujednolicenie pola runtime (film: runtime, serial: pierwszy episode_run_time)."""
+    if data.get("runtime"):
+        return data["runtime"]
+    if data.get("episode_run_time"):
+        return data["episode_run_time"][0] or 0
+    return 0
+
+
+def metadata_from_details(data: dict, media_type: str) -> dict:
+    credits = data.get("credits") or {}
+    if media_type == "movie":
+        director_ids = [m["id"] for m in credits.get("crew", []) if m.get("job") == "Director"]
+    else:
+        # W serialach są "created_by"
+        director_ids = [p["id"] for p in data.get("created_by", [])]
+
+    # Filmy: keywords.keywords, seriale: keywords.results
+    kw = data.get("keywords") or {}
+    keyword_ids = [k["id"] for k in (kw.get("keywords") or kw.get("results") or [])]
+
+    countries = [c.get("iso_3166_1") for c in data.get("production_countries", []) if c.get("iso_3166_1")]
+    if not countries:
+        countries = data.get("origin_country", []) or []
+
+    return {
+        "tmdb_id": data.get("id"),
+        "media_type": media_type,
+        "title": data.get("title") or data.get("name") or "Bez tytułu",
+        "poster_path": data.get("poster_path"),
+        "release_date": data.get("release_date") or data.get("first_air_date"),
+        "runtime": runtime_from_details(data),
+        "original_language": data.get("original_language"),
+        "vote_average": data.get("vote_average") or 0.0,
+        "vote_count": data.get("vote_count") or 0,
+        "popularity": data.get("popularity") or 0.0,
+        "genres_json": json.dumps([g["id"] for g in data.get("genres", [])]),
+        "directors_json": json.dumps(director_ids),
+        "cast_json": json.dumps([c["id"] for c in credits.get("cast", [])[:10]]),
+        "keywords_json": json.dumps(keyword_ids),
+        "production_countries_json": json.dumps(countries),
+        "refreshed_at": time.time(),
+    }
+
+
+async def fetch_details(client: TMDBClient, tmdb_id: int, media_type: str) -> Optional[dict]:
+    params = {"language": "pl-PL", "append_to_response": DETAILS_APPEND}
+    return await client.get_json(f"/{media_type}/{tmdb_id}", params=params)
+
+
+def _indexed(meta: dict):
+    """Każdy zapisany tytuł trafia też do indeksów w pamięci (podobieństwo treści, wyszukiwarka)."""
+    similarity.remember(meta)
+    typeahead.remember_metadata(meta)
+
+
+async def _store(db: AsyncSession, metas: List[dict], overwrite: bool = False):
+    """
+    Zapis wierszy upsertem + commit. Ten sam tytuł zapisany równolegle przez inny request nie kończy
+    się IntegrityError, więc nie ma rollbacku - ten wygasiłby obiekty, które wołający wczytał
+    wcześniej w tej samej sesji. Bez `overwrite` zostaje cudza wersja (jest równie dobra).
+    """
+    for start in range(0, len(metas), STORE_CHUNK):
+        stmt = insert(TitleMetadata).values(metas[start:start + STORE_CHUNK])
+        keys = [TitleMetadata.tmdb_id, TitleMetadata.media_type]
+        if overwrite:
+            stmt = stmt.on_conflict_do_update(index_elements=keys, set_={
+                c: stmt.excluded[c] for c in metas[0] if c not in ("tmdb_id", "media_type")})
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+        await db.execute(stmt)
+    await db.commit()
+
+
+async def remember(db: AsyncSession, client: TMDBClient, data: dict, media_type: str) -> TitleMetadata:
+    """
+    Write-through odpowiedzi z /movies/details - tylko dla tytułu, którego nie ma w bazie.
+    Detale mogą pochodzić z cache odpowiedzi (do 6 h), więc istniejącego wiersza nie nadpisujemy;
+    przeterminowany odświeża w tle schedule_refresh. Odczyt znanego tytułu nie pisze do bazy.
+    """
+    key = (data.get("id"), media_type)
+    row = await db.get(TitleMetadata, key)
+    if row is not None:
+        if is_stale(row):
+            schedule_refresh(client, [key])
+        return row
+    meta = metadata_from_details(data, media_type)
+    await _store(db, [meta])
+    _indexed(meta)
+    return TitleMetadata(**meta)
+
+
+def is_stale(row: TitleMetadata) -> bool:
+    return (time.time() - (row.refreshed_at or 0)) > settings.TITLE_METADATA_MAX_AGE
+
+
+async def get_titles(db: AsyncSession, client: TMDBClient, keys: Iterable[TitleKey]) -> Dict[TitleKey, TitleMetadata]:
+    """
+    Metadane dla wielu tytułów naraz: jeden SELECT, równoległe pobranie tylko brakujących
+    z TMDB i jeden commit. Tytułów, których TMDB nie zna, nie ma w wyniku.
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+
+    ids = {k[0] for k in keys}
+    result = await db.execute(select(TitleMetadata).where(TitleMetadata.tmdb_id.in_(ids)))
+    wanted = set(keys)
+    found = {(r.tmdb_id, r.media_type): r for r in result.scalars().all() if (r.tmdb_id, r.media_type) in wanted}
+
+    missing = [k for k in keys if k not in found]
+    if missing:
+        fetched = await asyncio.gather(
+            *(fetch_details(client, tmdb_id, media_type) for tmdb_id, media_type in missing),
+            return_exceptions=True,
+        )
+        metas = []
+        for key, data in zip(missing, fetched):
+            if isinstance(data, Exception):
+                print(f"Błąd pobierania detali {key}: {data}")
+                continue
+            if data:
+                meta = metadata_from_details(data, key[1])
+                found[key] = TitleMetadata(**meta)
+                metas.append(meta)
+                _indexed(meta)
+        if metas:
+            await _store(db, metas)
+
+    stale = [k for k, row in found.items() if is_stale(row)]
+    if stale:
+        schedule_refresh(client, stale)
+    return found
+
+
+async def iter_titles(db: AsyncSession, client: TMDBClient, keys: Iterable[TitleKey]
+                      ) -> AsyncIterator[Tuple[TitleKey, Optional[TitleMetadata]]]:
+    """
+    Jak get_titles, ale zwraca (klucz, wiersz albo None) w kolejności `keys`, gdy tylko dany tytuł
+    jest gotowy - brakujące lecą do TMDB równolegle, a pierwszy wynik nie czeka na najwolniejszy.
+    Zapis i commit na końcu, także gdy konsument przerwie wcześniej (używać z contextlib.aclosing).
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return
+    ids = {k[0] for k in keys}
+    result = await db.execute(select(TitleMetadata).where(TitleMetadata.tmdb_id.in_(ids)))
+    wanted = set(keys)
+    found = {(r.tmdb_id, r.media_type): r for r in result.scalars().all() if (r.tmdb_id, r.media_type) in wanted}
+    pending = {k: asyncio.ensure_future(fetch_details(client, k[0], k[1])) for k in keys if k not in found}
+    fetched: Dict[TitleKey, dict] = {}
+
+    def _parse(key: TitleKey, data) -> Optional[TitleMetadata]:
+        if isinstance(data, Exception):
+            print(f"Błąd pobierania detali {key}: {data}")
+            return None
+        if not data:
+            return None
+        fetched[key] = metadata_from_details(data, key[1])
+        # Wiersz poza sesją - zapis jednym upsertem na końcu
+        return TitleMetadata(**fetched[key])
+
+    done = set()
+    try:
+        for key in keys:
+            if key in found:
+                row = found[key]
+            else:
+                try:
+                    data = await pending[key]
+                except Exception as e:
+                    data = e
+                done.add(key)
+                row = _parse(key, data)
+            yield key, row
+    finally:
+        stale = [k for k, row in found.items() if is_stale(row)]
+        rest = [k for k in pending if k not in done]
+        if rest:
+            for key, data in zip(rest, await asyncio.gather(*(pending[k] for k in rest), return_exceptions=True)):
+                _parse(key, data)
+        for meta in fetched.values():
+            _indexed(meta)
+        if fetched:
+            await _store(db, list(fetched.values()))
+        if stale:
+            schedule_refresh(client, stale)
+
+
+async def get_title(db: AsyncSession, client: TMDBClient, tmdb_id: int, media_type: Optional[str] = None) -> Optional[TitleMetadata]:
+    """Bez media_type próbujemy najpierw film, potem serial (jak wcześniej toggle_favorite)."""
+    for m_type in ([media_type] if media_type else ["movie", "tv"]):
+        row = (await get_titles(db, client, [(tmdb_id, m_type)])).get((tmdb_id, m_type))
+        if row is not None:
+            return row
+    return None
+
+
+def candidate_from_row(row: TitleMetadata) -> Candidate:
+    """Wiersz title_metadata jako kandydat rekomendacji (jak wynik z /discover)."""
+    try:
+        genre_ids = json.loads(row.genres_json or "[]")
+    except ValueError:
+        genre_ids = []
+    return Candidate(
+        row.tmdb_id, row.media_type, row.title, row.poster_path, row.release_date,
+        row.vote_average or 0.0, row.vote_count or 0, row.popularity or 0.0, genre_ids,
+    )
+
+
+async def stored_candidates(db: AsyncSession, keys: List[TitleKey]) -> List[Candidate]:
+    """Kandydaci prosto z bazy (bez TMDB), w kolejności `keys`; tytułów bez metadanych nie ma."""
+    if not keys:
+        return []
+    result = await db.execute(select(TitleMetadata).where(TitleMetadata.tmdb_id.in_({k[0] for k in keys})))
+    rows = {(r.tmdb_id, r.media_type): r for r in result.scalars().all()}
+    return [candidate_from_row(rows[k]) for k in keys if k in rows]
+
+
+def schedule_refresh(client: TMDBClient, keys: List[TitleKey]):
+    """Odświeżenie przeterminowanych wierszy w tle - z własną sesją bazy, bez blokowania requestu."""
+    keys = [k for k in keys if k not in _refreshing]
+    if not keys:
+        return
+    _refreshing.update(keys)
+
+    async def _refresh():
+        try:
+            async with AsyncSessionLocal() as db:
+                fetched = await asyncio.gather(
+                    *(fetch_details(client, tmdb_id, media_type) for tmdb_id, media_type in keys),
+                    return_exceptions=True,
+                )
+                metas = []
+                for key, data in zip(keys, fetched):
+                    if data and not isinstance(data, Exception):
+                        meta = metadata_from_details(data, key[1])
+                        metas.append(meta)
+                        _indexed(meta)
+                if metas:
+                    await _store(db, metas, overwrite=True)
+        except Exception as e:
+            print(f"Błąd odświeżania metadanych: {e}")
+        finally:
+            _refreshing.difference_update(keys)
+
+    task = asyncio.ensure_future(_refresh())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
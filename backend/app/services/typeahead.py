@@ -0,0 +1,246 @@
+# backend/app/services/typeahead.py
+"""
+Lokalny indeks podpowiedzi wyszukiwania (search-as-you-type).
+
+Tytuły znane aplikacji (title_metadata, korpus kandydatów, wyniki wyszukiwania TMDB) trafiają do
+posortowanej listy słów - każde słowo zapytania musi być prefiksem jakiegoś słowa tytułu
+(bisect + przecięcie zbiorów w NumPy). Krótkie literówki łapie fallback trigramowy.
+Normalizacja zdejmuje polskie znaki ("zolw" == "żółw") i interpunkcję.
+
+TMDB /search/multi jest wołane tylko przy missie, a odpowiedź trzymamy pod znormalizowanym
+zapytaniem; kompletna odpowiedź dla prefiksu obsługuje też wszystkie dłuższe zapytania.
+"""
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.future import select
+import re
+import time
+import unicodedata
+import numpy as np
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models import TitleMetadata
+
+# ł nie rozkłada się w NFKD - reszta polskich znaków tak
+_TRANSLATE = str.maketrans({"ł": "l", "Ł": "l"})
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+ITEM_FIELDS = ("id", "media_type", "title", "name", "poster_path", "release_date", "first_air_date",
+               "popularity", "vote_average")
+
+
+def normalize(text: Optional[str]) -> str:
+    text = unicodedata.normalize("NFKD", (text or "").translate(_TRANSLATE).lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def trigrams(norm: str) -> set:
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def matches(norm_title: str, tokens: List[str]) -> bool:
+    words = norm_title.split()
+    return all(any(w.startswith(t) for w in words) for t in tokens)
+
+
+def _sorted_words(norms: List[str], ids: Iterable[int]) -> Tuple[List[str], np.ndarray]:
+    pairs = sorted((w, i) for i in ids for w in set(norms[i].split()))
+    return [w for w, _ in pairs], np.array([i for _, i in pairs], dtype=np.int64)
+
+
+class TypeaheadIndex:
+    """
+    Słowa tytułów posortowane w dwóch segmentach: główny (przebudowywany rzadko) i mały "delta"
+    z ostatnio dodanymi tytułami - dodanie tytułu nie wymaga przebudowy całego indeksu.
+    """
+
+    def __init__(self):
+        self.entries: List[dict] = []
+        self.norm: List[str] = []
+        self.keys: Dict[Tuple[int, str], int] = {}
+        self.popularity = np.zeros(0)
+
+        self._main: Tuple[List[str], np.ndarray] = ([], np.zeros(0, dtype=np.int64))
+        self._delta: Tuple[List[str], np.ndarray] = ([], np.zeros(0, dtype=np.int64))
+        self._delta_ids: set = set()
+        self._pending: List[int] = []
+        self._trigrams: Dict[str, List[int]] = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, item: dict):
+        """Dodaje/aktualizuje tytuł (słownik w kształcie wyniku z TMDB, z media_type)."""
+        title = item.get("title") or item.get("name")
+        media_type = item.get("media_type")
+        if not item.get("id") or not title or media_type not in ("movie", "tv"):
+            return
+        slim = {f: item[f] for f in ITEM_FIELDS if item.get(f) is not None}
+        norm = normalize(title)
+        key = (item["id"], media_type)
+        idx = self.keys.get(key)
+        if idx is not None:
+            self.entries[idx] = slim
+            self._pending.append(idx)  # popularność mogła się zmienić
+            if self.norm[idx] == norm:
+                return
+            self.norm[idx] = norm  # stare słowa zostają w segmencie głównym do przebudowy
+        else:
+            idx = self.keys[key] = len(self.entries)
+            self.entries.append(slim)
+            self.norm.append(norm)
+            self._pending.append(idx)
+        for t in trigrams(norm):
+            self._trigrams.setdefault(t, []).append(idx)
+
+    def add_many(self, items: Iterable[dict]):
+        for item in items:
+            self.add(item)
+
+    def _flush(self):
+        if not self._pending:
+            return
+        pending = set(self._pending)
+        self._pending = []
+
+        grow = len(self.entries) - len(self.popularity)
+        if grow > 0:
+            self.popularity = np.concatenate([self.popularity, np.zeros(grow)])
+        for i in pending:
+            self.popularity[i] = self.entries[i].get("popularity") or 0.0
+
+        self._delta_ids |= pending
+        if len(self._delta_ids) > max(1000, len(self.entries) * settings.TYPEAHEAD_MERGE_RATIO):
+            # Scalenie: jeden posortowany segment ze wszystkich tytułów
+            self._main = _sorted_words(self.norm, range(len(self.entries)))
+            self._delta = ([], np.zeros(0, dtype=np.int64))
+            self._delta_ids = set()
+        else:
+            self._delta = _sorted_words(self.norm, self._delta_ids)
+
+    def _prefix_entries(self, token: str) -> np.ndarray:
+        found = []
+        for words, entries in (self._main, self._delta):
+            lo = bisect_left(words, token)
+            hi = bisect_left(words, token + "\uffff")
+            found.append(entries[lo:hi])
+        return np.unique(np.concatenate(found))
+
+    def search(self, query: str, limit: int = 6) -> List[dict]:
+        self._flush()
+        norm_q = normalize(query)
+        tokens = norm_q.split()
+        if not tokens or not self.entries:
+            return []
+
+        # Najdłuższe słowo ma najmniej dopasowań - od niego zaczynamy przecinanie
+        tokens.sort(key=len, reverse=True)
+        cand = self._prefix_entries(tokens[0])
+        for token in tokens[1:]:
+            if not len(cand):
+                break
+            cand = np.intersect1d(cand, self._prefix_entries(token), assume_unique=True)
+
+        # Literówki: trigramy tylko gdy prefiksy nic nie dały (to i tak zwykle kończy się pytaniem TMDB)
+        if not len(cand) and len(norm_q) >= 3:
+            cand = self._fuzzy(norm_q, limit)
+        if not len(cand):
+            return []
+
+        # Top wg popularności, potem tytuły zaczynające się od zapytania na początek
+        k = min(len(cand), max(limit * 5, 30))
+        top = cand[np.argpartition(-self.popularity[cand], k - 1)[:k]] if len(cand) > k else cand
+        ranked = sorted(top, key=lambda i: (not self.norm[i].startswith(norm_q), -self.popularity[i]))
+        return [dict(self.entries[i]) for i in ranked[:limit]]
+
+    def _fuzzy(self, norm_q: str, limit: int) -> np.ndarray:
+        q_tris = trigrams(norm_q)
+        max_postings = settings.TYPEAHEAD_FUZZY_MAX_POSTINGS  # częste trigramy niewiele mówią, a kosztują
+        counts = Counter()
+        for t in q_tris:
+            postings = self._trigrams.get(t)
+            if postings and len(postings) <= max_postings:
+                counts.update(postings)
+        hits = []
+        for i, overlap in counts.most_common(limit * 10):
+            jaccard = overlap / (len(q_tris) + len(trigrams(self.norm[i])) - overlap)
+            if jaccard >= settings.TYPEAHEAD_FUZZY_THRESHOLD:
+                hits.append(i)
+        return np.array(hits, dtype=np.int64)
+
+
+_index = TypeaheadIndex()
+# Odpowiedzi TMDB dla znormalizowanych zapytań: norm_q -> (wyniki, kompletne?, czas)
+_upstream: "OrderedDict[str, Tuple[List[dict], bool, float]]" = OrderedDict()
+_stats = {"local": 0, "prefix_cache": 0, "upstream": 0}
+
+
+def get_index() -> TypeaheadIndex:
+    return _index
+
+
+def remember(items: Iterable[dict]):
+    if settings.TYPEAHEAD_ENABLED:
+        _index.add_many(items)
+
+
+def remember_metadata(meta: dict):
+    """Hook dla titles.py (słownik kolumn title_metadata)."""
+    if settings.TYPEAHEAD_ENABLED:
+        _index.add({"id": meta["tmdb_id"], "media_type": meta["media_type"], "title": meta.get("title"),
+                    "poster_path": meta.get("poster_path"), "release_date": meta.get("release_date"),
+                    "popularity": meta.get("popularity"), "vote_average": meta.get("vote_average")})
+
+
+def cached_upstream(norm_q: str, limit: int) -> Optional[List[dict]]:
+    """Wynik z wcześniejszej odpowiedzi TMDB: dla tego samego zapytania albo kompletnej dla prefiksu."""
+    now = time.time()
+    tokens = norm_q.split()
+    for end in range(len(norm_q), settings.TYPEAHEAD_MIN_UPSTREAM_CHARS - 1, -1):
+        prefix = norm_q[:end].strip()
+        hit = _upstream.get(prefix)
+        if hit is None:
+            continue
+        results, complete, stored_at = hit
+        if now - stored_at > settings.TYPEAHEAD_UPSTREAM_TTL:
+            continue
+        if prefix == norm_q:
+            return results[:limit]
+        if complete:
+            return [r for r in results if matches(normalize(r.get("title") or r.get("name")), tokens)][:limit]
+    return None
+
+
+def store_upstream(norm_q: str, results: List[dict], complete: bool):
+    _upstream[norm_q] = (results, complete, time.time())
+    _upstream.move_to_end(norm_q)
+    while len(_upstream) > settings.TYPEAHEAD_UPSTREAM_MAX_ENTRIES:
+        _upstream.popitem(last=False)
+    remember(results)
+
+
+def record(source: str):
+    _stats[source] += 1
+
+
+def stats() -> dict:
+    return {"titles": len(_index), "upstream_entries": len(_upstream), **_stats}
+
+
+async def load_index():
+    """Zasilenie indeksu tytułami z title_metadata (m.in. wszystkie ulubione) przy starcie."""
+    if not settings.TYPEAHEAD_ENABLED:
+        return
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(
+            TitleMetadata.tmdb_id, TitleMetadata.media_type, TitleMetadata.title, TitleMetadata.poster_path,
+            TitleMetadata.release_date, TitleMetadata.popularity, TitleMetadata.vote_average,
+        ))
+        for row in result.all():
+            remember_metadata(row._asdict())
+    print(f"Indeks wyszukiwania: {len(_index)} tytułów w {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,120 @@
+# backend/app/services/warmer.py
+"""
+Rozgrzewanie cache TMDB w tle.
+
+Co WARMER_INTERVAL (± WARMER_JITTER) przechodzimy listy strony głównej (popular, trending, top_rated,
+revenue, dostawcy) i pierwsze strony discover dla szybkiego trybu bez ulubionych oraz każdego nastroju
+z MOOD_MAP. Zadania wołają te same funkcje co endpointy, więc klucze cache są identyczne.
+Przebieg działa w trybie refresh-ahead (tmdb.refresh_ahead): wpis, który wygasłby przed następnym
+przebiegiem, pobieramy od nowa już teraz - użytkownik trafia w świeży cache zamiast czekać na TMDB.
+
+Przy kilku workerach z cache współdzielonym rozgrzewa tylko lider (flock na WARMER_LOCK_PATH),
+reszta dostaje wpisy z pliku. Bez cache współdzielonego każdy worker rozgrzewa swój.
+"""
+from typing import Awaitable, Callable, List, Tuple
+import asyncio
+import random
+import time
+
+from app.core import leader
+from app.core.config import settings
+from app.core.tmdb import TMDBClient, refresh_ahead
+from app.api import movies
+from app.api import suggestions
+from app.services import corpus
+
+_status = {
+    "enabled": settings.WARMER_ENABLED,
+    "role": None,           # leader / follower / solo
+    "runs": 0,
+    "failed_jobs": 0,
+    "last_run_at": None,
+    "last_duration_ms": None,
+    "last_upstream_requests": None,  # zapytania do TMDB w ostatnim przebiegu (odświeżone wpisy)
+    "next_run_at": None,
+    "jobs": {},
+}
+
+
+def stats() -> dict:
+    return {**_status, "jobs": {name: dict(job) for name, job in _status["jobs"].items()}}
+
+
+def _role() -> str:
+    # Bez cache współdzielonego followerzy nie widzieliby rozgrzanych wpisów - każdy worker rozgrzewa swój
+    if not settings.SHARED_CACHE_ENABLED or not leader.available():
+        return "solo"
+    return "leader" if leader.is_leader() else "follower"
+
+
+async def _warm_discover(client: TMDBClient, req: "suggestions.RecRequest"):
+    # Pierwsza runda rekomendacji; zapytania, na które odpowie lokalny korpus, pomijamy
+    plan = await suggestions.plan_recommendations(req, None, None, client)
+    pages = range(1, settings.REC_PAGES_PER_ROUND + 1)
+    local = corpus.current()
+    for endpoint, params, m_type in plan.queries:
+        if local is not None:
+            res = local.discover(endpoint, params, pages)
+            if res is not None and len(res) >= settings.CORPUS_MIN_RESULTS:
+                continue
+        await suggestions.fetch_discover(client, endpoint, params, pages=pages, media_type=m_type)
+
+
+def _jobs(client: TMDBClient) -> List[Tuple[str, Callable[[], Awaitable]]]:
+    jobs = [
+        ("popular", lambda: movies.get_popular(client)),
+        ("trending", lambda: movies.get_trending(client)),
+        ("top_rated", lambda: movies.get_top_rated(client)),
+        ("revenue", lambda: movies.get_revenue(client)),
+        ("providers", lambda: movies.get_watch_providers(client)),
+    ]
+    if settings.WARMER_DISCOVER:
+        requests = [("discover_quick", suggestions.RecRequest(mode="quick", target_type="both"))]
+        requests += [(f"discover_{mood}", suggestions.RecRequest(
+            mode="advanced", target_type="both", filters=suggestions.RecFilters(mood=mood)))
+            for mood in suggestions.MOOD_MAP]
+        jobs += [(name, lambda req=req: _warm_discover(client, req)) for name, req in requests]
+    return jobs
+
+
+async def warm(client: TMDBClient) -> dict:
+    """Jeden przebieg: zadania po kolei (każde i tak pobiera strony równolegle), błąd zadania nie przerywa reszty."""
+    start = time.time()
+    requests_before = client.stats["requests"]
+    # Odświeżamy wszystko, co wygasłoby przed kolejnym przebiegiem (+ zapas na sam przebieg)
+    with refresh_ahead(settings.WARMER_INTERVAL * (1 + settings.WARMER_JITTER) + 60):
+        for name, job in _jobs(client):
+            t0 = time.perf_counter()
+            error = None
+            try:
+                await job()
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                _status["failed_jobs"] += 1
+                print(f"Rozgrzewanie cache ({name}): {error}")
+            _status["jobs"][name] = {"ok": error is None, "ms": round((time.perf_counter() - t0) * 1000, 1),
+                                     "error": error}
+
+    _status["runs"] += 1
+    _status["last_run_at"] = start
+    _status["last_duration_ms"] = round((time.time() - start) * 1000, 1)
+    _status["last_upstream_requests"] = client.stats["requests"] - requests_before
+    return stats()
+
+
+async def cache_warmer(client: TMDBClient):
+    """Pętla w tle (start w lifespan): przebieg co WARMER_INTERVAL z jitterem, tylko w workerze-liderze."""
+    delay = settings.WARMER_INITIAL_DELAY
+    while True:
+        _status["next_run_at"] = time.time() + delay
+        await asyncio.sleep(delay)
+        try:
+            _status["role"] = _role()
+            if _status["role"] != "follower":
+                result = await warm(client)
+                print(f"Rozgrzewanie cache: {len(result['jobs'])} zadań w {result['last_duration_ms'] / 1000:.1f}s, "
+                      f"{result['last_upstream_requests']} zapytań do TMDB")
+        except Exception as e:
+            print(f"Błąd rozgrzewania cache: {e}")
+        jitter = settings.WARMER_JITTER
+        delay = settings.WARMER_INTERVAL * random.uniform(1 - jitter, 1 + jitter)
@@ -0,0 +1,52 @@
+# backend/benchmarks/compare.py
+"""
+Porównanie dwóch raportów z benchmarks/run.py (np. przed i po zmianie):
+
+    python -m benchmarks.compare benchmarks/results/abc123.json benchmarks/results/def456.json
+"""
+import json
+import sys
+
+METRICS = [
+    # (klucz, etykieta, czy więcej = lepiej)
+    ("throughput_rps", "req/s", True),
+    ("p50_ms", "p50", False),
+    ("p95_ms", "p95", False),
+    ("p99_ms", "p99", False),
+    ("ttfb_p50_ms", "ttfb50", False),
+    ("upstream_per_request", "tmdb/req", False),
+    ("alloc_peak_kb", "alloc peak", False),
+    ("errors", "err", False),
+]
+
+
+def _delta(old, new, higher_is_better: bool) -> str:
+    if not old:
+        return "    -"
+    change = (new - old) / old * 100
+    better = change > 0 if higher_is_better else change < 0
+    mark = "+" if better else ("-" if change else " ")
+    return f"{change:+6.1f}% {mark}"
+
+
+def main():
+    if len(sys.argv) != 3:
+        raise SystemExit("Użycie: python -m benchmarks.compare STARY.json NOWY.json")
+    with open(sys.argv[1]) as f:
+        old = json.load(f)
+    with open(sys.argv[2]) as f:
+        new = json.load(f)
+    print(f"{old.get('revision')} -> {new.get('revision')}   (+ lepiej, - gorzej)")
+    for name, new_r in new["scenarios"].items():
+        old_r = old["scenarios"].get(name)
+        if old_r is None:
+            print(f"\n{name}: brak w starym raporcie")
+            continue
+        print(f"\n{name}")
+        for key, label, higher in METRICS:
+            if key in new_r and key in old_r:
+                print(f"  {label:<11} {old_r[key]:>10} -> {new_r[key]:>10}  {_delta(old_r[key], new_r[key], higher)}")
+
+
+if __name__ == "__main__":
+    main()
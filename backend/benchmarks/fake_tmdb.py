@@ -0,0 +1,280 @@
+# backend/benchmarks/fake_tmdb.py
+"""
+Lokalny zastępca TMDB do benchmarków (bez sieci i bez klucza API).
+
+Odpowiedzi:
+- nagrane fixtury (benchmarks/fixtures/<sha1 ścieżki+parametrów>.json), jeśli są - `--record`
+  z TMDB_API_KEY przepuszcza zapytania do prawdziwego TMDB i zapisuje odpowiedzi,
+- w pozostałych przypadkach deterministyczny syntetyczny katalog (ziarno `--seed`): listy,
+  /discover z filtrem gatunków i stronicowaniem, /search/multi, detale z credits/keywords/providers,
+  logowanie i listy konta.
+
+Zakłócenia: opóźnienie (średnia + rozrzut), odsetek błędów 500 i odsetek 429 z Retry-After.
+GET /__stats - liczniki zapytań per rodzaj endpointu, POST /__reset - zerowanie liczników,
+POST /__faults?enabled=0|1 - wyłączenie zakłóceń (np. na czas przygotowania danych).
+
+    python -m benchmarks.fake_tmdb --port 8765 --latency 40 --jitter 20 --error-rate 0.01 --throttle-rate 0.01
+"""
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+PAGE_SIZE = 20
+
+GENRES = {"movie": [28, 12, 16, 35, 80, 99, 18, 10751, 14, 36, 27, 10402, 9648, 10749, 878, 53, 10752, 37],
+          "tv": [10759, 16, 35, 80, 99, 18, 10751, 9648, 10765, 10768, 37]}
+WORDS_A = ["Ostatni", "Czerwony", "Cichy", "Zimowy", "Dziki", "Złoty", "Nocny", "Stary", "Wielki", "Mroczny",
+           "Lost", "Silent", "Broken", "Hidden", "Golden", "Midnight", "Frozen", "Burning", "Eternal", "Savage"]
+WORDS_B = ["Żółw", "Horyzont", "Ogród", "Król", "Rzeka", "Miasto", "Pociąg", "Wilk", "Sen", "Las",
+           "Empire", "Garden", "River", "Shadow", "Kingdom", "Signal", "Harbor", "Voyage", "Legacy", "Storm"]
+PROVIDERS = [8, 337, 1899, 119, 350, 1773, 238, 2, 3, 10]
+COUNTRIES = ["PL", "US", "GB", "FR", "DE", "ES", "KR", "JP", "IN"]
+
+
+class Catalog:
+    """Syntetyczne tytuły - te same dla danego ziarna, więc wyniki są porównywalne między commitami."""
+
+    def __init__(self, seed: int, movies: int, tv: int):
+        self.seed = seed
+        self.items: Dict[str, List[dict]] = {"movie": [], "tv": []}
+        self.by_id: Dict[tuple, dict] = {}
+        rng = random.Random(seed)
+        for media_type, count, first_id in (("movie", movies, 100), ("tv", tv, 100)):
+            for n in range(count):
+                tmdb_id = first_id + n
+                title = f"{rng.choice(WORDS_A)} {rng.choice(WORDS_B)}"
+                if rng.random() < 0.5:
+                    title += f" {rng.randint(2, 9)}"
+                date = f"{rng.randint(1960, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+                item = {
+                    "id": tmdb_id,
+                    "title" if media_type == "movie" else "name": title,
+                    "release_date" if media_type == "movie" else "first_air_date": date,
+                    "poster_path": f"/p{media_type[0]}{tmdb_id}.jpg",
+                    "genre_ids": rng.sample(GENRES[media_type], rng.randint(1, 3)),
+                    "popularity": round(rng.paretovariate(1.2) * 5, 3),
+                    "vote_average": round(rng.uniform(3.0, 9.0), 1),
+                    "vote_count": int(rng.paretovariate(0.8) * 50),
+                    "original_language": rng.choice(["en", "pl", "fr", "ko", "ja"]),
+                    "origin_country": [rng.choice(COUNTRIES)],
+                }
+                self.items[media_type].append(item)
+                self.by_id[(media_type, tmdb_id)] = item
+            self.items[media_type].sort(key=lambda i: -i["popularity"])
+
+    def page(self, items: List[dict], page: int, media_type: Optional[str] = None) -> dict:
+        start = (max(1, page) - 1) * PAGE_SIZE
+        results = [dict(i, media_type=media_type) if media_type else dict(i) for i in items[start:start + PAGE_SIZE]]
+        total = len(items)
+        return {"page": page, "results": results, "total_results": total,
+                "total_pages": max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)}
+
+    def discover(self, media_type: str, params: dict) -> dict:
+        items = self.items[media_type]
+        genres = params.get("with_genres")
+        if genres:
+            wanted = {int(g) for g in re.split(r"[|,]", genres) if g}
+            every = "," in genres
+            items = [i for i in items if (wanted <= set(i["genre_ids"]) if every else wanted & set(i["genre_ids"]))]
+        if params.get("vote_average.gte"):
+            items = [i for i in items if i["vote_average"] >= float(params["vote_average.gte"])]
+        if params.get("with_origin_country"):
+            items = [i for i in items if params["with_origin_country"] in i["origin_country"]]
+        if params.get("sort_by", "").startswith("vote_average"):
+            items = sorted(items, key=lambda i: -i["vote_average"])
+        return self.page(items, int(params.get("page", 1)))
+
+    def search(self, query: str, page: int) -> dict:
+        q = query.lower()
+        hits = [dict(i, media_type=m) for m in ("movie", "tv") for i in self.items[m]
+                if q in (i.get("title") or i.get("name")).lower()]
+        hits.sort(key=lambda i: -i["popularity"])
+        return self.page(hits, page)
+
+    def details(self, media_type: str, tmdb_id: int) -> Optional[dict]:
+        item = self.by_id.get((media_type, tmdb_id))
+        if item is None:
+            return None
+        rng = random.Random(f"{self.seed}:{media_type}:{tmdb_id}")
+        data = {k: v for k, v in item.items() if k != "genre_ids"}
+        data["genres"] = [{"id": g, "name": str(g)} for g in item["genre_ids"]]
+        data["production_countries"] = [{"iso_3166_1": c} for c in item["origin_country"]]
+        crew = [{"id": 10000 + rng.randint(0, 400), "job": "Director", "name": "Reżyser"}]
+        cast = [{"id": 20000 + rng.randint(0, 3000), "name": "Aktor"} for _ in range(12)]
+        data["credits"] = {"crew": crew, "cast": cast}
+        keywords = [{"id": 30000 + rng.randint(0, 1500), "name": "kw"} for _ in range(rng.randint(2, 10))]
+        providers = [{"provider_id": p, "provider_name": str(p), "logo_path": f"/l{p}.png"}
+                     for p in rng.sample(PROVIDERS, rng.randint(0, 3))]
+        data["watch/providers"] = {"results": {"PL": {"flatrate": providers}}}
+        if media_type == "movie":
+            data["runtime"] = rng.randint(75, 180)
+            data["keywords"] = {"keywords": keywords}
+        else:
+            data["episode_run_time"] = [rng.randint(20, 65)]
+            data["created_by"] = crew
+            data["keywords"] = {"results": keywords}
+        return data
+
+
+class FakeTMDB:
+    def __init__(self, args):
+        self.args = args
+        self.catalog = Catalog(args.seed, args.movies, args.tv)
+        self.rng = random.Random(args.seed)
+        self.calls: Counter = Counter()
+        self.faults: Counter = Counter()
+        self.faults_enabled = True
+
+    def kind(self, path: str) -> str:
+        # Ścieżki z ID zwijamy, żeby liczniki dały się porównywać między przebiegami
+        return re.sub(r"/\d+", "/{id}", path)
+
+    def fixture_path(self, path: str, params: dict) -> Path:
+        params = {k: v for k, v in params.items() if k not in ("api_key", "session_id")}
+        key = path + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+        return FIXTURES_DIR / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+    async def record(self, path: str, params: dict, method: str, body: Optional[dict]):
+        import httpx  # tylko w trybie nagrywania
+        async with httpx.AsyncClient(base_url="https://api.themoviedb.org/3") as client:
+            resp = await client.request(method, path, params={**params, "api_key": self.args.api_key}, json=body)
+        if method == "GET" and resp.status_code == 200:
+            FIXTURES_DIR.mkdir(exist_ok=True)
+            self.fixture_path(path, params).write_text(resp.text)
+        return JSONResponse(resp.json(), status_code=resp.status_code)
+
+    def synthetic(self, path: str, params: dict, body: Optional[dict]) -> Optional[dict]:
+        page = int(params.get("page", 1))
+        parts = path.strip("/").split("/")
+        cat = self.catalog
+        if path in ("/movie/popular", "/trending/movie/week"):
+            return cat.page(cat.items["movie"], page)
+        if path == "/movie/top_rated":
+            return cat.page(sorted(cat.items["movie"], key=lambda i: -i["vote_average"]), page)
+        if parts[0] == "discover":
+            return cat.discover(parts[1], params)
+        if path == "/search/multi":
+            return cat.search(params.get("query", ""), page)
+        if parts[0] in ("movie", "tv") and len(parts) == 2 and parts[1].isdigit():
+            return cat.details(parts[0], int(parts[1]))
+        if parts[0] == "watch" and parts[1] == "providers":
+            return {"results": [{"provider_id": p, "provider_name": str(p), "logo_path": f"/l{p}.png"} for p in PROVIDERS]}
+        if path == "/authentication/token/new":
+            return {"success": True, "request_token": f"tok{self.rng.getrandbits(32):08x}"}
+        if path == "/authentication/session/new":
+            token = (body or {}).get("request_token", "anon")
+            return {"success": True, "session_id": f"sess-{token}"}
+        if path == "/account":
+            sid = params.get("session_id", "")
+            return {"id": int(hashlib.sha1(sid.encode()).hexdigest()[:6], 16)}
+        if parts[0] == "account" and len(parts) == 4:
+            # /account/{id}/{favorite|watchlist}/{movies|tv} - stały wycinek katalogu per konto
+            media_type = "movie" if parts[3] == "movies" else "tv"
+            rng = random.Random(f"{parts[1]}:{parts[2]}:{media_type}")
+            return cat.page(rng.sample(cat.items[media_type], min(45, len(cat.items[media_type]))), page)
+        return None
+
+    async def inject_faults(self) -> Optional[JSONResponse]:
+        args = self.args
+        if args.latency or args.jitter:
+            await asyncio.sleep(max(0.0, self.rng.gauss(args.latency, args.jitter)) / 1000)
+        roll = self.rng.random()
+        if roll < args.throttle_rate:
+            self.faults["429"] += 1
+            return JSONResponse({"status_code": 25, "status_message": "Rate limit"}, status_code=429,
+                                headers={"Retry-After": str(args.retry_after)})
+        if roll < args.throttle_rate + args.error_rate:
+            self.faults["500"] += 1
+            return JSONResponse({"status_message": "Internal error"}, status_code=500)
+        return None
+
+    async def handle(self, request: Request, path: str):
+        path = "/" + path
+        params = dict(request.query_params)
+        body = None
+        if request.method == "POST":
+            try:
+                body = await request.json()
+            except ValueError:
+                body = None
+        self.calls[self.kind(path)] += 1
+
+        if self.faults_enabled:
+            fault = await self.inject_faults()
+            if fault is not None:
+                return fault
+
+        if self.args.record:
+            return await self.record(path, params, request.method, body)
+        fixture = self.fixture_path(path, params)
+        if fixture.exists():
+            return JSONResponse(json.loads(fixture.read_text()))
+        data = self.synthetic(path, params, body)
+        if data is None:
+            return JSONResponse({"status_code": 34, "status_message": "Not found"}, status_code=404)
+        return JSONResponse(data)
+
+
+def create_app(args) -> FastAPI:
+    fake = FakeTMDB(args)
+    app = FastAPI()
+
+    @app.get("/__stats")
+    async def stats():
+        return {"calls": dict(fake.calls), "total": sum(fake.calls.values()), "faults": dict(fake.faults)}
+
+    @app.post("/__reset")
+    async def reset():
+        fake.calls.clear()
+        fake.faults.clear()
+        return {"ok": True}
+
+    @app.post("/__faults")
+    async def faults(enabled: int = 1):
+        fake.faults_enabled = bool(enabled)
+        return {"enabled": fake.faults_enabled}
+
+    @app.api_route("/3/{path:path}", methods=["GET", "POST"])
+    async def tmdb(request: Request, path: str):
+        return await fake.handle(request, path)
+
+    return app
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Lokalny fake TMDB")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--movies", type=int, default=5000)
+    p.add_argument("--tv", type=int, default=2000)
+    p.add_argument("--latency", type=float, default=40.0, help="średnie opóźnienie odpowiedzi (ms)")
+    p.add_argument("--jitter", type=float, default=20.0, help="odchylenie standardowe opóźnienia (ms)")
+    p.add_argument("--error-rate", type=float, default=0.0, help="odsetek odpowiedzi 500")
+    p.add_argument("--throttle-rate", type=float, default=0.0, help="odsetek odpowiedzi 429")
+    p.add_argument("--retry-after", type=int, default=1)
+    p.add_argument("--record", action="store_true", help="przepuszczaj do TMDB i zapisuj fixtury")
+    p.add_argument("--api-key", default=None)
+    return p
+
+
+if __name__ == "__main__":
+    import os
+    import uvicorn
+
+    args = build_parser().parse_args()
+    if args.record:
+        args.api_key = args.api_key or os.getenv("TMDB_API_KEY")
+        if not args.api_key:
+            raise SystemExit("--record wymaga TMDB_API_KEY")
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
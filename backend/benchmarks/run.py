@@ -0,0 +1,380 @@
+# backend/benchmarks/run.py
+"""
+Benchmarki obciążeniowe aplikacji na lokalnym fake TMDB (offline, porównywalne między commitami).
+
+Uruchamia fake TMDB w osobnym procesie, aplikację (uvicorn) w wątku tego procesu na czystej bazie
+SQLite i dla każdego scenariusza puszcza `--requests` zapytań z `--concurrency` wirtualnych
+użytkowników (każdy z własną sesją). Raport: przepustowość, p50/p95/p99, błędy, zapytania do
+TMDB na request i alokacje (tracemalloc - netto i szczyt w trakcie scenariusza).
+
+    cd backend
+    python -m benchmarks.run                                  # wszystkie scenariusze
+    python -m benchmarks.run -s rec_quick,rec_stream -n 100 -c 8 --latency 80 --error-rate 0.02
+    python -m benchmarks.run --out benchmarks/results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.compare benchmarks/results/a.json benchmarks/results/b.json
+
+Ustawienia aplikacji można nadpisać: --env TMDB_RATE_LIMIT=1000 --env REC_CACHE_ENABLED=0
+"""
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+ADVANCED_FILTERS = [
+    {"genres": [28], "runtime_min": 90, "runtime_max": 130, "preference": "popular"},
+    {"genres": [35, 18], "genre_mode": "or", "year_min": 1990, "vote_min": 6.0, "preference": "popular"},
+    {"mood": "scary", "preference": "niche"},
+    {"genres": [878], "country": "US", "runtime_max": 120, "preference": "popular"},
+]
+TYPED_QUERIES = ["ostatni", "zolw", "golden riv", "midnight", "cichy ogr", "storm", "dziki wil", "hidden"]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class Session:
+    """Wirtualny użytkownik: własny klient HTTP z ciasteczkiem sesji i własne ziarno losowania."""
+
+    def __init__(self, base_url: str, n: int, seed: int):
+        self.n = n
+        self.rng = random.Random(seed * 1000 + n)
+        self.http = httpx.AsyncClient(base_url=base_url, timeout=60)
+
+    async def login(self):
+        await self.http.get("/auth/callback", params={"request_token": f"bench{self.n}", "approved": "true"},
+                            follow_redirects=False)
+
+    def title_id(self) -> int:
+        # Rozkład z długim ogonem - część tytułów się powtarza (cache), część nie
+        return 100 + min(int(self.rng.paretovariate(1.1) * 20) - 20, 4999)
+
+
+# --- scenariusze: funkcja (sesja) -> (status, bajty odpowiedzi, czas do pierwszego bajtu albo None) ---
+
+async def _get(s: Session, url: str, **kw):
+    r = await s.http.get(url, **kw)
+    return r.status_code, len(r.content), None
+
+
+async def home(s: Session):
+    return await _get(s, s.rng.choice(["/movies/popular", "/movies/trending", "/movies/top_rated", "/movies/revenue"]))
+
+
+async def home_bundle(s: Session):
+    # Cała strona główna jednym requestem (półki + ID ulubionych), skompresowana
+    return await _get(s, "/home/bundle", headers={"Accept-Encoding": "gzip"})
+
+
+async def details(s: Session):
+    media_type = "movie" if s.rng.random() < 0.75 else "tv"
+    return await _get(s, f"/movies/details/{media_type}/{s.title_id()}")
+
+
+async def typeahead(s: Session):
+    # Kolejne prefiksy jednego zapytania - jak przy pisaniu
+    q = s.rng.choice(TYPED_QUERIES)
+    size = 0
+    for end in range(2, len(q) + 1):
+        r = await s.http.get("/movies/typeahead", params={"q": q[:end]})
+        if r.status_code != 200:
+            return r.status_code, size, None
+        size += len(r.content)
+    return 200, size, None
+
+
+async def favorites(s: Session):
+    r = await s.http.post(f"/user/favorite/{s.title_id()}")
+    return r.status_code, len(r.content), None
+
+
+async def rec_quick(s: Session):
+    r = await s.http.post("/recommendations/generate",
+                          json={"mode": "quick", "target_type": s.rng.choice(["movie", "tv", "both"])})
+    return r.status_code, len(r.content), None
+
+
+async def rec_advanced(s: Session):
+    body = {"mode": "advanced", "target_type": s.rng.choice(["movie", "tv", "both"]),
+            "filters": s.rng.choice(ADVANCED_FILTERS)}
+    r = await s.http.post("/recommendations/generate", json=body)
+    return r.status_code, len(r.content), None
+
+
+async def rec_more(s: Session):
+    # Pierwsza strona + "pokaż więcej" z next_offset
+    body = {"mode": "quick", "target_type": "both"}
+    r = await s.http.post("/recommendations/generate", json=body)
+    size = len(r.content)
+    if r.status_code == 200 and r.json().get("next_offset") is not None:
+        r = await s.http.post("/recommendations/generate", json={**body, "offset": r.json()["next_offset"]})
+        size += len(r.content)
+    return r.status_code, size, None
+
+
+async def rec_stream(s: Session):
+    body = {"mode": "advanced", "target_type": "movie", "filters": s.rng.choice(ADVANCED_FILTERS)}
+    start = time.perf_counter()
+    first = None
+    size = 0
+    async with s.http.stream("POST", "/recommendations/stream", json=body) as r:
+        async for chunk in r.aiter_bytes():
+            if first is None:
+                first = time.perf_counter() - start
+            size += len(chunk)
+    return r.status_code, size, first
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "home": home,
+    "home_bundle": home_bundle,
+    "details": details,
+    "typeahead": typeahead,
+    "favorites": favorites,
+    "rec_quick": rec_quick,
+    "rec_advanced": rec_advanced,
+    "rec_more": rec_more,
+    "rec_stream": rec_stream,
+}
+# Scenariusze wymagające zalogowanego użytkownika z ulubionymi
+NEEDS_FAVORITES = {"rec_quick", "rec_advanced", "rec_more", "rec_stream"}
+
+
+# --- infrastruktura ---
+
+def wait_for(url: str, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} nie odpowiada")
+
+
+def start_fake_tmdb(args) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "benchmarks.fake_tmdb", "--port", str(args.tmdb_port), "--seed", str(args.seed),
+           "--latency", str(args.latency), "--jitter", str(args.jitter),
+           "--error-rate", str(args.error_rate), "--throttle-rate", str(args.throttle_rate)]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR)
+    wait_for(f"http://127.0.0.1:{args.tmdb_port}/__stats")
+    return proc
+
+
+def start_app(args, workdir: Path):
+    """Aplikacja w wątku tego procesu (tracemalloc widzi jej alokacje). Env musi być ustawiony przed importem."""
+    os.environ.update({
+        "TMDB_BASE_URL": f"http://127.0.0.1:{args.tmdb_port}/3",
+        "TMDB_API_KEY": "bench",
+        "DATABASE_URL": f"sqlite+aiosqlite:///{workdir / 'bench.db'}",
+        "CORPUS_PATH": str(workdir / "corpus.npz"),
+        "COLLAB_DIR": str(workdir / "collab"),
+        "SHARED_CACHE_PATH": str(workdir / "tmdb_cache.sqlite"),
+        # Zadania w tle mieszałyby się z pomiarem - domyślnie wyłączone, można włączyć przez --env
+        "CORPUS_ENABLED": "0",
+        "COLLAB_ENABLED": "0",
+        "WARMER_ENABLED": "0",
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        os.environ[key] = value
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(BACKEND_DIR)  # StaticFiles w main.py używa ścieżki względnej
+    import uvicorn
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    wait_for(f"http://127.0.0.1:{args.port}/movies/providers")
+    return server, thread
+
+
+async def upstream_stats(args) -> dict:
+    async with httpx.AsyncClient() as c:
+        return (await c.get(f"http://127.0.0.1:{args.tmdb_port}/__stats")).json()
+
+
+async def reset_upstream(args):
+    async with httpx.AsyncClient() as c:
+        await c.post(f"http://127.0.0.1:{args.tmdb_port}/__reset")
+
+
+async def set_faults(args, enabled: bool):
+    async with httpx.AsyncClient() as c:
+        await c.post(f"http://127.0.0.1:{args.tmdb_port}/__faults", params={"enabled": int(enabled)})
+
+
+async def run_scenario(name: str, sessions: List[Session], args) -> dict:
+    fn = SCENARIOS[name]
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+    latencies: List[float] = []
+    ttfb: List[float] = []
+    errors = 0
+    bytes_total = 0
+
+    async def worker(s: Session):
+        nonlocal errors, bytes_total
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                status, size, first = await fn(s)
+            except httpx.HTTPError:
+                status, size, first = 599, 0, None
+            latencies.append(time.perf_counter() - start)
+            if first is not None:
+                ttfb.append(first)
+            bytes_total += size
+            if status >= 400:
+                errors += 1
+
+    await reset_upstream(args)
+    tracemalloc.reset_peak()
+    mem_before, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(s) for s in sessions))
+    elapsed = time.perf_counter() - start
+    mem_after, mem_peak = tracemalloc.get_traced_memory()
+    upstream = await upstream_stats(args)
+
+    latencies.sort()
+    ttfb.sort()
+    ms = lambda v: round(v * 1000, 1)
+    out = {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+        "bytes_per_request": round(bytes_total / max(1, len(latencies))),
+        "upstream_calls": upstream["total"],
+        "upstream_per_request": round(upstream["total"] / max(1, len(latencies)), 2),
+        "upstream_by_path": upstream["calls"],
+        "upstream_faults": upstream["faults"],
+        "alloc_net_kb": round((mem_after - mem_before) / 1024),
+        "alloc_peak_kb": round((mem_peak - mem_before) / 1024),
+    }
+    if ttfb:
+        out["ttfb_p50_ms"] = ms(percentile(ttfb, 50))
+        out["ttfb_p95_ms"] = ms(percentile(ttfb, 95))
+    return out
+
+
+async def run_all(args, scenarios: List[str]) -> Dict[str, dict]:
+    base_url = f"http://127.0.0.1:{args.port}"
+    sessions = [Session(base_url, n, args.seed) for n in range(args.concurrency)]
+    try:
+        # Przygotowanie bez zakłóceń - logowanie i ulubione muszą się udać, żeby przebiegi były porównywalne
+        await set_faults(args, False)
+        await asyncio.gather(*(s.login() for s in sessions))
+        if NEEDS_FAVORITES & set(scenarios):
+            # Każdy użytkownik dostaje kilka ulubionych (nie wliczane do pomiarów)
+            for s in sessions:
+                await s.http.post("/user/favorites/batch", json={"add": [s.title_id() for _ in range(args.favorites)]})
+        await set_faults(args, True)
+
+        results = {}
+        for name in scenarios:
+            if args.warmup:
+                await run_scenario(name, sessions, argparse.Namespace(**{**vars(args), "requests": args.warmup}))
+            results[name] = await run_scenario(name, sessions, args)
+            print_row(name, results[name])
+        return results
+    finally:
+        await asyncio.gather(*(s.http.aclose() for s in sessions))
+
+
+def print_row(name: str, r: dict):
+    ttfb = f" ttfb50 {r['ttfb_p50_ms']:>7}" if "ttfb_p50_ms" in r else ""
+    print(f"{name:<13} {r['throughput_rps']:>8} req/s  p50 {r['p50_ms']:>7}  p95 {r['p95_ms']:>7}  "
+          f"p99 {r['p99_ms']:>7} ms  err {r['errors']:>3}  tmdb/req {r['upstream_per_request']:>6}  "
+          f"alloc {r['alloc_net_kb']:>6}/{r['alloc_peak_kb']:>6} KB{ttfb}", flush=True)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Benchmarki aplikacji na lokalnym fake TMDB")
+    p.add_argument("-s", "--scenarios", default=",".join(SCENARIOS), help="lista po przecinku")
+    p.add_argument("-n", "--requests", type=int, default=200, help="zapytań na scenariusz")
+    p.add_argument("-c", "--concurrency", type=int, default=10, help="równoległych użytkowników")
+    p.add_argument("--warmup", type=int, default=0, help="zapytań rozgrzewkowych (nie liczone)")
+    p.add_argument("--favorites", type=int, default=8, help="ulubionych na użytkownika przed scenariuszami rec_*")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--port", type=int, default=8766)
+    p.add_argument("--tmdb-port", type=int, default=8765)
+    p.add_argument("--latency", type=float, default=40.0, help="opóźnienie fake TMDB (ms)")
+    p.add_argument("--jitter", type=float, default=20.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--throttle-rate", type=float, default=0.0)
+    p.add_argument("--env", action="append", default=[], help="KEY=VALUE dla ustawień aplikacji")
+    p.add_argument("--out", default=None, help="zapis wyników (JSON) do porównań")
+    return p
+
+
+def main():
+    args = build_parser().parse_args()
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Nieznane scenariusze: {', '.join(sorted(unknown))}")
+
+    fake = start_fake_tmdb(args)
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        try:
+            tracemalloc.start()
+            server, thread = start_app(args, Path(workdir))
+            results = asyncio.run(run_all(args, scenarios))
+            server.should_exit = True
+            thread.join(timeout=10)
+        finally:
+            fake.terminate()
+            fake.wait()
+
+    report = {
+        "revision": git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out",)},
+        "scenarios": results,
+    }
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"Zapisano {args.out}")
+
+
+if __name__ == "__main__":
+    main()
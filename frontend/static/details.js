@@ -37,10 +37,10 @@ async function renderDetails(movie) {
     let isFav = false;
     if (isUserLoggedIn) {
         try {
-            const favRes = await fetch("/user/favorites.json", { credentials: "same-origin" });
+            const favRes = await fetch("/user/favorites/ids", { credentials: "same-origin" });
             if (favRes.ok) {
                 const favData = await favRes.json();
-                isFav = favData.favorites.some(f => f.id === movie.id);
+                isFav = (favData.keys || []).includes(`${movie.media_type || "movie"}:${movie.id}`);
             }
         } catch(e) {}
     }
@@ -159,7 +159,7 @@ async function renderDetails(movie) {
         const oldText = btn.innerHTML;
         btn.innerHTML = "Przetwarzanie...";
         try {
-            const res = await fetch(`/user/favorite/${movie.id}`, { method: "POST", credentials: "same-origin" });
+            const res = await fetch(`/user/favorite/${movie.id}?media_type=${movie.media_type || "movie"}`, { method: "POST", credentials: "same-origin" });
             if (res.ok) {
                 const d = await res.json();
                 btn.innerHTML = d.removed ? "Dodaj do ulubionych ❤️" : "Usuń z ulubionych 💔";
@@ -187,10 +187,14 @@ function setupDetailsSearch() {
     const list = document.getElementById('search-suggestions');
     if (!input || !list) return;
     function debounce(fn, wait = 300) { let t; return (...args) => { clearTimeout(t); t = setTimeout(() => fn(...args), wait); }; }
+    let suggestController = null;
     async function doSearchSuggestions(q) {
         if (!q || q.trim().length < 1) { list.classList.remove('visible'); list.innerHTML = ''; return; }
         try {
-            const res = await fetch(`/movies/search?q=${encodeURIComponent(q)}&limit=6`);
+            // Podpowiedzi z lokalnego indeksu (/movies/typeahead); poprzednie zapytanie anulujemy
+            if (suggestController) suggestController.abort();
+            suggestController = new AbortController();
+            const res = await fetch(`/movies/typeahead?q=${encodeURIComponent(q)}&limit=6`, { signal: suggestController.signal });
             if (!res.ok) return;
             const data = await res.json();
             const hits = data.results || [];
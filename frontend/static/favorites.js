@@ -5,17 +5,27 @@ document.addEventListener("DOMContentLoaded", async () => {
     // Ładujemy statystyki
     loadStats();
 
+    const importBtn = document.getElementById("import-tmdb-btn");
+    if (importBtn) importBtn.addEventListener("click", () => importFromTmdb(importBtn));
+
     try {
-        const res = await fetch("/user/favorites.json", { credentials: "same-origin" });
-        if (!res.ok) {
-            if (res.status === 401) {
-                container.innerHTML = "<p style='grid-column:1/-1; text-align:center; margin-top:50px;'>Musisz być zalogowany.</p>";
-                return;
+        // Strony po kursorze `next` - pierwsza renderuje się od razu, kolejne dopisujemy
+        let url = "/user/favorites.json";
+        let append = false;
+        while (url) {
+            const res = await fetch(url, { credentials: "same-origin" });
+            if (!res.ok) {
+                if (res.status === 401) {
+                    container.innerHTML = "<p style='grid-column:1/-1; text-align:center; margin-top:50px;'>Musisz być zalogowany.</p>";
+                    return;
+                }
+                throw new Error(`Błąd serwera: ${res.status}`);
             }
-            throw new Error(`Błąd serwera: ${res.status}`);
+            const data = await res.json();
+            renderFavorites(data.favorites, append);
+            append = true;
+            url = data.next ? `/user/favorites.json?after=${data.next}` : null;
         }
-        const data = await res.json();
-        renderFavorites(data.favorites);
     } catch (err) {
         console.error(err);
         container.innerHTML = `<p class="error">Nie udało się pobrać ulubionych (${err.message}).</p>`;
@@ -36,27 +46,64 @@ async function loadStats() {
     } catch(e) { console.error("Stats error", e); }
 }
 
+// Import z konta TMDB - serwer przysyła postęp jako NDJSON (linia na stronę listy)
+async function importFromTmdb(btn) {
+    const label = btn.textContent;
+    btn.disabled = true;
+    btn.textContent = "Import...";
+    let added = 0;
+    try {
+        const res = await fetch("/user/import/tmdb?lists=favorite,watchlist", { method: "POST", credentials: "same-origin" });
+        if (!res.ok) throw new Error(`Błąd serwera: ${res.status}`);
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split("\n");
+            buffer = lines.pop();
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const msg = JSON.parse(line);
+                if (msg.done) { added = msg.added; continue; }
+                if (msg.error) { console.error("Import", msg); continue; }
+                added += msg.added;
+                btn.textContent = `Import... +${added}`;
+            }
+        }
+        if (added > 0) window.location.reload();
+        else btn.textContent = "Nic nowego";
+    } catch (e) {
+        console.error("Import error", e);
+        btn.textContent = "Błąd importu";
+    } finally {
+        btn.disabled = false;
+        setTimeout(() => { btn.textContent = label; }, 3000);
+    }
+}
+
 // ... reszta funkcji bez zmian ...
-function renderFavorites(movies) {
+function renderFavorites(movies, append = false) {
     const container = document.getElementById("favorites-container");
-    if (!movies || movies.length === 0) {
+    if (!append && (!movies || movies.length === 0)) {
         container.innerHTML = "<p style='grid-column: 1/-1; text-align:center; color:#888; font-size:1.2rem; margin-top:50px;'>Lista jest pusta.</p>";
         return;
     }
-    container.innerHTML = "";
+    if (!append) container.innerHTML = "";
     movies.forEach(movie => {
         const card = createFavCard(movie);
         container.appendChild(card);
-    });
-    // Listenery
-    document.querySelectorAll(".favorite-btn").forEach(btn => {
+        // Listener tylko na nowej karcie - przy dopisywaniu kolejnej strony nie dublujemy starych
+        const btn = card.querySelector(".favorite-btn");
         btn.addEventListener("click", async () => {
             const movieId = btn.dataset.movieId;
             if(!movieId) return;
             btn.disabled = true;
             btn.textContent = "...";
             try {
-                const res = await fetch(`/user/favorite/${movieId}`, { method: "POST", credentials: "same-origin" });
+                const res = await fetch(`/user/favorite/${movieId}?media_type=${btn.dataset.mediaType}`, { method: "POST", credentials: "same-origin" });
                 if(res.ok) {
                     const data = await res.json();
                     if(data.removed) {
@@ -98,7 +145,7 @@ function createFavCard(movie) {
             </div>
             <div class="rating-bar"><div class="rating-fill" style="width: ${ratingPercent}%;"></div></div>
         </div>
-        <button class="favorite-btn" data-movie-id="${movie.id}">USUŃ 🗑️</button>
+        <button class="favorite-btn" data-movie-id="${movie.id}" data-media-type="${mediaType}">USUŃ 🗑️</button>
     `;
     return div;
 }
\ No newline at end of file
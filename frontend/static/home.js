@@ -1,5 +1,10 @@
 const isUserLoggedIn = (typeof loggedIn !== 'undefined') ? loggedIn : false;
 
+// Półki i ID ulubionych przychodzą jednym requestem (/home/bundle); brakująca półka (null) - osobny fetch
+const SHELF_ENDPOINTS = { trending: '/movies/trending', top_rated: '/movies/top_rated', revenue: '/movies/revenue' };
+let homeShelves = {};
+let favIdsCache = null;
+
 document.addEventListener("DOMContentLoaded", () => {
     setupButtons();
     setupAuthButtons();
@@ -13,7 +18,7 @@ document.addEventListener("DOMContentLoaded", () => {
         setActiveButton(null);
     } else {
         // Domyślny start
-        loadMovies('/movies/trending');
+        loadHomeBundle();
         setActiveButton('popular-btn'); 
     }
 });
@@ -29,21 +34,21 @@ function setupButtons() {
 
     if(popBtn) {
         popBtn.addEventListener("click", () => {
-            loadMovies('/movies/trending');
+            showShelf('trending');
             setActiveButton('popular-btn');
         });
     }
 
     if(topBtn) {
         topBtn.addEventListener("click", () => {
-            loadMovies('/movies/top_rated');
+            showShelf('top_rated');
             setActiveButton('toprated-btn');
         });
     }
 
     if(revBtn) {
         revBtn.addEventListener("click", () => {
-            loadMovies('/movies/revenue');
+            showShelf('revenue');
             setActiveButton('revenue-btn');
         });
     }
@@ -95,6 +100,28 @@ function setActiveButton(activeBtnId) {
     }
 }
 
+async function loadHomeBundle() {
+    const container = document.getElementById("movies-container");
+    container.innerHTML = '<div class="loader">Ładowanie filmów...</div>';
+
+    try {
+        const res = await fetch('/home/bundle', { credentials: "same-origin" });
+        if (!res.ok) throw new Error("Błąd sieci");
+        const data = await res.json();
+        homeShelves = data.shelves || {};
+        if (isUserLoggedIn && data.favorites) favIdsCache = new Set(data.favorites.keys || []);
+    } catch (err) {
+        console.error(err);
+    }
+    showShelf('trending');
+}
+
+function showShelf(name) {
+    const movies = homeShelves[name];
+    if (movies) renderMovies(movies);
+    else loadMovies(SHELF_ENDPOINTS[name]);
+}
+
 async function loadMovies(endpoint) {
     const container = document.getElementById("movies-container");
     container.innerHTML = '<div class="loader">Ładowanie filmów...</div>';
@@ -125,13 +152,16 @@ async function searchMovies(query) {
 }
 
 async function fetchUserFavoritesIds() {
-    if (!isUserLoggedIn) return [];
+    if (!isUserLoggedIn) return new Set();
+    if (favIdsCache) return favIdsCache;
     try {
-        const res = await fetch("/user/favorites.json", { credentials: "same-origin" });
-        if (!res.ok) return [];
+        // Same ID + ETag - niezmieniona lista wraca z cache przeglądarki (304)
+        const res = await fetch("/user/favorites/ids", { credentials: "same-origin" });
+        if (!res.ok) return new Set();
         const j = await res.json();
-        return (j.favorites || []).map(f => f.id);
-    } catch (err) { return []; }
+        favIdsCache = new Set(j.keys || []);
+        return favIdsCache;
+    } catch (err) { return new Set(); }
 }
 
 async function renderMovies(movies) {
@@ -146,7 +176,7 @@ async function renderMovies(movies) {
     container.innerHTML = ""; 
     
     movies.forEach(movie => {
-        const isFav = favIds.includes(movie.id);
+        const isFav = favIds.has(favoriteKey(movie));
         const card = createMovieCard(movie, isFav);
         container.appendChild(card);
     });
@@ -158,14 +188,19 @@ async function renderMovies(movies) {
             if(!isUserLoggedIn) { window.location.href = "/auth/login"; return; }
 
             const originalText = btn.textContent;
+            const key = `${btn.dataset.mediaType}:${movieId}`;
             btn.disabled = true;
             btn.textContent = "...";
 
             try {
-                const res = await fetch(`/user/favorite/${movieId}`, { method: "POST", credentials: "same-origin" });
+                const res = await fetch(`/user/favorite/${movieId}?media_type=${btn.dataset.mediaType}`, { method: "POST", credentials: "same-origin" });
                 if(res.ok) {
                     const data = await res.json();
                     btn.textContent = data.added ? "Usuń z ulubionych" : "Dodaj do ulubionych";
+                    if (favIdsCache) {
+                        if (data.added) favIdsCache.add(key);
+                        else favIdsCache.delete(key);
+                    }
                 } else { btn.textContent = originalText; }
             } catch (err) { btn.textContent = originalText; } 
             finally { btn.disabled = false; }
@@ -173,6 +208,11 @@ async function renderMovies(movies) {
     });
 }
 
+// Klucz jak w /user/favorites/ids ("movie:603" / "tv:1396") - ID powtarzają się między typami
+function favoriteKey(movie) {
+    return `${movie.media_type || (movie.title ? "movie" : "tv")}:${movie.id}`;
+}
+
 function createMovieCard(movie, isFav) {
     const div = document.createElement("div");
     div.classList.add("movie");
@@ -205,7 +245,7 @@ function createMovieCard(movie, isFav) {
             </div>
         </div>
 
-        <button class="favorite-btn" data-movie-id="${movie.id}">${btnText}</button>
+        <button class="favorite-btn" data-movie-id="${movie.id}" data-media-type="${mediaType}">${btnText}</button>
     `;
     return div;
 }
@@ -227,10 +267,14 @@ function setupGlobalSearch() {
     const list = document.getElementById('search-suggestions');
     if (!input || !list) return;
     function debounce(fn, wait = 300) { let t; return (...args) => { clearTimeout(t); t = setTimeout(() => fn(...args), wait); }; }
+    let suggestController = null;
     async function doSearchSuggestions(q) {
         if (!q || q.trim().length < 1) { list.classList.remove('visible'); list.innerHTML = ''; return; }
         try {
-            const res = await fetch(`/movies/search?q=${encodeURIComponent(q)}&limit=6`);
+            // Podpowiedzi z lokalnego indeksu (/movies/typeahead); poprzednie zapytanie anulujemy
+            if (suggestController) suggestController.abort();
+            suggestController = new AbortController();
+            const res = await fetch(`/movies/typeahead?q=${encodeURIComponent(q)}&limit=6`, { signal: suggestController.signal });
             if (!res.ok) return;
             const data = await res.json();
             const hits = data.results || [];
@@ -144,15 +144,9 @@ async function generate() {
             };
         }
 
-        const res = await fetch('/recommendations/generate', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(payload)
-        });
-
-        if (!res.ok) throw new Error("Błąd serwera");
-        const data = await res.json();
-        await renderResults(data.results, container);
+        const nextOffset = await streamResults(payload, container);
+        lastPayload = payload;
+        updateMoreButton(container, nextOffset);
 
     } catch (err) {
         console.error(err);
@@ -164,33 +158,126 @@ async function generate() {
     }
 }
 
+// "Pokaż więcej" - kolejna strona tego samego rankingu (serwer trzyma go w cache, bez nowych zapytań do TMDB)
+let lastPayload = null;
+
+function updateMoreButton(container, nextOffset) {
+    let moreBtn = document.getElementById('more-btn');
+    if (nextOffset === null || nextOffset === undefined) {
+        if (moreBtn) moreBtn.remove();
+        return;
+    }
+    if (!moreBtn) {
+        moreBtn = document.createElement('button');
+        moreBtn.id = 'more-btn';
+        moreBtn.className = 'big-btn';
+        moreBtn.textContent = "Pokaż więcej";
+        moreBtn.addEventListener('click', loadMore);
+        container.appendChild(moreBtn);
+    }
+    moreBtn.dataset.offset = nextOffset;
+}
+
+async function loadMore() {
+    const container = document.getElementById('results-area');
+    const moreBtn = document.getElementById('more-btn');
+    if (!lastPayload || !moreBtn) return;
+
+    moreBtn.disabled = true;
+    moreBtn.textContent = "Ładuję...";
+    try {
+        const payload = { ...lastPayload, offset: parseInt(moreBtn.dataset.offset) };
+        const nextOffset = await streamResults(payload, container, true);
+        // Przycisk zawsze pod siatką
+        container.appendChild(moreBtn);
+        updateMoreButton(container, nextOffset);
+    } catch (err) {
+        console.error(err);
+        const msg = document.createElement('p');
+        msg.style.cssText = "color:red; text-align:center;";
+        msg.textContent = `Wystąpił błąd: ${err.message}`;
+        container.insertBefore(msg, moreBtn);
+    } finally {
+        moreBtn.disabled = false;
+        moreBtn.textContent = "Pokaż więcej";
+    }
+}
+
+// Wyniki strumieniem (NDJSON z /recommendations/stream) - karta pojawia się, gdy tylko serwer
+// ją przepuści, zamiast czekać na cały ranking. Zwraca next_offset z końcowego zdarzenia.
+async function streamResults(payload, container, append = false) {
+    const favPromise = fetchUserFavoritesIds();
+    const res = await fetch('/recommendations/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(payload)
+    });
+    if (!res.ok) throw new Error("Błąd serwera");
+    const favIds = await favPromise;
+
+    let rendered = 0;
+    let nextOffset = null;
+    let finished = false;
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        for (const line of lines) {
+            if (!line.trim()) continue;
+            const event = JSON.parse(line);
+            if (event.type === "result") {
+                await renderResults([event.item], container, append || rendered > 0, favIds);
+                rendered++;
+            } else if (event.type === "done") {
+                nextOffset = event.next_offset;
+                finished = true;
+            } else if (event.type === "error") {
+                throw new Error(event.detail || "Błąd serwera");
+            }
+        }
+    }
+    // Bez "done" serwer przerwał strumień w połowie - lista jest niepełna
+    if (!finished) throw new Error("Połączenie z serwerem zostało przerwane");
+    if (!append && rendered === 0) await renderResults([], container);
+    return nextOffset;
+}
+
 async function fetchUserFavoritesIds() {
     if (!isUserLoggedIn) return [];
     try {
-        const res = await fetch("/user/favorites.json", { credentials: "same-origin" });
+        // Same ID + ETag - niezmieniona lista wraca z cache przeglądarki (304)
+        const res = await fetch("/user/favorites/ids", { credentials: "same-origin" });
         if (!res.ok) return [];
         const j = await res.json();
-        return (j.favorites || []).map(f => f.id);
+        return j.keys || [];
     } catch (err) { return []; }
 }
 
-async function renderResults(movies, container) {
+async function renderResults(movies, container, append = false, favIds = null) {
     if (!movies || movies.length === 0) {
-        container.innerHTML = "<h3 style='text-align:center; margin-top:40px; color:#fff;'>Brak wyników :(</h3>";
+        if (!append) container.innerHTML = "<h3 style='text-align:center; margin-top:40px; color:#fff;'>Brak wyników :(</h3>";
         return;
     }
     
-    container.innerHTML = `<div class="movies-grid"></div>`;
+    if (!append || !container.querySelector('.movies-grid')) {
+        container.innerHTML = `<div class="movies-grid"></div>`;
+    }
     const grid = container.querySelector('.movies-grid');
-    const favIds = await fetchUserFavoritesIds();
+    if (favIds === null) favIds = await fetchUserFavoritesIds();
 
-    movies.forEach(f => {
-        const isFav = favIds.includes(f.id);
+    const cards = movies.map(f => {
+        const isFav = favIds.includes(favoriteKey(f));
         const card = createMovieCard(f, isFav);
         grid.appendChild(card);
+        return card;
     });
 
-    grid.querySelectorAll(".favorite-btn").forEach(btn => {
+    cards.map(card => card.querySelector(".favorite-btn")).forEach(btn => {
         btn.addEventListener("click", async () => {
             const movieId = btn.dataset.movieId;
             if (!movieId) return;
@@ -200,7 +287,7 @@ async function renderResults(movies, container) {
             btn.disabled = true;
             btn.textContent = "...";
             try {
-                const res = await fetch(`/user/favorite/${movieId}`, { method: "POST", credentials: "same-origin" });
+                const res = await fetch(`/user/favorite/${movieId}?media_type=${btn.dataset.mediaType}`, { method: "POST", credentials: "same-origin" });
                 if (res.ok) {
                     const data = await res.json();
                     btn.textContent = data.removed ? "Dodaj do ulubionych" : "Usuń z ulubionych";
@@ -211,6 +298,11 @@ async function renderResults(movies, container) {
     });
 }
 
+// Klucz jak w /user/favorites/ids ("movie:603" / "tv:1396") - ID powtarzają się między typami
+function favoriteKey(movie) {
+    return `${movie.media_type || (movie.title ? "movie" : "tv")}:${movie.id}`;
+}
+
 function createMovieCard(movie, isFav) {
     const div = document.createElement("div");
     div.classList.add("movie");
@@ -254,7 +346,7 @@ function createMovieCard(movie, isFav) {
             </div>
         </div>
 
-        <button class="favorite-btn" data-movie-id="${movie.id}">${btnText}</button>
+        <button class="favorite-btn" data-movie-id="${movie.id}" data-media-type="${mediaType}">${btnText}</button>
     `;
     return div;
 }
@@ -277,10 +369,14 @@ function setupGlobalSearch() {
     const list = document.getElementById('search-suggestions');
     if (!input || !list) return;
     function debounce(fn, wait = 300) { let t; return (...args) => { clearTimeout(t); t = setTimeout(() => fn(...args), wait); }; }
+    let suggestController = null;
     async function doSearchSuggestions(q) {
         if (!q || q.trim().length < 1) { list.classList.remove('visible'); list.innerHTML = ''; return; }
         try {
-            const res = await fetch(`/movies/search?q=${encodeURIComponent(q)}&limit=6`);
+            // Podpowiedzi z lokalnego indeksu (/movies/typeahead); poprzednie zapytanie anulujemy
+            if (suggestController) suggestController.abort();
+            suggestController = new AbortController();
+            const res = await fetch(`/movies/typeahead?q=${encodeURIComponent(q)}&limit=6`, { signal: suggestController.signal });
             if (!res.ok) return;
             const data = await res.json();
             const hits = data.results || [];